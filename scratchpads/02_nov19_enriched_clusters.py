@@ -23,7 +23,7 @@ from pathlib import Path
 from dotenv import load_dotenv
 
 from lib.conversation_explorer import build_conversation_trees, build_incomplete_conversation_trees, build_quote_trees, print_conversation_threads
-from lib.count_quotes import count_quotes
+from lib.count_quotes import add_quoted_counts
 # Load environment variables
 load_dotenv()
 # %%
@@ -44,18 +44,8 @@ tweets.head()
 
 # %%
 # TODO make ConversationExplorer print quote_counts
-quoted_counts = count_quotes(tweets)
-tweets = tweets.merge(
-    quoted_counts,
-    left_on='tweet_id',
-    right_on='quoted_tweet_id',
-    how='left',
-    suffixes=('', '_drop')
-)
-# Drop the duplicate quoted_tweet_id column from the merge
-tweets = tweets.drop(columns=['quoted_tweet_id_drop'], errors='ignore')
-# Fill NaN values with 0 for tweets that were never quoted
-tweets['quoted_count'] = tweets['quoted_count'].fillna(0).astype(int)
+# quoted_count column by sorted-array lookup (0 for tweets never quoted), no merge
+tweets = add_quoted_counts(tweets)
 tweets = tweets.set_index('tweet_id', drop=False)
 
 # %%
@@ -65,7 +55,7 @@ tweets_list = tweets.to_dict(orient='records')
 
 conversation_tweet_list = [tweet for tweet in tweets_list if tweet['conversation_id'] is not None]
 # %%
-trees =  build_conversation_trees(conversation_tweet_list)
+trees = build_conversation_trees(tweets[tweets['conversation_id'].notna()])
 # %%
 non_conversation_tweet_list = [tweet for tweet in tweets_list if tweet['conversation_id'] is None]
 
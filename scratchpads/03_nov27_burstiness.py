@@ -23,7 +23,7 @@ from pathlib import Path
 from dotenv import load_dotenv
 
 from lib.conversation_explorer import build_conversation_trees, build_incomplete_conversation_trees, build_quote_trees, print_conversation_threads
-from lib.count_quotes import count_quotes
+from lib.count_quotes import add_quoted_counts, count_quotes
 from lib.create_ascii_chart import create_ascii_chart
 # Load environment variables
 load_dotenv()
@@ -59,22 +59,11 @@ if quoted_counts_cache_path.exists():
 else:
     print("Calculating quoted counts...")
     quoted_counts = count_quotes(tweets)
-    quoted_counts = quoted_counts.groupby('quoted_tweet_id', as_index=False)['quoted_count'].sum()
     # Save to cache
     quoted_counts.to_parquet(quoted_counts_cache_path)
     print(f"Saved quoted counts cache to {quoted_counts_cache_path}")
 
-tweets = tweets.merge(
-    quoted_counts,
-    left_index=True,
-    right_on='quoted_tweet_id',
-    how='left',
-    suffixes=('', '_drop')
-)
-# Drop the duplicate quoted_tweet_id column from the merge
-tweets = tweets.drop(columns=['quoted_tweet_id_drop'], errors='ignore')
-# Fill NaN values with 0 for tweets that were never quoted
-tweets['quoted_count'] = tweets['quoted_count'].fillna(0).astype(int)
+tweets = add_quoted_counts(tweets, quoted_counts)
 # Reset index if index name is 'index' to avoid ambiguity when setting it again
 if tweets.index.name == 'index':
     tweets = tweets.reset_index(drop=False)
@@ -10,7 +10,7 @@ from pathlib import Path
 from dotenv import load_dotenv
 
 from lib.conversation_explorer import build_conversation_trees, build_incomplete_conversation_trees, build_quote_trees, print_conversation_threads
-from lib.count_quotes import count_quotes
+from lib.count_quotes import add_quoted_counts, count_quotes
 from lib.create_ascii_chart import create_ascii_chart
 from tqdm import tqdm
 import pickle
@@ -61,22 +61,11 @@ if quoted_counts_cache_path.exists():
 else:
     print("Calculating quoted counts...")
     quoted_counts = count_quotes(tweets)
-    quoted_counts = quoted_counts.groupby('quoted_tweet_id', as_index=False)['quoted_count'].sum()
     # Save to cache
     quoted_counts.to_parquet(quoted_counts_cache_path)
     print(f"Saved quoted counts cache to {quoted_counts_cache_path}")
 
-tweets = tweets.merge(
-    quoted_counts,
-    left_index=True,
-    right_on='quoted_tweet_id',
-    how='left',
-    suffixes=('', '_drop')
-)
-# Drop the duplicate quoted_tweet_id column from the merge
-tweets = tweets.drop(columns=['quoted_tweet_id_drop'], errors='ignore')
-# Fill NaN values with 0 for tweets that were never quoted
-tweets['quoted_count'] = tweets['quoted_count'].fillna(0).astype(int)
+tweets = add_quoted_counts(tweets, quoted_counts)
 # Reset index if index name is 'index' to avoid ambiguity when setting it again
 if tweets.index.name == 'index':
     tweets = tweets.reset_index(drop=False)
@@ -110,7 +99,7 @@ tweet_dict = {tweet['tweet_id']: tweet for tweet in tweets_list}
 
 conversation_tweet_list = [tweet for tweet in tweets_list if tweet['conversation_id'] is not None]
 # %%
-trees =  build_conversation_trees(conversation_tweet_list)
+trees = build_conversation_trees(tweets[tweets['conversation_id'].notna()])
 # %%
 non_conversation_tweet_list = [tweet for tweet in tweets_list if tweet['conversation_id'] is None]
 
@@ -157,7 +146,7 @@ else:
 quote_tweets_dict = {}
 for tweet in tweet_dict.values():
     if tweet['quoted_tweet_id'] is not None:
-        quote_tweets_dict[tweet['quoted_tweet_id']] = quote_tweets_dict.get(tweet['quoted_tweet_id'], []) + [tweet['tweet_id']]
+        quote_tweets_dict.setdefault(tweet['quoted_tweet_id'], []).append(tweet['tweet_id'])
 # %%
 # okay let's produce a strand.
 
@@ -94,28 +94,22 @@ else:
         depth=depth,
         seeds_workers=4,
         trees_workers=8,
-        images_workers=2
+        images_workers=2,
+        strands_dir=STRANDS_DIR  # stream non-empty strand texts straight to their files
     )
 
     # Save updated image cache
     save_img_cache(updated_cache, DEFAULT_CACHE_PATH)
     print(f"Built {len(strand_results)} strands, updated image cache")
 
-    # Save only non-empty strand texts to individual files
-    STRANDS_DIR.mkdir(parents=True, exist_ok=True)
-    saved_count = 0
-    empty_count = 0
-    for tid, result in strand_results.items():
-        if result.thread_text.strip():
-            with open(STRANDS_DIR / f"{tid}.json", "w") as f:
-                json.dump({"tweet_id": result.tweet_id, "thread_text": result.thread_text, "seed_ids": result.seed_ids}, f, indent=2)
-            saved_count += 1
-        else:
-            empty_count += 1
+    saved_count = sum(1 for result in strand_results.values() if result.path is not None)
+    empty_count = len(strand_results) - saved_count
     
     print(f"Saved {saved_count} strand files to {STRANDS_DIR}/")
     if empty_count:
         print(f"[WARN] Skipped {empty_count} empty strands (not saved)")
+    print(f"Tweet cache: {tweet_dict!r}")
+    print(f"Tree cache: {conversation_trees!r}")
 
 # %%
 # Load all non-empty strands for rating (including previously built ones)
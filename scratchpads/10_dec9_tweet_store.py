@@ -0,0 +1,73 @@
+# %%
+"""Columnar memory-mapped tweet store: build + benchmark against diskcache."""
+import random
+import time
+from pathlib import Path
+
+SCRATCHPADS_DIR = Path(__file__).parent
+
+# %%
+# Build the tweet store from the enriched_tweets parquet (uses quoted_counts_cache.parquet if present)
+from lib.strand_caches import generate_tweet_store
+
+generate_tweet_store()
+
+# %%
+# Benchmark: cold open + random lookups, TweetStore vs diskcache
+def benchmark_tweet_store(n_lookups: int = 10_000):
+    from diskcache import Cache
+    from lib.strand_caches import TWEET_DICT_DISKCACHE, TWEET_STORE_DIR
+    from lib.tweet_store import TweetStore
+
+    t0 = time.time()
+    store = TweetStore(TWEET_STORE_DIR)
+    print(f"TweetStore open: {(time.time() - t0) * 1000:.1f}ms ({len(store)} tweets)")
+
+    sample = random.sample(list(store.keys()), min(n_lookups, len(store)))
+
+    t0 = time.time()
+    for tid in sample:
+        tweet = store[tid]
+        _ = (tweet['username'], tweet['full_text'], tweet.get('quoted_count'))
+    print(f"TweetStore: {len(sample)} lookups in {time.time() - t0:.3f}s")
+
+    if not TWEET_DICT_DISKCACHE.exists():
+        print("tweet_dict diskcache not found, skipping comparison")
+        return
+    t0 = time.time()
+    cache = Cache(str(TWEET_DICT_DISKCACHE))
+    print(f"Diskcache open: {(time.time() - t0) * 1000:.1f}ms")
+    t0 = time.time()
+    for tid in sample:
+        tweet = cache[tid]
+        _ = (tweet['username'], tweet['full_text'], tweet.get('quoted_count'))
+    print(f"Diskcache: {len(sample)} lookups in {time.time() - t0:.3f}s")
+    cache.close()
+
+# %%
+benchmark_tweet_store()
+
+# %%
+# Worker processes reopen the store from its path (see TweetStore.__reduce__),
+# so the mapped pages are shared through the OS page cache instead of copied.
+def _worker_lookup(args):
+    store, tids = args
+    return sum(len(store[t]['full_text'] or '') for t in tids)
+
+
+def benchmark_tweet_store_processes(n_workers: int = 4, n_lookups: int = 10_000):
+    from concurrent.futures import ProcessPoolExecutor
+    from lib.strand_caches import TWEET_STORE_DIR
+    from lib.tweet_store import TweetStore
+
+    store = TweetStore(TWEET_STORE_DIR)
+    sample = random.sample(list(store.keys()), min(n_lookups, len(store)))
+    chunks = [sample[i::n_workers] for i in range(n_workers)]
+    t0 = time.time()
+    with ProcessPoolExecutor(max_workers=n_workers) as ex:
+        total = sum(ex.map(_worker_lookup, [(store, c) for c in chunks]))
+    print(f"{n_workers} processes: {len(sample)} lookups in {time.time() - t0:.3f}s ({total} chars)")
+
+# %%
+benchmark_tweet_store_processes()
+# %%
@@ -0,0 +1,61 @@
+# %%
+"""Streaming cache builder: build + peak memory vs the old pandas/joblib/diskcache path."""
+import tempfile
+import time
+from pathlib import Path
+
+SCRATCHPADS_DIR = Path(__file__).parent
+
+# %%
+# Build tweet store, reply forest and quote index straight from the parquet
+from lib.strand_caches import generate_caches
+
+stats = generate_caches()
+
+# %%
+# Each build runs in a fresh process so ru_maxrss is that build's peak
+def _streaming_build(parquet_path: str, out_dir: str, batch_size: int):
+    from lib.cache_builder import build_caches
+    out = Path(out_dir)
+    stats = build_caches(Path(parquet_path), out / 'tweet_store', out / 'reply_forest',
+                         out / 'quote_index', batch_size=batch_size)
+    return stats['peak_rss_mb']
+
+
+def _legacy_build(parquet_path: str, out_dir: str):
+    """The pre-streaming path: pandas -> to_dict -> joblib dump -> joblib load -> diskcache."""
+    import joblib
+    import pandas as pd
+    from diskcache import Cache
+    from lib.cache_builder import _peak_rss_mb
+
+    tweets = pd.read_parquet(parquet_path, dtype_backend='pyarrow')
+    tweets_list = tweets.to_dict(orient='records')
+    del tweets
+    tweet_dict = {t['tweet_id']: t for t in tweets_list}
+    joblib.dump(tweet_dict, Path(out_dir) / 'tweet_dict.joblib', compress=0)
+    del tweet_dict, tweets_list
+    data = joblib.load(Path(out_dir) / 'tweet_dict.joblib')
+    with Cache(str(Path(out_dir) / 'tweet_dict.diskcache')) as cache:
+        for k, v in data.items():
+            cache[k] = v
+    return _peak_rss_mb()
+
+
+def benchmark_cache_builders(parquet_path: str = None, batch_size: int = 65_536):
+    from concurrent.futures import ProcessPoolExecutor
+    from lib.strand_caches import _resolve_parquet_path
+
+    path = str(_resolve_parquet_path(parquet_path))
+    for name, fn, args in [
+        ('streaming', _streaming_build, (batch_size,)),
+        ('legacy (tweet_dict only)', _legacy_build, ()),
+    ]:
+        with tempfile.TemporaryDirectory() as out_dir, ProcessPoolExecutor(max_workers=1) as ex:
+            t0 = time.time()
+            peak = ex.submit(fn, path, out_dir, *args).result()
+            print(f"{name}: {time.time() - t0:.1f}s, peak RSS {peak:,.0f} MB")
+
+# %%
+benchmark_cache_builders()
+# %%
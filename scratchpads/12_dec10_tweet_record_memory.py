@@ -0,0 +1,40 @@
+# %%
+"""Memory: EnrichedTweet dicts (to_dict records) vs compact TweetRecords."""
+import gc
+import tracemalloc
+from pathlib import Path
+
+SCRATCHPADS_DIR = Path(__file__).parent
+
+# %%
+def _measure(build):
+    gc.collect()
+    tracemalloc.start()
+    objs = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return objs, current
+
+
+def benchmark_tweet_record_memory(n: int = 200_000):
+    """Bytes per tweet for n tweets decoded from the tweet store in each representation."""
+    from lib.strand_caches import TWEET_STORE_DIR
+    from lib.tweet_record import TweetRecord
+    from lib.tweet_store import TweetStore
+
+    store = TweetStore(TWEET_STORE_DIR)
+    rows = [store[t] for t in list(store.keys())[:n]]
+
+    for name, build in [
+        ("dict (to_dict records)", lambda: [dict(r) for r in rows]),
+        ("TweetRecord", lambda: [TweetRecord.from_mapping(r) for r in rows]),
+        ("TweetRecord (lazy text)", lambda: [TweetRecord.from_row(r) for r in rows]),
+    ]:
+        objs, nbytes = _measure(build)
+        assert objs[0] == dict(rows[0])
+        print(f"{name:24s} {nbytes / len(objs):7.0f} B/tweet ({nbytes / 1024**2:.1f} MB)")
+        del objs
+
+# %%
+benchmark_tweet_record_memory()
+# %%
@@ -0,0 +1,61 @@
+# %%
+"""build_conversation_trees: tweet-by-tweet dict loop vs stable-argsort grouping on the id columns."""
+import gc
+import time
+from collections import defaultdict
+from pathlib import Path
+
+SCRATCHPADS_DIR = Path(__file__).parent
+
+# %%
+def build_conversation_trees_loop(tweets):
+    """The previous implementation (one dict append per tweet), kept as the baseline."""
+    conversations = {}
+    for tweet in tweets:
+        conv_id = tweet["conversation_id"]
+        if conv_id not in conversations:
+            conversations[conv_id] = {"children": defaultdict(list), "parents": {}, "root": None}
+        tweet_id = tweet["tweet_id"]
+        reply_to = tweet.get("reply_to_tweet_id")
+        if reply_to:
+            conversations[conv_id]["children"][reply_to].append(tweet_id)
+            conversations[conv_id]["parents"][tweet_id] = reply_to
+        else:
+            conversations[conv_id]["root"] = tweet_id
+    return conversations
+
+
+def benchmark_conversation_trees(parquet_path: str = None):
+    """Time the loop over records against the Arrow column builders (dicts and compact forest)."""
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+    from lib.conversation_explorer import CONVERSATION_COLUMNS, build_conversation_trees
+    from lib.strand_caches import _resolve_parquet_path
+
+    table = pq.read_table(_resolve_parquet_path(parquet_path), columns=list(CONVERSATION_COLUMNS))
+    table = table.filter(pc.is_valid(table['conversation_id']))
+    records = table.to_pylist()
+
+    timings = {}
+    for name, fn in [
+        ('loop over records', lambda: build_conversation_trees_loop(records)),
+        ('arrow -> dicts', lambda: build_conversation_trees(table)),
+        ('arrow -> compact forest', lambda: build_conversation_trees(table, compact=True)),
+    ]:
+        gc.collect()
+        t0 = time.time()
+        trees = fn()
+        timings[name] = time.time() - t0
+        print(f"{name:24s} {timings[name]:6.2f}s  {len(trees):,} trees")
+        if name == 'loop over records':
+            expected = trees
+        elif name == 'arrow -> dicts':
+            print(f"{'':24s} same trees as the loop: {trees == expected}")
+            del expected
+        del trees
+    base = timings['loop over records']
+    print(f"Speedup: dicts {base / timings['arrow -> dicts']:.1f}x, compact {base / timings['arrow -> compact forest']:.1f}x")
+
+# %%
+benchmark_conversation_trees()
+# %%
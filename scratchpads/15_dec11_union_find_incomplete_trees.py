@@ -0,0 +1,78 @@
+# %%
+"""build_incomplete_conversation_trees: visited-set + BFS per root vs disjoint-set linking, on the non-conversation tweets."""
+import gc
+import time
+from collections import defaultdict, deque
+from pathlib import Path
+
+SCRATCHPADS_DIR = Path(__file__).parent
+
+# %%
+def build_incomplete_trees_bfs(found_tweets):
+    """The previous implementation (global visited set, BFS from every root, depth cap), kept as the baseline."""
+    all_tweets = {tweet["tweet_id"]: tweet for tweet in found_tweets}
+    parents = {}
+    children = defaultdict(list)
+    visited = set()
+    for tweet in found_tweets:
+        tweet_id = tweet["tweet_id"]
+        reply_to = tweet.get("reply_to_tweet_id")
+        if reply_to and reply_to in all_tweets:
+            if reply_to not in visited and tweet_id not in visited:
+                parents[tweet_id] = reply_to
+                children[reply_to].append(tweet_id)
+                visited.update({tweet_id, reply_to})
+    trees = {}
+    for root_id in all_tweets:
+        if root_id in parents:
+            continue
+        tree = {"root": root_id, "children": defaultdict(list), "parents": {}}
+        queue = deque([(root_id, 0)])
+        while queue:
+            current_id, depth = queue.popleft()
+            if depth > 100:
+                break
+            for child_id in children.get(current_id, []):
+                if child_id not in tree["parents"]:
+                    tree["parents"][child_id] = current_id
+                    tree["children"][current_id].append(child_id)
+                    queue.append((child_id, depth + 1))
+        trees[root_id] = tree
+    return trees
+
+
+def benchmark_incomplete_trees(parquet_path: str = None):
+    """Tweets/sec of each builder on the tweets without conversation_id."""
+    import numpy as np
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+    from lib.array_store import int_column
+    from lib.conversation_explorer import build_incomplete_conversation_trees, link_incomplete_trees
+    from lib.strand_caches import _resolve_parquet_path
+
+    table = pq.read_table(_resolve_parquet_path(parquet_path), columns=['tweet_id', 'reply_to_tweet_id', 'conversation_id'])
+    loose = table.filter(pc.is_null(table['conversation_id']))
+    records = loose.to_pylist()
+    ids, reply_to = int_column(loose, 'tweet_id'), int_column(loose, 'reply_to_tweet_id')
+    print(f"{len(records):,} non-conversation tweets")
+
+    results = {}
+    for name, fn in [
+        ('visited + BFS (old)', lambda: build_incomplete_trees_bfs(records)),
+        ('union-find -> dicts', lambda: build_incomplete_conversation_trees(records, [])),
+        ('union-find arrays only', lambda: link_incomplete_trees(ids, reply_to, np.ones(len(ids), dtype=bool))),
+    ]:
+        gc.collect()
+        t0 = time.time()
+        results[name] = fn()
+        dt = time.time() - t0
+        print(f"{name:24s} {dt:6.2f}s  {len(records) / dt:12,.0f} tweets/s")
+
+    old, new = results['visited + BFS (old)'], results['union-find -> dicts']
+    old_edges = sum(len(t['parents']) for t in old.values())
+    new_edges = sum(len(t['parents']) for t in new.values())
+    print(f"Reply links kept: {old_edges:,} before, {new_edges:,} now; {len(old):,} -> {len(new):,} trees")
+
+# %%
+benchmark_incomplete_trees()
+# %%
@@ -0,0 +1,66 @@
+# %%
+"""Quote chains: build_quote_trees (per-root BFS over tweet dicts) vs the persisted QuoteForest."""
+import gc
+import time
+from pathlib import Path
+
+SCRATCHPADS_DIR = Path(__file__).parent
+
+# %%
+# Transitive quoters of a tweet, as strands would have had to do it with build_quote_trees' output
+def quoters_from_trees(quote_trees, tweet_id, depth):
+    owner = next((t for t in quote_trees.values() if tweet_id == t["root"] or tweet_id in t["parents"]), None)
+    if owner is None:
+        return []
+    out, frontier = [], [tweet_id]
+    for _ in range(depth):
+        frontier = [c for f in frontier for c in owner["children"].get(f, [])]
+        if not frontier:
+            break
+        out.extend(frontier)
+    return out
+
+
+def benchmark_quote_forest(parquet_path: str = None, n_queries: int = 200, depth: int = 3):
+    """Build time of both, then per-seed transitive quoter lookups."""
+    import numpy as np
+    import pyarrow.parquet as pq
+    from lib.array_store import INT_NULL, int_column, isin_sorted
+    from lib.conversation_explorer import build_quote_trees
+    from lib.quote_forest import QuoteForest, quote_forest_arrays
+    from lib.strand_caches import _resolve_parquet_path
+
+    table = pq.read_table(_resolve_parquet_path(parquet_path), columns=['tweet_id', 'quoted_tweet_id'])
+    ids, quoted = int_column(table, 'tweet_id'), int_column(table, 'quoted_tweet_id')
+    has_q = quoted != INT_NULL
+    print(f"{len(ids):,} tweets, {int(has_q.sum()):,} quotes")
+
+    records = table.to_pylist()
+    gc.collect()
+    t0 = time.time()
+    quote_trees = build_quote_trees(records)
+    t_old = time.time() - t0
+    gc.collect()
+    t0 = time.time()
+    forest = QuoteForest.from_arrays(quote_forest_arrays(quoted[has_q], ids[has_q]))
+    t_new = time.time() - t0
+    print(f"build_quote_trees:   {t_old:6.2f}s")
+    print(f"quote_forest_arrays: {t_new:6.2f}s, {t_old / t_new:.0f}x ({forest!r})")
+
+    # build_quote_trees only links quotes of tweets in the corpus; the forest also keeps missing quoted tweets
+    quoted_keys = np.asarray(list(forest))
+    present = quoted_keys[isin_sorted(quoted_keys, np.sort(ids))]
+    print(f"{len(quoted_keys) - len(present):,} quoted tweets missing from the corpus (only the forest finds their quoters)")
+    seeds = np.random.default_rng(0).choice(present, size=min(n_queries, len(present)), replace=False)
+    t0 = time.time()
+    old = [quoters_from_trees(quote_trees, s, depth) for s in seeds.tolist()]
+    t_old = time.time() - t0
+    t0 = time.time()
+    new = forest.get_many(seeds, [], depth=depth)
+    t_new = time.time() - t0
+    print(f"{len(seeds)} seeds, quoters to depth {depth}: trees {t_old:.3f}s, forest {t_new:.4f}s")
+    print("Same quoters:", all(sorted(a) == sorted(b) for a, b in zip(old, new)))
+
+# %%
+benchmark_quote_forest()
+# %%
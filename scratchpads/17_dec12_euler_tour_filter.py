@@ -0,0 +1,88 @@
+# %%
+"""filter_conversation_trees on one viral thread: per-target parent walks + pop(0) BFS vs Euler tour range scans."""
+import gc
+import time
+from collections import defaultdict
+from pathlib import Path
+
+SCRATCHPADS_DIR = Path(__file__).parent
+
+# %%
+def filter_tree_bfs(target_ids, tree, depth, depth_up, depth_from_root, tree_ids):
+    """The previous per-conversation loop (ancestor walk and list-queue BFS per target), kept as the baseline."""
+    nodes_to_include = set()
+    for tid in target_ids:
+        nodes_to_include.add(tid)
+        curr = tid
+        ancestor_depth = 0
+        while ancestor_depth < depth_up:
+            parent = tree["parents"].get(curr)
+            if parent is None:
+                break
+            nodes_to_include.add(parent)
+            curr = parent
+            ancestor_depth += 1
+        queue = [(tid, depth_from_root if tid in tree_ids else depth)]
+        while queue:
+            curr, curr_depth = queue.pop(0)
+            if curr_depth > 0:
+                for child in tree["children"].get(curr, []):
+                    if child not in nodes_to_include:
+                        nodes_to_include.add(child)
+                        queue.append((child, curr_depth - 1))
+    filtered_children = defaultdict(list)
+    filtered_parents = {}
+    for node in nodes_to_include:
+        parent = tree["parents"].get(node)
+        if parent is not None and parent in nodes_to_include:
+            filtered_parents[node] = parent
+            filtered_children[parent].append(node)
+    return {"root": tree["root"], "children": filtered_children, "parents": filtered_parents}
+
+
+def viral_thread(n_nodes: int, seed: int = 0):
+    """Conversation id, reply ids and reply_to ids of one thread: most replies go to the root or a few hot tweets."""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    root = 1_000_000
+    ids = root + np.arange(n_nodes, dtype=np.int64)
+    hot = rng.integers(1, n_nodes // 10 + 2, size=50)
+    pick = rng.random(n_nodes)
+    parent_pos = np.where(pick < 0.4, 0, np.where(pick < 0.6, hot[rng.integers(0, len(hot), n_nodes)], 0))
+    recent = np.maximum(np.arange(n_nodes) - rng.integers(1, 20, size=n_nodes), 0)
+    parent_pos = np.where(pick >= 0.6, recent, parent_pos)
+    parent_pos = np.minimum(parent_pos, np.maximum(np.arange(n_nodes) - 1, 0))
+    reply_to = np.where(np.arange(n_nodes) == 0, np.iinfo(np.int64).min, ids[parent_pos])
+    return root, ids, reply_to
+
+
+def benchmark_filter(n_nodes: int = 200_000, n_targets: int = 40, depth: int = 10):
+    """One strand's targets in a single huge conversation, baseline on a dict tree vs the forest's arrays."""
+    import numpy as np
+    from lib.cache_builder import forest_arrays_from_columns
+    from lib.conversation_explorer import filter_conversation_trees
+    from lib.conversation_forest import ConversationForest, materialize_tree
+
+    root, ids, reply_to = viral_thread(n_nodes)
+    t0 = time.time()
+    forest = ConversationForest.from_arrays(forest_arrays_from_columns(ids, reply_to, np.full(len(ids), root))[0])
+    print(f"{n_nodes:,}-tweet thread: forest + Euler tour built in {time.time() - t0:.2f}s")
+    dict_tree = materialize_tree(forest[root])
+    tweet_dict = {tid: {"tweet_id": tid, "conversation_id": root} for tid in ids.tolist()}
+
+    targets = [root] + np.random.default_rng(1).choice(ids, size=n_targets - 1, replace=False).tolist()
+    gc.collect()
+    t0 = time.time()
+    old = filter_tree_bfs(set(targets), dict_tree, depth, depth, depth, {root})
+    t_old = time.time() - t0
+    t0 = time.time()
+    new = filter_conversation_trees(targets, forest, tweet_dict, depth)[root]
+    t_new = time.time() - t0
+    print(f"{n_targets} targets, depth {depth}: BFS {t_old:.3f}s, Euler tour {t_new:.4f}s ({t_old / t_new:.0f}x)")
+    print(f"Nodes kept: {len(old['parents']):,} before, {len(new['parents']):,} now "
+          f"(the old shared visited set could skip a later target's descendants)")
+
+# %%
+benchmark_filter()
+# %%
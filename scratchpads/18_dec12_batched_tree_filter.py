@@ -0,0 +1,66 @@
+# %%
+"""Phase 2 over many strands that land in the same viral thread: one filter call per strand vs one batched call."""
+import gc
+import time
+from pathlib import Path
+
+SCRATCHPADS_DIR = Path(__file__).parent
+
+# %%
+def viral_thread(n_nodes: int, seed: int = 0):
+    """Conversation id, reply ids and reply_to ids of one thread (as in 17_dec12_euler_tour_filter): most replies go to the root or a few hot tweets."""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    root = 1_000_000
+    ids = root + np.arange(n_nodes, dtype=np.int64)
+    hot = rng.integers(1, n_nodes // 10 + 2, size=50)
+    pick = rng.random(n_nodes)
+    parent_pos = np.where(pick < 0.4, 0, np.where(pick < 0.6, hot[rng.integers(0, len(hot), n_nodes)], 0))
+    recent = np.maximum(np.arange(n_nodes) - rng.integers(1, 20, size=n_nodes), 0)
+    parent_pos = np.where(pick >= 0.6, recent, parent_pos)
+    parent_pos = np.minimum(parent_pos, np.maximum(np.arange(n_nodes) - 1, 0))
+    reply_to = np.where(np.arange(n_nodes) == 0, np.iinfo(np.int64).min, ids[parent_pos])
+    return root, ids, reply_to
+
+
+def benchmark_batched_filter(n_nodes: int = 200_000, n_strands: int = 256, seeds_per_strand: int = 12, depth: int = 4):
+    """Strands whose seeds are replies drawn from a shared pool (as in a topic cluster); forest and dict trees."""
+    import numpy as np
+    from lib.cache_builder import forest_arrays_from_columns
+    from lib.conversation_explorer import filter_conversation_trees, filter_conversation_trees_batch
+    from lib.conversation_forest import ConversationForest, materialize_tree
+
+    root, ids, reply_to = viral_thread(n_nodes)
+    forest = ConversationForest.from_arrays(forest_arrays_from_columns(ids, reply_to, np.full(len(ids), root))[0])
+    dict_trees = {root: materialize_tree(forest[root])}
+    tweet_dict = {tid: {"tweet_id": tid, "conversation_id": root} for tid in ids.tolist()}
+
+    rng = np.random.default_rng(2)
+    # Seeds overlap across strands, like quotes of the same popular replies
+    popular = rng.choice(ids, size=n_strands, replace=False)
+    seed_lists = {
+        s: rng.choice(popular, size=seeds_per_strand, replace=False).tolist()
+        for s in range(n_strands)
+    }
+    print(f"{n_nodes:,}-tweet thread, {n_strands} strands x {seeds_per_strand} seeds, depth {depth}")
+
+    for name, trees in (("forest", forest), ("dict", dict_trees)):
+        gc.collect()
+        t0 = time.time()
+        one_by_one = {s: filter_conversation_trees(ids_, trees, tweet_dict, depth) for s, ids_ in seed_lists.items()}
+        t_old = time.time() - t0
+        gc.collect()
+        t0 = time.time()
+        batched = filter_conversation_trees_batch(seed_lists, trees, tweet_dict, depth)
+        t_new = time.time() - t0
+        same = all(
+            dict(batched[s][root]["parents"]) == dict(one_by_one[s][root]["parents"])
+            for s in seed_lists
+        )
+        kept = sum(len(batched[s][root]["parents"]) for s in seed_lists) / n_strands
+        print(f"  {name:6s}: per strand {t_old:.3f}s, batched {t_new:.3f}s ({t_old / t_new:.1f}x), same trees: {same}, {kept:,.0f} edges per strand")
+
+# %%
+benchmark_batched_filter()
+# %%
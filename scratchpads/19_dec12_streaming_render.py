@@ -0,0 +1,229 @@
+# %%
+"""Rendering strands: the recursive renderer vs the explicit-stack one, in memory and streamed to data/strands/*.json."""
+import gc
+import json
+import re
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from pathlib import Path
+
+SCRATCHPADS_DIR = Path(__file__).parent
+STRANDS_DIR = SCRATCHPADS_DIR / "data" / "strands"
+
+# %%
+def render_recursive(
+    filtered_trees,
+    tweet_dict,
+    render_header,
+    image_descriptions={},
+):
+    """The previous renderer (a list per node, extended into its parent), kept as the baseline."""
+    output_lines = []
+    
+    # Sort conversations to make output deterministic
+    sorted_conv_ids = sorted(filtered_trees.keys())
+    
+    for conv_id in sorted_conv_ids:
+        tree = filtered_trees[conv_id]
+        
+        # Collect all nodes in the filtered tree
+        nodes_to_show = set(tree["parents"].keys())
+        nodes_to_show.update(tree["parents"].values())
+        for children_list in tree["children"].values():
+            nodes_to_show.update(children_list)
+        if tree["root"] is not None:
+            nodes_to_show.add(tree["root"])
+        
+        # Identify display roots (nodes whose parent is not in filtered set)
+        display_roots = []
+        for node in nodes_to_show:
+            parent = tree["parents"].get(node)
+            if parent is None or parent not in nodes_to_show:
+                display_roots.append(node)
+        
+        display_roots.sort()
+        
+        # Render each component
+        for root in display_roots:
+            output_lines.extend(render_node_recursive(root, nodes_to_show, tree, tweet_dict, render_header=render_header, image_descriptions=image_descriptions))
+            output_lines.append("\n===\n")
+    
+    return "\n".join(output_lines)
+
+
+def render_node_recursive(
+    node_id: int,
+    visible_nodes,
+    tree,
+    tweets,
+    prefix: str = "",
+    is_last_child: bool = True,
+    is_root_of_view: bool = True,
+    render_header=None,
+    image_descriptions={},
+    is_linear_continuation: bool = False
+):
+    lines = []
+    tweet = tweets.get(node_id)
+    if not tweet:
+        return []
+
+    # Handle quoted text
+    quoted_text_block = []
+    q_id = tweet.get("quoted_tweet_id")
+    if q_id is not None:
+        q_tweet = tweets.get(q_id)
+        if q_tweet:
+            q_text = q_tweet.get("full_text", "").replace("\n", " ")
+            quoted_text_block.append(f"  [Quoting @{q_tweet.get('username')}: {q_text}]")
+        else:
+             quoted_text_block.append(f"  [Quoting Tweet {q_id} (missing)]")
+
+    # Format main text
+    full_text = tweet.get("full_text", "")
+    text_lines = full_text.split("\n")
+    
+    connector = ""
+    if not is_root_of_view and not is_linear_continuation:
+        connector = "└── " if is_last_child else "├── "
+    
+    header = f"{connector}{render_header(tweet)}"
+    lines.append(prefix + header)
+    
+    # Determine indentation for content and children
+    if is_root_of_view or is_linear_continuation:
+        child_prefix = prefix
+        content_prefix = prefix
+    else:
+        child_prefix = prefix + ("    " if is_last_child else "│   ")
+        content_prefix = child_prefix 
+    
+    for line in text_lines:
+        lines.append(f"{content_prefix}{line}")
+        
+    for q_line in quoted_text_block:
+        lines.append(f"{content_prefix}{q_line}")
+
+    # Render images
+    image_descriptions_list = image_descriptions.get(node_id, [])
+    if image_descriptions_list:
+        lines.append(f"{content_prefix}Images:")
+        for i, image_desc in enumerate(image_descriptions_list):
+            description = image_desc['description']
+            description_lines = description.split('\n')
+            for j, desc_line in enumerate(description_lines):
+                if j == 0:
+                    lines.append(f"{content_prefix}  - [Image #{i}] {desc_line}")
+                else:
+                    lines.append(f"{content_prefix}    {desc_line}")
+    # Process children
+    children = [c for c in tree["children"].get(node_id, []) if c in visible_nodes]
+    children.sort()
+    
+    if len(children) == 1:
+        lines.append(f"{content_prefix}↓")
+        lines.extend(render_node_recursive(
+            children[0], 
+            visible_nodes, 
+            tree, 
+            tweets, 
+            child_prefix, 
+            is_last_child=True, 
+            is_root_of_view=False,
+            render_header=render_header,
+            image_descriptions=image_descriptions,
+            is_linear_continuation=True
+        ))
+    else:
+        for i, child in enumerate(children):
+            is_last = (i == len(children) - 1)
+            lines.extend(render_node_recursive(
+                child, 
+                visible_nodes, 
+                tree, 
+                tweets, 
+                child_prefix, 
+                is_last, 
+                is_root_of_view=False,
+                render_header=render_header,
+                image_descriptions=image_descriptions,
+                is_linear_continuation=False
+            ))
+        
+    return lines
+
+
+def strand_seeds(path: Path):
+    """Seed id -> seed type of a saved strand, read back from its "[(SEED) type=...]" header tags."""
+    text = json.loads(path.read_text())["thread_text"]
+    return {int(tid): kind for tid, kind in re.findall(r"^[│├└─ ↓]*(\d+) \[.*\[\(SEED\) type=(\w+)\]$", text, re.M)}
+
+
+def benchmark_render(n_strands: int = 5, depth: int = 10):
+    """Re-render the largest existing strands from their seeds both ways, then stream one to disk."""
+    from lib.conversation_explorer import (
+        filter_conversation_trees, iter_conversation_trees, render_conversation_trees, strand_header_print_factory
+    )
+    from lib.image_describer import DEFAULT_CACHE_PATH, load_img_cache
+    from lib.strand_builder import write_strand_json
+    from lib.strand_caches import load_caches
+
+    tweet_dict, conversation_trees = load_caches()
+    image_cache = load_img_cache(DEFAULT_CACHE_PATH)
+    largest = sorted(STRANDS_DIR.glob("*.json"), key=lambda p: -p.stat().st_size)[:n_strands]
+    out_dir = Path(tempfile.mkdtemp())
+    for path in largest:
+        seed_info = strand_seeds(path)
+        trees = filter_conversation_trees(list(seed_info), conversation_trees, tweet_dict, depth)
+        header = strand_header_print_factory(seed_info)
+        gc.collect()
+        t0 = time.time()
+        old = render_recursive(trees, tweet_dict, header, image_cache)
+        t_old = time.time() - t0
+        gc.collect()
+        t0 = time.time()
+        new = render_conversation_trees(trees, tweet_dict, header, image_cache)
+        t_new = time.time() - t0
+        print(f"{path.stem}: {len(seed_info)} seeds, {len(new):,} chars, recursive {t_old:.3f}s, "
+              f"stack {t_new:.3f}s, identical: {old == new}")
+        if not new.strip():
+            continue  # seeds missing from these caches; blank strands aren't saved
+
+        # Streamed file vs json.dump of the whole text, with peak Python allocations of each
+        tid = int(path.stem)
+        tracemalloc.start()
+        text = render_conversation_trees(trees, tweet_dict, header, image_cache)
+        with open(out_dir / "dumped.json", "w") as f:
+            json.dump({"tweet_id": tid, "thread_text": text, "seed_ids": list(seed_info)}, f, indent=2)
+        peak_dump = tracemalloc.get_traced_memory()[1]
+        del text
+        tracemalloc.reset_peak()
+        write_strand_json(out_dir / "streamed.json", tid, iter_conversation_trees(trees, tweet_dict, header, image_cache), list(seed_info))
+        peak_stream = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        same = (out_dir / "dumped.json").read_bytes() == (out_dir / "streamed.json").read_bytes()
+        print(f"    json.dump peak {peak_dump / 1e6:.1f} MB, streamed peak {peak_stream / 1e6:.1f} MB, same bytes: {same}")
+
+
+def benchmark_deep_chain(n: int = 50_000):
+    """A single reply chain n tweets long: the recursive renderer hits the recursion limit."""
+    tweets = {i: {"tweet_id": i, "username": "u", "full_text": f"reply {i}"} for i in range(n)}
+    tree = {"root": 0, "parents": {i: i - 1 for i in range(1, n)}, "children": defaultdict(list, {i: [i + 1] for i in range(n - 1)})}
+    from lib.conversation_explorer import _render_header_default, render_conversation_trees
+
+    try:
+        render_recursive({0: tree}, tweets, _render_header_default)
+        print("recursive: ok")
+    except RecursionError:
+        print(f"recursive: RecursionError on a {n:,}-tweet chain")
+    t0 = time.time()
+    text = render_conversation_trees({0: tree}, tweets)
+    print(f"stack: {len(text.splitlines()):,} lines in {time.time() - t0:.3f}s")
+
+# %%
+benchmark_render()
+# %%
+benchmark_deep_chain()
+# %%
@@ -0,0 +1,70 @@
+# %%
+"""Phase 4 over many overlapping strands: every strand formats its tweets vs one RenderFragments shared by the batch."""
+import gc
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+SCRATCHPADS_DIR = Path(__file__).parent
+
+# %%
+def overlapping_strands(n_tweets: int = 20_000, n_strands: int = 256, seeds_per_strand: int = 12, seed: int = 0):
+    """Tweets of one busy conversation (text, quotes, images) and strands whose seeds come from a shared pool."""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    root = 1_000_000
+    ids = root + np.arange(n_tweets)
+    parent_pos = np.maximum(np.arange(n_tweets) - rng.integers(1, 40, size=n_tweets), 0)
+    start = datetime(2021, 1, 1)
+    tweet_dict, images = {}, {}
+    for i, tid in enumerate(ids.tolist()):
+        tweet_dict[tid] = {
+            "tweet_id": tid,
+            "username": f"user{i % 500}",
+            "created_at": start + timedelta(minutes=i),
+            "conversation_id": root,
+            "full_text": f"reply {i}, line one\nline two of {tid}\n" + "words " * int(rng.integers(5, 40)),
+            "favorite_count": int(rng.integers(0, 1000)),
+            "retweet_count": int(rng.integers(0, 50)),
+        }
+        if i and i % 9 == 0:
+            tweet_dict[tid]["quoted_tweet_id"] = int(ids[rng.integers(0, i)])
+        if i % 13 == 0:
+            images[tid] = [{"description": f"A picture in tweet {tid}\nwith a second line"}]
+    reply_to = np.where(np.arange(n_tweets) == 0, np.iinfo(np.int64).min, ids[parent_pos])
+    pool = rng.choice(ids, size=n_strands * 2, replace=False)
+    seed_lists = {s: rng.choice(pool, size=seeds_per_strand, replace=False).tolist() for s in range(n_strands)}
+    return root, ids, reply_to, tweet_dict, images, seed_lists
+
+
+def benchmark_fragments(depth: int = 10):
+    import numpy as np
+    from lib.cache_builder import forest_arrays_from_columns
+    from lib.conversation_explorer import (
+        RenderFragments, filter_conversation_trees_batch, render_conversation_trees, strand_header_print_factory
+    )
+    from lib.conversation_forest import ConversationForest
+
+    root, ids, reply_to, tweet_dict, images, seed_lists = overlapping_strands()
+    forest = ConversationForest.from_arrays(forest_arrays_from_columns(ids, reply_to, np.full(len(ids), root))[0])
+    trees = filter_conversation_trees_batch(seed_lists, forest, tweet_dict, depth)
+    headers = {s: strand_header_print_factory({tid: "semantic_search" for tid in seeds}) for s, seeds in seed_lists.items()}
+    shown = sum(len(t[root]["parents"]) + 1 for t in trees.values())
+    print(f"{len(seed_lists)} strands, {shown:,} tweets shown in total")
+
+    gc.collect()
+    t0 = time.time()
+    old = {s: render_conversation_trees(trees[s], tweet_dict, headers[s], images) for s in seed_lists}
+    t_old = time.time() - t0
+    gc.collect()
+    t0 = time.time()
+    fragments = RenderFragments(tweet_dict, images)
+    new = {s: render_conversation_trees(trees[s], tweet_dict, headers[s], images, fragments) for s in seed_lists}
+    t_new = time.time() - t0
+    print(f"Per strand: {t_old:.3f}s, shared fragments: {t_new:.3f}s ({t_old / t_new:.1f}x), same text: {old == new}")
+    print(fragments)
+
+# %%
+benchmark_fragments()
+# %%
@@ -0,0 +1,59 @@
+# %%
+"""Phase 4 of build_strands_phased: render_strands serially vs in a process pool attached to the tweet store."""
+import gc
+import os
+import time
+from pathlib import Path
+
+SCRATCHPADS_DIR = Path(__file__).parent
+
+# %%
+def strands_from_largest_trees(conversation_trees, tweet_dict, n_strands: int, seeds_per_strand: int = 8, depth: int = 10):
+    """(tid, filtered trees, seed_info) for one strand per large conversation: its root plus random replies."""
+    import numpy as np
+    from lib.conversation_explorer import filter_conversation_trees_batch
+
+    seg = conversation_trees._segments[0]
+    sizes = np.diff(np.append(seg.tree_start, len(seg.node_ids)))
+    rng = np.random.default_rng(0)
+    seed_lists = {}
+    for t in np.argsort(-sizes)[:n_strands].tolist():
+        tree = conversation_trees[int(seg.tree_ids[t])]
+        nodes = tree.node_ids()
+        seeds = rng.choice(nodes, size=min(seeds_per_strand, len(nodes)), replace=False).tolist()
+        root = tree.root if tree.root is not None else int(nodes[0])
+        seed_lists[root] = list(dict.fromkeys([root] + seeds))
+    trees = filter_conversation_trees_batch(seed_lists, conversation_trees, tweet_dict, depth)
+    return [
+        (tid, trees[tid], {s: 'root' if s == tid else 'semantic_search' for s in seeds})
+        for tid, seeds in seed_lists.items()
+    ]
+
+
+def benchmark_parallel_render(n_strands: int = 400, workers=(2, 4, 8)):
+    from lib.image_describer import DEFAULT_CACHE_PATH, load_img_cache
+    from lib.strand_builder import render_strands
+    from lib.strand_caches import load_caches
+
+    tweet_dict, conversation_trees = load_caches()
+    image_cache = load_img_cache(DEFAULT_CACHE_PATH) if Path(DEFAULT_CACHE_PATH).exists() else {}
+    to_render = strands_from_largest_trees(conversation_trees, tweet_dict, n_strands)
+    print(f"{len(to_render)} strands, {os.cpu_count()} CPUs, worker context: {tweet_dict!r}")
+
+    gc.collect()
+    t0 = time.time()
+    serial = render_strands(to_render, tweet_dict, image_cache)
+    t_serial = time.time() - t0
+    chars = sum(len(r.thread_text) for r in serial.values())
+    print(f"serial:     {t_serial:.2f}s ({chars / 1e6:.1f}M chars)")
+    for n in workers:
+        gc.collect()
+        t0 = time.time()
+        pooled = render_strands(to_render, tweet_dict, image_cache, render_workers=n)
+        t_pool = time.time() - t0
+        same = list(pooled) == list(serial) and all(pooled[t].thread_text == serial[t].thread_text for t in serial)
+        print(f"{n} workers:  {t_pool:.2f}s ({t_serial / t_pool:.1f}x), same text and order: {same}")
+
+# %%
+benchmark_parallel_render()
+# %%
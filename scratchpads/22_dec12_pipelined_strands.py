@@ -0,0 +1,83 @@
+# %%
+"""Barrier-synchronised phases vs a pipeline: time to first strand and throughput when a few searches are slow."""
+import json
+import random
+import time
+from pathlib import Path
+
+SCRATCHPADS_DIR = Path(__file__).parent
+TOP_IDS_PATH = SCRATCHPADS_DIR / "data" / "top_quoted_tweet_ids.json"
+
+# %%
+# Simulated stage latencies: most semantic searches are quick, a few hit a slow shard
+def _seeds(tid, _=None):
+    time.sleep(3.0 if tid % 25 == 0 else random.uniform(0.05, 0.3))
+    return tid
+
+
+def _filter(tid, _=None):
+    time.sleep(0.01)
+    return tid
+
+
+def _images(tid, _=None):
+    time.sleep(random.uniform(0.05, 0.4))
+    return tid
+
+
+def _render(tid, _=None):
+    time.sleep(0.005)
+    return tid
+
+
+def benchmark_synthetic(n_strands: int = 100):
+    """Same workers per stage both ways; the phased run reaches its first output only after every phase."""
+    from lib.parallel import PipelineStage, parallel_map_to_dict, run_pipeline
+
+    random.seed(0)
+    keys = list(range(1, n_strands + 1))
+    t0 = time.time()
+    for fn, workers in ((_seeds, 4), (_filter, 8), (_images, 2)):
+        parallel_map_to_dict(keys, fn, max_workers=workers, desc=fn.__name__)
+    first = time.time() - t0
+    for k in keys:
+        _render(k)
+    t_phased = time.time() - t0
+    print(f"phased:    first strand {first:.2f}s, all {t_phased:.2f}s ({n_strands / t_phased:.1f}/s)")
+
+    random.seed(0)
+    _, _, metrics = run_pipeline(keys, [
+        PipelineStage("seeds", _seeds, 4, queue_size=8),
+        PipelineStage("trees", _filter, 8, queue_size=8),
+        PipelineStage("images", _images, 2, queue_size=8),
+        PipelineStage("render", _render, 1, queue_size=8),
+    ])
+    print(f"pipelined: first strand {metrics.first_output:.2f}s, all {metrics.elapsed:.2f}s ({metrics.throughput:.1f}/s)")
+    print(metrics)
+
+
+def benchmark_strands(n_strands: int = 20, depth: int = 10):
+    """The real builders on top quoted tweets (semantic search and image APIs, so needs network and keys)."""
+    from lib.image_describer import DEFAULT_CACHE_PATH, load_img_cache
+    from lib.strand_builder import build_strands_phased, build_strands_pipelined
+    from lib.strand_caches import get_quote_tweets_dict, load_caches
+
+    quote_dict = get_quote_tweets_dict()
+    tweet_dict, conversation_trees = load_caches()
+    image_cache = load_img_cache(DEFAULT_CACHE_PATH)
+    tweet_ids = json.loads(TOP_IDS_PATH.read_text())[:n_strands]
+
+    t0 = time.time()
+    phased, _ = build_strands_phased(tweet_ids, tweet_dict, quote_dict, conversation_trees, image_cache, depth=depth)
+    t_phased = time.time() - t0
+    pipelined, _, metrics = build_strands_pipelined(tweet_ids, tweet_dict, quote_dict, conversation_trees, image_cache, depth=depth)
+    print(f"phased {t_phased:.1f}s; pipelined {metrics.elapsed:.1f}s, first strand after {metrics.first_output:.1f}s")
+    # Semantic search results can change between calls, so compare what both built
+    same = [t for t in phased if t in pipelined and phased[t].thread_text == pipelined[t].thread_text]
+    print(f"{len(same)}/{len(phased)} strands identical")
+
+# %%
+benchmark_synthetic()
+# %%
+benchmark_strands()
+# %%
@@ -0,0 +1,100 @@
+# %%
+"""Thread-pool phases vs asyncio strands on one HTTP pool, and the persistent semantic search cache."""
+import asyncio
+import json
+import tempfile
+import time
+from pathlib import Path
+
+SCRATCHPADS_DIR = Path(__file__).parent
+TOP_IDS_PATH = SCRATCHPADS_DIR / "data" / "top_quoted_tweet_ids.json"
+
+# %%
+def benchmark_search_cache(n_terms: int = 200, repeats: int = 3):
+    """Hit rate over repeated rebuilds, then an offline rerun that must not touch the network."""
+    from lib.search_cache import SearchCache, SearchCacheMiss, search_key
+
+    with tempfile.TemporaryDirectory() as d:
+        cache = SearchCache(Path(d) / "search.diskcache", ttl_days=1, size_limit_mb=16)
+        terms = [f"search term {i}" for i in range(n_terms)]
+        for _ in range(repeats):
+            for term in terms:
+                key = search_key(term, 100, 0.5, None)
+                if cache.get(key) is None:
+                    cache.count_network_call()
+                    cache.set(key, [{"key": str(i), "distance": 0.3, "metadata": {}} for i in range(100)])
+        print(f"{repeats} rebuilds: {cache}")
+
+        cache.offline = True
+        t0 = time.time()
+        for term in terms:
+            cache.get(search_key(term, 100, 0.5, None))
+        print(f"offline rerun of {n_terms} searches: {time.time() - t0:.3f}s, {cache.network_calls} network calls in total")
+        try:
+            cache.get(search_key("never searched", 100, 0.5, None))
+        except SearchCacheMiss as e:
+            print(f"offline miss fails fast: {e}")
+        cache.close()
+
+
+def benchmark_concurrency(n_requests: int = 400, latency: float = 0.2):
+    """The same number of slow requests through 8 threads vs coroutines bounded by the per-host limit (16 here)."""
+    import httpx
+    from lib.async_http import AsyncHTTP
+    from lib.parallel import parallel_map_to_dict
+
+    def slow_sync(request):
+        time.sleep(latency)
+        return httpx.Response(200, json={"ok": True})
+
+    with httpx.Client(transport=httpx.MockTransport(slow_sync)) as client:
+        t0 = time.time()
+        parallel_map_to_dict(list(range(n_requests)), lambda i: client.get(f"https://embed.tweetstack.app/{i}").json(), max_workers=8, desc="threads")
+        t_threads = time.time() - t0
+
+    async def slow_async(request):
+        await asyncio.sleep(latency)
+        return httpx.Response(200, json={"ok": True})
+
+    async def run():
+        async with AsyncHTTP() as http:
+            await http.client.aclose()
+            http.client = httpx.AsyncClient(transport=httpx.MockTransport(slow_async))
+            await asyncio.gather(*(http.get(f"https://embed.tweetstack.app/{i}") for i in range(n_requests)))
+
+    t0 = time.time()
+    asyncio.run(run())
+    t_async = time.time() - t0
+    print(f"{n_requests} requests of {latency}s: 8 threads {t_threads:.1f}s, asyncio {t_async:.1f}s ({t_threads / t_async:.1f}x)")
+
+
+def benchmark_strands(n_strands: int = 50, depth: int = 10):
+    """The real builders on top quoted tweets (semantic search and image APIs, so needs network and keys)."""
+    from lib.async_strands import build_strands_async
+    from lib.image_describer import DEFAULT_CACHE_PATH, load_img_cache
+    from lib.search_cache import get_search_cache
+    from lib.strand_builder import build_strands_phased
+    from lib.strand_caches import get_quote_tweets_dict, load_caches
+
+    quote_dict = get_quote_tweets_dict()
+    tweet_dict, conversation_trees = load_caches()
+    image_cache = load_img_cache(DEFAULT_CACHE_PATH)
+    tweet_ids = json.loads(TOP_IDS_PATH.read_text())[:n_strands]
+
+    t0 = time.time()
+    phased, _ = build_strands_phased(tweet_ids, tweet_dict, quote_dict, conversation_trees, image_cache, depth=depth)
+    t_phased = time.time() - t0
+    t0 = time.time()
+    concurrent, _ = asyncio.run(build_strands_async(tweet_ids, tweet_dict, quote_dict, conversation_trees, image_cache, depth=depth))
+    t_async = time.time() - t0
+    print(f"phased {t_phased:.1f}s, async {t_async:.1f}s")
+    same = [t for t in phased if t in concurrent and phased[t].thread_text == concurrent[t].thread_text]
+    print(f"{len(same)}/{len(phased)} strands identical; {get_search_cache()}")
+
+# %%
+benchmark_search_cache()
+# %%
+benchmark_concurrency()
+# %%
+benchmark_strands()
+# %%
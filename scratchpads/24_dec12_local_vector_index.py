@@ -0,0 +1,90 @@
+# %%
+"""Local vector index vs the search API: build time, query latency and recall of float16, int8 and IVF search."""
+import json
+import tempfile
+import time
+from pathlib import Path
+
+SCRATCHPADS_DIR = Path(__file__).parent
+TOP_IDS_PATH = SCRATCHPADS_DIR / "data" / "top_quoted_tweet_ids.json"
+
+# %%
+def synthetic_queue(directory: Path, n_files: int = 4, rows: int = 25_000, dim: int = 1018, n_topics: int = 200, seed: int = 0):
+    """Embedding-queue parquets of clustered random vectors (key, metadata, v0..v{dim-1})."""
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    rng = np.random.default_rng(seed)
+    topics = rng.standard_normal((n_topics, dim)).astype(np.float32)
+    directory.mkdir(parents=True, exist_ok=True)
+    for f in range(n_files):
+        topic = rng.integers(0, n_topics, rows)
+        x = topics[topic] + rng.standard_normal((rows, dim)).astype(np.float32)
+        keys = [str(10**15 + f * rows + i) for i in range(rows)]
+        metadata = [json.dumps({"text": f"tweet {k} on topic {t}", "original_text": f"Tweet {k} on topic {t}"}) for k, t in zip(keys, topic)]
+        columns = {"key": keys, "metadata": metadata, **{f"v{j}": x[:, j] for j in range(dim)}}
+        pq.write_table(pa.table(columns), directory / f"queue-2025-11-{f + 1:02d}T00-00-00-000Z-synthetic.pending.parquet")
+
+
+def benchmark_index(n_queries: int = 50, k: int = 100, nprobes=(4, 16)):
+    import numpy as np
+    from lib.vector_index import build_vector_index, embedding_queue_files
+
+    with tempfile.TemporaryDirectory() as d:
+        d = Path(d)
+        synthetic_queue(d / "queue")
+        files = embedding_queue_files(d / "queue")
+        t0 = time.time()
+        f16 = build_vector_index(files, d / "f16")
+        print(f"float16 build {time.time() - t0:.1f}s: {f16}")
+        t0 = time.time()
+        i8 = build_vector_index(files, d / "i8", dtype="int8", n_lists=128)
+        print(f"int8 + IVF build {time.time() - t0:.1f}s: {i8}")
+
+        # Exact float32 ground truth
+        x = np.asarray(f16.vectors, dtype=np.float32)
+        queries = np.random.default_rng(1).choice(len(x), n_queries, replace=False)
+        truth = [set(np.argsort(-(x @ x[q]))[:k].tolist()) for q in queries]
+        row_of = {int(t): i for i, t in enumerate(f16.tweet_ids)}
+
+        def run(name, index, **kw):
+            t0 = time.time()
+            found = [index.search(x[q], k=k, threshold=-1, **kw) for q in queries]
+            ms = (time.time() - t0) / n_queries * 1000
+            rows = [{row_of[int(r["key"])] for r in res} for res in found]
+            recall = np.mean([len(r & t) / k for r, t in zip(rows, truth)])
+            print(f"{name:<16} {ms:7.1f} ms/query, recall@{k} {recall:.3f}")
+
+        run("float16 exact", f16)
+        run("int8 exact", i8)
+        for nprobe in nprobes:
+            run(f"int8 IVF {nprobe}/128", i8, nprobe=nprobe)
+
+
+def benchmark_against_api(n_queries: int = 20, k: int = 100, threshold: float = 0.5):
+    """Seeds of top quoted tweets from the API and from the local index (needs the embedding queue, network for the API)."""
+    from lib.semantic_search import search_embeddings, use_local_index
+    from lib.strand_caches import load_caches
+    from lib.vector_index import VECTOR_INDEX_DIR, build_vector_index
+
+    index = use_local_index(VECTOR_INDEX_DIR) if VECTOR_INDEX_DIR.exists() else use_local_index(build_vector_index())
+    print(index)
+    tweet_dict, _ = load_caches()
+    texts = [tweet_dict[t]["full_text"] for t in json.loads(TOP_IDS_PATH.read_text())[:n_queries] if t in tweet_dict]
+    t0 = time.time()
+    local = [search_embeddings(text, k=k, threshold=threshold) for text in texts]
+    t_local = time.time() - t0
+    use_local_index(None)
+    t0 = time.time()
+    remote = [search_embeddings(text, k=k, threshold=threshold, use_cache=False) for text in texts]
+    t_remote = time.time() - t0
+    overlap = [len({r["key"] for r in a} & {r["key"] for r in b}) / max(len(b), 1) for a, b in zip(local, remote) if a]
+    print(f"API {t_remote / len(texts) * 1000:.0f} ms/query, local {t_local / len(texts) * 1000:.0f} ms/query")
+    print(f"{len(overlap)}/{len(texts)} queries found in the index, mean overlap with the API {sum(overlap) / max(len(overlap), 1):.2f}")
+
+# %%
+benchmark_index()
+# %%
+benchmark_against_api()
+# %%
@@ -0,0 +1,78 @@
+# %%
+"""Phase 1 seeding: one local search per seed tweet vs one batched pass (GEMM + partial sort) for the whole batch."""
+import json
+import tempfile
+import time
+from pathlib import Path
+
+SCRATCHPADS_DIR = Path(__file__).parent
+TOP_IDS_PATH = SCRATCHPADS_DIR / "data" / "top_quoted_tweet_ids.json"
+
+# %%
+def synthetic_queue(directory: Path, rows: int = 100_000, dim: int = 1018, n_topics: int = 200, seed: int = 0):
+    """One embedding-queue parquet of clustered random vectors (as in 24_dec12_local_vector_index.py)."""
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    rng = np.random.default_rng(seed)
+    x = rng.standard_normal((n_topics, dim)).astype(np.float32)[rng.integers(0, n_topics, rows)]
+    x += rng.standard_normal((rows, dim)).astype(np.float32)
+    keys = [str(10**15 + i) for i in range(rows)]
+    columns = {"key": keys, "metadata": [json.dumps({"text": f"tweet {k}"}) for k in keys], **{f"v{j}": x[:, j] for j in range(dim)}}
+    directory.mkdir(parents=True, exist_ok=True)
+    pq.write_table(pa.table(columns), directory / "queue-2025-11-01T00-00-00-000Z-synthetic.pending.parquet")
+
+
+def benchmark_batch(n_queries=(16, 64, 256), k: int = 100):
+    """Per-query search vs search_batch on 100k synthetic embeddings."""
+    import numpy as np
+    from lib.vector_index import build_vector_index, embedding_queue_files
+
+    with tempfile.TemporaryDirectory() as d:
+        d = Path(d)
+        synthetic_queue(d / "queue")
+        for dtype in ("float16", "int8"):
+            index = build_vector_index(embedding_queue_files(d / "queue"), d / dtype, dtype=dtype)
+            print(index)
+            rng = np.random.default_rng(0)
+            for n in n_queries:
+                queries = [index.row_vector(int(r)) for r in rng.choice(len(index), n, replace=False)]
+                t0 = time.time()
+                single = [index.search(q, k=k, threshold=-1) for q in queries]
+                t_single = time.time() - t0
+                t0 = time.time()
+                batch = index.search_batch(queries, k=k, threshold=-1)
+                t_batch = time.time() - t0
+                same = all({r["key"] for r in a} == {r["key"] for r in b} for a, b in zip(single, batch))
+                print(f"  {n:>4} queries: one by one {t_single:.2f}s, batched {t_batch:.2f}s "
+                      f"({t_single / t_batch:.1f}x), same results: {same}")
+
+
+def benchmark_seeds(n_strands: int = 256):
+    """get_strand_seeds per tweet vs get_strand_seeds_batch on the local index of the embedding queue."""
+    from lib.semantic_search import use_local_index
+    from lib.strand_builder import get_strand_seeds, get_strand_seeds_batch
+    from lib.strand_caches import get_quote_tweets_dict, load_caches
+    from lib.vector_index import VECTOR_INDEX_DIR
+
+    print(use_local_index(VECTOR_INDEX_DIR))
+    quote_dict = get_quote_tweets_dict()
+    tweet_dict, _ = load_caches()
+    tweet_ids = json.loads(TOP_IDS_PATH.read_text())[:n_strands]
+
+    t0 = time.time()
+    single = {tid: get_strand_seeds(tid, tweet_dict, quote_dict) for tid in tweet_ids}
+    t_single = time.time() - t0
+    t0 = time.time()
+    batch = get_strand_seeds_batch(tweet_ids, tweet_dict, quote_dict)
+    t_batch = time.time() - t0
+    print(f"{len(tweet_ids)} strands: one by one {t_single:.1f}s, batched {t_batch:.1f}s ({t_single / t_batch:.1f}x), "
+          f"same seeds: {single == batch}")
+    use_local_index(None)
+
+# %%
+benchmark_batch()
+# %%
+benchmark_seeds()
+# %%
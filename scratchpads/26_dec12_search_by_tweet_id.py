@@ -0,0 +1,55 @@
+# %%
+"""Seed searches by tweet_id (stored vector) vs by full_text: how many queries each resolves, and how fast."""
+import json
+import time
+from pathlib import Path
+
+SCRATCHPADS_DIR = Path(__file__).parent
+TOP_IDS_PATH = SCRATCHPADS_DIR / "data" / "top_quoted_tweet_ids.json"
+
+# %%
+def benchmark_query_resolution(n_tweets: int = 1000):
+    """Queries resolved to a stored vector by tweet id and by exact text, on the local index of the embedding queue."""
+    from lib.strand_caches import load_caches
+    from lib.vector_index import VectorIndex
+
+    index = VectorIndex()
+    print(index)
+    tweet_dict, _ = load_caches()
+    tweet_ids = [t for t in json.loads(TOP_IDS_PATH.read_text())[:n_tweets] if t in tweet_dict]
+
+    t0 = time.time()
+    by_id = index.query_vectors([None] * len(tweet_ids), tweet_ids=tweet_ids)
+    t_id = time.time() - t0
+    t0 = time.time()
+    by_text = index.query_vectors([tweet_dict[t]["full_text"] for t in tweet_ids])
+    t_text = time.time() - t0
+    n_id = sum(v is not None for v in by_id)
+    n_text = sum(v is not None for v in by_text)
+    print(f"{len(tweet_ids)} tweets: by tweet_id {n_id} resolved in {t_id:.2f}s, by text {n_text} in {t_text:.2f}s")
+    print(f"{sum(a is None and b is not None for a, b in zip(by_id, by_text))} only by text, "
+          f"{sum(a is not None and b is None for a, b in zip(by_id, by_text))} only by tweet_id "
+          f"(these would need the text re-embedded)")
+
+
+def benchmark_repeatability(n_tweets: int = 50):
+    """Seeds for the same tweets on two runs: the API re-embeds the text each time, the local index reuses vectors."""
+    from lib.semantic_search import use_local_index
+    from lib.strand_builder import get_strand_seeds_batch
+    from lib.strand_caches import get_quote_tweets_dict, load_caches
+    from lib.vector_index import VECTOR_INDEX_DIR
+
+    quote_dict = get_quote_tweets_dict()
+    tweet_dict, _ = load_caches()
+    tweet_ids = json.loads(TOP_IDS_PATH.read_text())[:n_tweets]
+    use_local_index(VECTOR_INDEX_DIR)
+    first = get_strand_seeds_batch(tweet_ids, tweet_dict, quote_dict)
+    second = get_strand_seeds_batch(tweet_ids, tweet_dict, quote_dict)
+    use_local_index(None)
+    print(f"local index: {sum(first[t] == second[t] for t in tweet_ids)}/{len(tweet_ids)} strands with identical seeds")
+
+# %%
+benchmark_query_resolution()
+# %%
+benchmark_repeatability()
+# %%
@@ -0,0 +1,79 @@
+# %%
+"""Seed search: over-fetch k=100 then filter client-side vs retweet/quote/keyword masks pushed into the local index."""
+import json
+import tempfile
+import time
+from pathlib import Path
+
+SCRATCHPADS_DIR = Path(__file__).parent
+
+# %%
+def synthetic_corpus(directory: Path, n: int = 50_000, dim: int = 1018, n_topics: int = 100, n_roots: int = 500, seed: int = 0):
+    """Embedding-queue parquet and tweet dict: topical tweets, 1 in 8 a retweet, 1 in 5 a quote sitting near its root."""
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    rng = np.random.default_rng(seed)
+    words = "crypto dating jhana ai safety regulation meditation food cats music art war peace sun moon".split()
+    x = rng.standard_normal((n_topics, dim)).astype(np.float32)[rng.integers(0, n_topics, n)]
+    x += 0.9 * rng.standard_normal((n, dim)).astype(np.float32)
+    base = 10**15
+    tweet_dict = {}
+    for i in range(n):
+        text = " ".join(rng.choice(words, 6)) + f" #{i}"
+        tweet = {"tweet_id": base + i, "full_text": ("RT @someone: " if i % 8 == 0 else "") + text,
+                 "quoted_count": int(rng.integers(0, 50)), "quoted_tweet_id": None}
+        if i >= n_roots and i % 5 == 0:
+            root = int(rng.integers(0, n_roots))
+            tweet["quoted_tweet_id"] = base + root
+            x[i] = x[root] + 0.3 * rng.standard_normal(dim)
+        tweet_dict[base + i] = tweet
+    columns = {
+        "key": [str(t) for t in tweet_dict],
+        "metadata": [json.dumps({"text": t["full_text"], "tweet_id": str(tid)}) for tid, t in tweet_dict.items()],
+        **{f"v{j}": x[:, j] for j in range(dim)},
+    }
+    directory.mkdir(parents=True, exist_ok=True)
+    pq.write_table(pa.table(columns), directory / "queue-2025-11-01T00-00-00-000Z-synthetic.pending.parquet")
+    return tweet_dict, [base + i for i in range(n_roots)]
+
+
+def benchmark_pushdown(n_roots: int = 200, limit: int = 20, exclude_keywords=("crypto",)):
+    import lib.strand_builder as strand_builder
+    from lib.seed_search import build_seed_filters
+    from lib.semantic_search import search_embeddings_batch, use_local_index
+    from lib.vector_index import build_vector_index, embedding_queue_files
+
+    with tempfile.TemporaryDirectory() as d:
+        d = Path(d)
+        tweet_dict, roots = synthetic_corpus(d / "queue")
+        roots = roots[:n_roots]
+        index = use_local_index(build_vector_index(embedding_queue_files(d / "queue"), d / "index"))
+        t0 = time.time()
+        build_seed_filters(index, tweet_dict)
+        print(f"seed filters built in {time.time() - t0:.1f}s")
+
+        # Client-side, as for the API: one batched search, then filter and sort what came back
+        t0 = time.time()
+        fetched = search_embeddings_batch(
+            [tweet_dict[r]["full_text"] for r in roots], k=100, threshold=0.5, exclude_tweet_ids=[str(r) for r in roots],
+            filter=strand_builder._keyword_filter(list(exclude_keywords)), tweet_ids=roots
+        )
+        client = [strand_builder._filter_semantic_results(r, res, tweet_dict, limit) for r, res in zip(roots, fetched)]
+        t_client = time.time() - t0
+
+        t0 = time.time()
+        pushed = strand_builder._pushdown_semantic_results(roots, tweet_dict, list(exclude_keywords), limit, 100, 0.5)
+        t_pushed = time.time() - t0
+
+        kept = sum(len(c) for c in client) / max(sum(len(f) for f in fetched), 1)
+        print(f"client-side: {t_client:.2f}s, {sum(map(len, fetched)):,} results decoded, {kept:.0%} kept, "
+              f"{sum(len(c) == limit for c in client)}/{len(roots)} roots with {limit} seeds")
+        print(f"pushed down: {t_pushed:.2f}s, {sum(map(len, pushed.values())):,} results decoded, "
+              f"{sum(len(p) == limit for p in pushed.values())}/{len(roots)} roots with {limit} seeds")
+        use_local_index(None)
+
+# %%
+benchmark_pushdown()
+# %%
@@ -0,0 +1,70 @@
+# %%
+"""Search API calls against a local stub: per-call requests.post vs the pooled session (p50/p99), and behaviour under failures."""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+SCRATCHPADS_DIR = Path(__file__).parent
+
+# %%
+def benchmark_pooling(n_searches: int = 400, threads=(1, 8), latency: float = 0.005, jitter: float = 0.005,
+                      connect_latency: float = 0.02):
+    """Latency of the old unpooled requests.post and of the keep-alive session, on the same stub."""
+    import requests
+    from lib.latency import LatencyHistogram
+    from lib.search_session import configure_search_session
+    from lib.search_stub import SearchStubServer
+    from lib.semantic_search import _search_payload
+
+    for n_threads in threads:
+        with SearchStubServer(latency=latency, latency_jitter=jitter, connect_latency=connect_latency) as stub:
+            unpooled = LatencyHistogram(f"requests.post, {n_threads} threads")
+
+            def post(i):
+                with unpooled.time():
+                    requests.post(stub.url, json=_search_payload(f"query {i}", 100, 0.5, None),
+                                  headers={'Content-Type': 'application/json'})
+
+            t0 = time.time()
+            with ThreadPoolExecutor(n_threads) as ex:
+                list(ex.map(post, range(n_searches)))
+            print(f"{unpooled} ({n_searches / (time.time() - t0):.0f}/s, {stub.connections} connections)")
+
+            session = configure_search_session(url=stub.url)
+            session.searches.name = f"pooled session, {n_threads} threads"
+            connections = stub.connections
+            t0 = time.time()
+            with ThreadPoolExecutor(n_threads) as ex:
+                list(ex.map(lambda i: session.search(_search_payload(f"query {i}", 100, 0.5, None)), range(n_searches)))
+            print(f"{session.searches} ({n_searches / (time.time() - t0):.0f}/s, {stub.connections - connections} connections)")
+
+
+def benchmark_failures(n_searches: int = 200, failure_rates=(0.05, 0.2), slow_rate: float = 0.01):
+    """Searches under 503s and a slow tail: what used to come back empty now retries, or raises."""
+    import requests
+    from lib.search_session import SearchAPIError, configure_search_session
+    from lib.search_stub import SearchStubServer
+    from lib.semantic_search import search_embeddings
+
+    for failure_rate in failure_rates:
+        with SearchStubServer(latency=0.005, failure_rate=failure_rate, slow_rate=slow_rate, slow_latency=0.3) as stub:
+            # What the old code did: any non-OK status was an empty result list
+            empty = sum(not requests.post(stub.url, json={'searchTerm': f"q{i}", 'k': 100, 'threshold': 0.5}).ok
+                        for i in range(n_searches))
+
+            session = configure_search_session(url=stub.url, base_delay=0.02, max_retries=4)
+            raised = 0
+            for i in range(n_searches):
+                try:
+                    search_embeddings(f"q{i}", use_cache=False)
+                except SearchAPIError:
+                    raised += 1
+            print(f"failure rate {failure_rate:.0%}: unretried {empty}/{n_searches} empty strands; "
+                  f"retried {raised}/{n_searches} raised")
+            print(f"  {session.searches}\n  {session.requests}")
+
+# %%
+benchmark_pooling()
+# %%
+benchmark_failures()
+# %%
@@ -0,0 +1,154 @@
+# %%
+"""
+Incremental ingest against a full rebuild: killed at every commit step (each
+atomic rename) and re-run, and with a tweet duplicated across the uploads of
+one drop. The stores must match a full rebuild.
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+SCRATCHPADS_DIR = Path(__file__).parent
+DEFAULT_PARQUET_PATH = os.environ.get("ENRICHED_TWEETS_PATH", str(Path.home() / "data" / "enriched_tweets.parquet"))
+
+STORES = ("tweet_store", "reply_forest", "quote_index", "quote_forest")
+
+# %%
+def split_drop(parquet_path: str, out_dir: Path, n_rows: int = 20_000, base_share: float = 0.7):
+    """First n_rows of the parquet as full.parquet, and base.parquet with the first base_share of their uploads."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    table = pq.ParquetFile(parquet_path).iter_batches(batch_size=n_rows).__next__()
+    table = pa.Table.from_batches([table])
+    uploads = sorted(u for u in pc.unique(table["archive_upload_id"]).to_pylist() if u is not None)
+    base_uploads = pa.array(uploads[:max(1, int(len(uploads) * base_share))], type=pa.string())
+    base = table.filter(pc.is_in(table["archive_upload_id"], value_set=base_uploads).fill_null(False))
+    pq.write_table(table, out_dir / "full.parquet", row_group_size=1000)
+    pq.write_table(base, out_dir / "base.parquet", row_group_size=1000)
+    return out_dir / "base.parquet", out_dir / "full.parquet"
+
+
+def build(parquet: Path, root: Path):
+    from lib.cache_builder import build_caches
+    build_caches(parquet, *(root / s for s in STORES[:3]), root / "ingest_manifest.json", quote_forest_dir=root / "quote_forest")
+
+
+def ingest(parquet: Path, root: Path) -> int:
+    from lib.cache_delta import apply_delta
+    return apply_delta(parquet, *(root / s for s in STORES[:3]), root / "ingest_manifest.json", root / "quote_forest")
+
+
+def snapshot(root: Path) -> dict:
+    """Everything a reader can see in the stores, in comparable form."""
+    from lib.cache_delta import load_ingest_manifest
+    from lib.conversation_forest import ConversationForest, materialize_tree
+    from lib.quote_forest import QuoteForest
+    from lib.quote_index import QuoteIndex
+    from lib.tweet_store import TweetStore
+
+    store, forest = TweetStore(root / "tweet_store"), ConversationForest(root / "reply_forest")
+    quotes, chains = QuoteIndex(root / "quote_index"), QuoteForest(root / "quote_forest")
+    return {
+        "tweets": {t: dict(store[t]) for t in store},
+        "trees": {t: materialize_tree(forest[t]) for t in forest},
+        "quotes": {q: sorted(quotes[q]) for q in quotes},
+        "chains": {q: sorted(chains[q]) for q in chains},
+        "uploads": load_ingest_manifest(root / "ingest_manifest.json")["archive_upload_ids"],
+    }
+
+
+def _crash_at(step: int, parquet: Path, root: Path):
+    """Child process: run the ingest, dying just before its step-th rename."""
+    import sys
+    calls = [0]
+    real_replace = os.replace
+
+    def replace(src, dst, *args, **kwargs):
+        calls[0] += 1
+        if calls[0] == step:
+            os._exit(1)
+        return real_replace(src, dst, *args, **kwargs)
+
+    os.replace = replace
+    sys.stdout = open(os.devnull, "w")
+    ingest(parquet, root)
+    sys.stdout.flush()
+    os._exit(0)
+
+
+def check_crash_recovery(parquet_path: str = DEFAULT_PARQUET_PATH, n_rows: int = 20_000, max_steps: int = 200):
+    import contextlib
+    import io
+
+    ctx = multiprocessing.get_context("fork")
+    with tempfile.TemporaryDirectory() as d:
+        d = Path(d)
+        base, full = split_drop(parquet_path, d, n_rows)
+        with contextlib.redirect_stdout(io.StringIO()):
+            build(full, d / "rebuild")
+            build(base, d / "base")
+        expected = snapshot(d / "rebuild")
+
+        for step in range(1, max_steps + 1):
+            run = d / f"run-{step}"
+            shutil.copytree(d / "base", run)
+            child = ctx.Process(target=_crash_at, args=(step, full, run))
+            child.start()
+            child.join()
+            if child.exitcode == 0:
+                print(f"ingest completed without a crash at step {step}: every earlier step was checked")
+                break
+            with contextlib.redirect_stdout(io.StringIO()):
+                ingest(full, run)
+            got = snapshot(run)
+            bad = [k for k in expected if got[k] != expected[k]]
+            print(f"killed before rename {step:>3}: {'matches full rebuild' if not bad else f'MISMATCH in {bad}'}")
+            assert not bad
+            shutil.rmtree(run)
+
+
+def check_duplicated_ids(parquet_path: str = DEFAULT_PARQUET_PATH, n_rows: int = 20_000, n_dupes: int = 50):
+    """A drop where tweets appear in two uploads with different fields: the last copy must win, as in a full build."""
+    import contextlib
+    import io
+
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    with tempfile.TemporaryDirectory() as d:
+        d = Path(d)
+        base, full = split_drop(parquet_path, d, n_rows)
+        base_ids = pq.read_table(base, columns=["tweet_id"])["tweet_id"]
+        table = pq.read_table(full)
+        new = table.filter(pc.invert(pc.is_in(table["tweet_id"], value_set=base_ids)).fill_null(False)).slice(0, n_dupes)
+        # A later upload of the same tweets, with edited text and counts
+        edited = new.set_column(new.schema.get_field_index("full_text"), "full_text",
+                                pc.binary_join_element_wise(new["full_text"], pa.scalar(" (edited)"), ""))
+        edited = edited.set_column(edited.schema.get_field_index("favorite_count"), "favorite_count",
+                                   pc.add(edited["favorite_count"].fill_null(0), 1000))
+        edited = edited.set_column(edited.schema.get_field_index("archive_upload_id"), "archive_upload_id",
+                                   pa.array(["~later-upload"] * len(edited), type=pa.string()))
+        pq.write_table(pa.concat_tables([table, edited]), full, row_group_size=1000)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            build(full, d / "rebuild")
+            build(base, d / "delta")
+            ingest(full, d / "delta")
+        expected, got = snapshot(d / "rebuild"), snapshot(d / "delta")
+        bad = [k for k in expected if got[k] != expected[k]]
+        edited_ids = edited["tweet_id"].to_pylist()
+        kept = sum(got["tweets"][t]["full_text"].endswith(" (edited)") for t in edited_ids)
+        print(f"{len(edited_ids)} tweets duplicated in one drop: {kept} kept the last copy; "
+              f"{'matches full rebuild' if not bad else f'MISMATCH in {bad}'}")
+        assert not bad and kept == len(edited_ids)
+
+# %%
+check_crash_recovery()
+# %%
+check_duplicated_ids()
+# %%
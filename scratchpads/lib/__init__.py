@@ -3,15 +3,22 @@ from .strand_builder import (
     StrandSeed,
     StrandBuildResult,
     get_strand_seeds,
+    get_strand_seeds_batch,
     build_strand_single,
     build_strands_phased,
+    build_strands_pipelined,
+    render_strands,
+    write_strand_json,
 )
+from .async_strands import build_strands_async, get_strand_seeds_async
+from .async_http import AsyncHTTP
 
 # Strand rating
 from .strand_rater import (
     StrandResult,
     rate_strand,
     rate_strands_batch,
+    rate_strands_batch_async,
 )
 
 # Image descriptions
@@ -19,6 +26,7 @@ from .image_describer import (
     MediaDescription,
     get_image_descriptions,
     get_image_descriptions_batch,
+    get_image_descriptions_batch_async,
     load_img_cache,
     save_img_cache,
 )
@@ -28,19 +36,74 @@ from .parallel import (
     parallel_map_to_dict,
     parallel_map_to_dict_with_context,
     batch_keys,
+    process_map_ordered,
+    run_pipeline,
+    PipelineStage,
+    PipelineMetrics,
 )
 
 # Retry utilities
 from .retry import (
     with_retry,
+    with_retry_async,
     is_rate_limit_error,
     is_transient_error,
 )
 
+# Semantic search cache
+from .search_cache import (
+    SearchCache,
+    SearchCacheMiss,
+    get_search_cache,
+    configure_search_cache,
+)
+
+# Search API session
+from .latency import LatencyHistogram
+from .search_session import (
+    SearchSession,
+    SearchAPIError,
+    TransientSearchError,
+    get_search_session,
+    configure_search_session,
+)
+from .search_stub import SearchStubServer
+
+# Local vector search
+from .vector_index import VectorIndex, build_vector_index, embedding_queue_files
+from .semantic_search import search_embeddings, search_embeddings_batch, use_local_index
+from .seed_search import SeedFilters, build_seed_filters, get_seed_filters
+
 # Caches
 from .strand_caches import (
     load_caches,
     get_quote_tweets_dict,
+    get_quote_forest,
     generate_caches,
+    generate_tweet_store,
+    update_caches,
+    check_caches,
+    rebuild_stores,
+)
+
+# Columnar stores
+from .tweet_store import (
+    TweetStore,
+    TweetRow,
+    TweetStoreWriter,
+    build_tweet_store,
+)
+from .tweet_record import TweetRecord
+from .quote_index import QuoteIndex, write_quote_index
+from .quote_forest import QuoteForest, write_quote_forest
+from .cache_builder import build_caches
+from .cache_manifest import BUILDER_VERSION, source_fingerprint, validate_store
+from .bulk_get import BulkCache, get_many
+from .hot_cache import HotCache
+from .conversation_forest import (
+    ConversationForest,
+    ForestTree,
+    build_forest_arrays,
+    materialize_tree,
 )
 
@@ -0,0 +1,261 @@
+"""Directories of memory-mapped numpy arrays, used by the columnar cache stores."""
+import json
+import os
+import shutil
+import zlib
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+META_FILE = 'meta.json'
+CHECKSUM_CHUNK = 16 * 1024 * 1024
+
+# Sentinel for missing values in int64 columns (tweet ids are always positive)
+INT_NULL = np.iinfo(np.int64).min
+
+
+def write_array_dir(
+    path: Union[str, Path],
+    arrays: Dict[str, np.ndarray],
+    meta: Optional[dict] = None
+) -> None:
+    """
+    Write arrays as .npy files into a directory, replacing it atomically.
+
+    Files are written to a sibling `.tmp` directory which is renamed into place,
+    so readers never see a half-written store.
+    """
+    tmp = staging_dir(path)
+    for name, arr in arrays.items():
+        np.save(tmp / f'{name}.npy', np.ascontiguousarray(arr))
+    commit_array_dir(tmp, path, meta)
+
+
+def staging_dir(path: Union[str, Path]) -> Path:
+    """Fresh sibling `.tmp` directory to write a store into before commit_array_dir."""
+    path = Path(path)
+    tmp = path.with_name(path.name + '.tmp')
+    if tmp.exists():
+        shutil.rmtree(tmp)
+    tmp.mkdir(parents=True)
+    return tmp
+
+
+def commit_array_dir(tmp: Path, path: Union[str, Path], meta: Optional[dict] = None) -> None:
+    """
+    Write meta.json into a staging directory and move it into place.
+
+    meta.json records the size and crc32 of every array file under 'files'.
+    """
+    path = Path(path)
+    meta = dict(meta or {})
+    meta['files'] = {p.name: file_checksum(p) for p in sorted(tmp.glob('*.npy'))}
+    write_meta(tmp, meta)
+    if path.exists():
+        shutil.rmtree(path)
+    os.replace(tmp, path)
+
+
+def write_meta(path: Union[str, Path], meta: dict) -> None:
+    """Replace a store's meta.json atomically."""
+    path = Path(path)
+    tmp = path / (META_FILE + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp, path / META_FILE)
+
+
+def read_meta(path: Union[str, Path]) -> dict:
+    """A store's meta.json (FileNotFoundError if the store is missing or incomplete)."""
+    path = Path(path)
+    if not (path / META_FILE).exists():
+        raise FileNotFoundError(f"Array store not found or incomplete: {path}")
+    with open(path / META_FILE) as f:
+        return json.load(f)
+
+
+def file_checksum(path: Union[str, Path]) -> Dict[str, int]:
+    """{'bytes', 'crc32'} of a file, read in chunks."""
+    crc = 0
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(CHECKSUM_CHUNK)
+            if not chunk:
+                break
+            crc = zlib.crc32(chunk, crc)
+    return {'bytes': os.path.getsize(path), 'crc32': crc}
+
+
+def refresh_checksums(path: Union[str, Path], names: List[str]) -> None:
+    """Re-record checksums of array files rewritten in place (e.g. by TweetStore.add_to_column)."""
+    meta = read_meta(path)
+    files = meta.setdefault('files', {})
+    for name in names:
+        files[name] = file_checksum(Path(path) / name)
+    write_meta(path, meta)
+
+
+def open_array_dir(path: Union[str, Path]) -> Tuple[Dict[str, np.ndarray], dict]:
+    """Memory-map every .npy file in a directory. Returns (arrays by name, meta)."""
+    path = Path(path)
+    meta = read_meta(path)
+    arrays = {p.name[:-len('.npy')]: np.load(p, mmap_mode='r') for p in path.glob('*.npy')}
+    return arrays, meta
+
+
+def delta_dirs(path: Union[str, Path]) -> List[Path]:
+    """Delta segment directories (delta-NNNN/) of a store, oldest first."""
+    return sorted(
+        p for p in Path(path).glob('delta-*')
+        if p.is_dir() and not p.name.endswith('.tmp')
+    )
+
+
+def next_delta_dir(path: Union[str, Path]) -> Path:
+    """Path for the next delta segment of a store."""
+    existing = delta_dirs(path)
+    n = int(existing[-1].name.split('-')[1]) + 1 if existing else 1
+    return Path(path) / f'delta-{n:04d}'
+
+
+def isin_sorted(values: np.ndarray, sorted_arr: np.ndarray) -> np.ndarray:
+    """Bool mask of which values occur in sorted_arr (binary search, no hashing)."""
+    values = np.asarray(values, dtype=sorted_arr.dtype)
+    if len(sorted_arr) == 0:
+        return np.zeros(len(values), dtype=bool)
+    pos = np.minimum(np.searchsorted(sorted_arr, values), len(sorted_arr) - 1)
+    return sorted_arr[pos] == values
+
+
+def sorted_unique(values: np.ndarray) -> np.ndarray:
+    """Sorted unique values; sort + adjacent compare beats np.unique's hash path on large int64 arrays."""
+    values = np.sort(values)
+    if len(values) < 2:
+        return values
+    keep = np.ones(len(values), dtype=bool)
+    keep[1:] = values[1:] != values[:-1]
+    return values[keep]
+
+
+def chain_tops(parent: np.ndarray) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """
+    (top, depth) of every node of a parent-pointer forest (-1 for no parent), or None if it has a cycle.
+
+    Pointer doubling: each round doubles how far every pointer jumps, so
+    chains of depth d resolve in log2(d) + 1 vectorized rounds.
+    """
+    n = len(parent)
+    jump = np.where(parent >= 0, parent, np.arange(n))
+    dist = (parent >= 0).astype(np.int64)
+    for _ in range(max(n, 1).bit_length() + 1):
+        nxt = jump[jump]
+        if np.array_equal(nxt, jump):
+            # A pointer can also settle on a node of a cycle whose length divides its jump
+            return (jump, dist) if (parent[jump] < 0).all() else None
+        dist = dist + dist[jump]
+        jump = nxt
+    return None
+
+
+def key_array(keys: List) -> Tuple[np.ndarray, np.ndarray]:
+    """int64 ids for a list of mapping keys, plus a mask of the keys that are valid ints."""
+    try:
+        ids = np.asarray(keys, dtype=np.int64).reshape(len(keys))
+        return ids, np.ones(len(keys), dtype=bool)
+    except (TypeError, ValueError, OverflowError):
+        pass
+    ids = np.full(len(keys), INT_NULL, dtype=np.int64)
+    valid = np.zeros(len(keys), dtype=bool)
+    for i, k in enumerate(keys):
+        try:
+            ids[i] = int(k)
+            valid[i] = True
+        except (TypeError, ValueError, OverflowError):
+            pass
+    return ids, valid
+
+
+def int_column(table, name: str) -> np.ndarray:
+    """int64 numpy copy of a pyarrow table column, INT_NULL for nulls (all INT_NULL if absent)."""
+    import pyarrow as pa
+
+    if name not in table.column_names:
+        return np.full(len(table), INT_NULL, dtype=np.int64)
+    return table[name].cast(pa.int64()).fill_null(INT_NULL).to_numpy()
+
+
+def id_columns(tweets, names: Tuple[str, ...]) -> Tuple[np.ndarray, ...]:
+    """
+    int64 id columns (INT_NULL for nulls) of a pyarrow Table, DataFrame or list of tweet dicts.
+
+    Absent columns come back all INT_NULL; a DataFrame without a tweet_id
+    column falls back to its index.
+    """
+    import pyarrow as pa
+
+    if isinstance(tweets, (pa.Table, pa.RecordBatch)):
+        return tuple(int_column(tweets, name) for name in names)
+    if isinstance(tweets, list):
+        return tuple(
+            np.fromiter(
+                (INT_NULL if (v := t.get(name)) is None or v != v else v for t in tweets),
+                dtype=np.int64, count=len(tweets),
+            )
+            for name in names
+        )
+    out = []
+    for name in names:
+        if name in tweets.columns:
+            col = tweets[name]
+        elif name == 'tweet_id':
+            col = tweets.index.to_series()
+        else:
+            out.append(np.full(len(tweets), INT_NULL, dtype=np.int64))
+            continue
+        out.append(col.to_numpy(dtype=np.int64, na_value=INT_NULL))
+    return tuple(out)
+
+
+def encode_strings(arr) -> Dict[str, np.ndarray]:
+    """
+    Encode a pyarrow string array as offsets + utf-8 bytes (+ null mask if any nulls).
+
+    Returns dict with 'offsets' (int64, len n+1), 'data' (uint8) and optionally 'null' (bool).
+    """
+    import pyarrow as pa
+
+    if isinstance(arr, pa.ChunkedArray):
+        arr = arr.combine_chunks()
+    if not pa.types.is_large_string(arr.type):
+        arr = arr.cast(pa.large_string())
+    _, offsets_buf, data_buf = arr.buffers()
+    n = len(arr)
+    if offsets_buf is None:
+        offsets = np.zeros(n + 1, dtype=np.int64)
+    else:
+        offsets = np.frombuffer(offsets_buf, dtype=np.int64)[arr.offset:arr.offset + n + 1]
+    start, end = (int(offsets[0]), int(offsets[-1])) if n else (0, 0)
+    data = np.frombuffer(data_buf, dtype=np.uint8)[start:end] if data_buf is not None and end > start else np.zeros(0, dtype=np.uint8)
+    out = {'offsets': offsets - start, 'data': data}
+    if arr.null_count:
+        out['null'] = arr.is_null().to_numpy(zero_copy_only=False)
+    return out
+
+
+class StringColumn:
+    """Lazy accessor for an offsets + bytes encoded string column."""
+    __slots__ = ('offsets', 'data', 'null')
+
+    def __init__(self, offsets: np.ndarray, data: np.ndarray, null: Optional[np.ndarray] = None):
+        self.offsets = offsets
+        self.data = data
+        self.null = null
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def get(self, i: int) -> Optional[str]:
+        if self.null is not None and self.null[i]:
+            return None
+        return self.data[self.offsets[i]:self.offsets[i + 1]].tobytes().decode('utf-8')
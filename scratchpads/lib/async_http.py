@@ -0,0 +1,76 @@
+# %%
+"""
+One shared httpx.AsyncClient for the async strand path.
+
+Every request (semantic search, Supabase, and the LLM SDKs, which are handed
+the same client) goes through one keep-alive connection pool instead of
+opening fresh connections per call. Each host additionally gets its own
+concurrency limit, so a burst of strands can't exceed an API's rate limits
+while other hosts keep going.
+"""
+import asyncio
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+# Concurrent requests per host (others get default_host_limit)
+DEFAULT_HOST_LIMITS = {
+    'embed.tweetstack.app': 16,
+    'fabxmporizzqflnftavs.supabase.co': 16,
+    'api.groq.com': 2,
+    'openrouter.ai': 4,
+}
+
+
+class AsyncHTTP:
+    """
+    Shared client with keep-alive and per-host limits; use as `async with AsyncHTTP() as http:`.
+
+    request()/get()/post() wait for a slot of the URL's host. SDK clients
+    built on `http.client` should take their host's slot with `http.limit(host)`.
+    Leaving the context closes the pool; requests still running when their
+    task is cancelled are aborted.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 64,
+        max_keepalive: int = 32,
+        timeout: float = 60.0,
+        host_limits: Optional[Dict[str, int]] = None,
+        default_host_limit: int = 8,
+    ):
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive)
+        self.timeout = httpx.Timeout(timeout)
+        self.host_limits = {**DEFAULT_HOST_LIMITS, **(host_limits or {})}
+        self.default_host_limit = default_host_limit
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self.client: Optional[httpx.AsyncClient] = None
+
+    async def __aenter__(self) -> 'AsyncHTTP':
+        self.client = httpx.AsyncClient(limits=self.limits, timeout=self.timeout)
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.client.aclose()
+        self.client = None
+
+    def limit(self, host: str) -> asyncio.Semaphore:
+        """Concurrency slot of a host."""
+        sem = self._semaphores.get(host)
+        if sem is None:
+            sem = self._semaphores[host] = asyncio.Semaphore(self.host_limits.get(host, self.default_host_limit))
+        return sem
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        async with self.limit(urlsplit(url).hostname or ''):
+            return await self.client.request(method, url, **kwargs)
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request('GET', url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request('POST', url, **kwargs)
+
+# %%
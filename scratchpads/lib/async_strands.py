@@ -0,0 +1,231 @@
+# %%
+"""
+Asyncio strand path: hundreds of strands in flight on one event loop.
+
+Network waits (semantic search, Supabase, Groq) are coroutines on one shared
+AsyncHTTP pool instead of blocking thread-pool workers; the CPU-bound parts
+(tree filtering, rendering) run on a small executor. Every strand is a task
+in one TaskGroup, so cancelling build_strands_async (Ctrl-C, a timeout)
+cancels every request in flight.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+from .async_http import AsyncHTTP
+from .conversation_explorer import ConversationTree, EnrichedTweet, RenderFragments, filter_conversation_trees_batch
+from .image_describer import MediaDescription, get_image_descriptions_batch_async
+from .seed_search import get_seed_filters
+from .semantic_search import get_local_index, search_embeddings_async
+from .strand_builder import (
+    StrandBuildResult, StrandSeed,
+    _filter_semantic_results, _keyword_filter, _pushdown_semantic_results, _render_strand, _seeds_from_results,
+    extract_tree_tweet_ids,
+)
+
+
+async def get_strand_seeds_async(
+    http: AsyncHTTP,
+    tweet_id: int,
+    tweet_dict: Dict[int, EnrichedTweet],
+    quote_tweets_dict: Dict[int, List[int]],
+    exclude_keywords: List[str] = [],
+    quote_depth: int = 1,
+    limit: int = 20,
+    k: int = 100,
+    threshold: float = 0.5
+) -> List[StrandSeed]:
+    """get_strand_seeds with the semantic search awaited on the shared pool (same seeds)."""
+    tweet = tweet_dict.get(tweet_id)
+    semantic_results = []
+    if tweet and get_seed_filters(get_local_index()) is not None:
+        pushed_down = await asyncio.to_thread(
+            _pushdown_semantic_results, [tweet_id], tweet_dict, exclude_keywords, limit, k, threshold
+        )
+        semantic_results = pushed_down[tweet_id]
+    elif tweet:
+        results = await search_embeddings_async(
+            http, tweet['full_text'], k=k, threshold=threshold,
+            exclude_tweet_id=str(tweet_id), filter=_keyword_filter(exclude_keywords), tweet_id=tweet_id
+        )
+        semantic_results = _filter_semantic_results(tweet_id, results, tweet_dict, limit)
+    return _seeds_from_results(tweet_id, semantic_results, quote_tweets_dict, quote_depth)
+
+
+class _AsyncImages:
+    """Image descriptions for concurrent strands: one fetch task per tweet, awaited by every strand that needs it."""
+
+    def __init__(self, http: AsyncHTTP, image_cache: Dict[int, List[MediaDescription]]):
+        self.http = http
+        self.cache = dict(image_cache)
+        self.new: Dict[int, List[MediaDescription]] = {}
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._reported: Set[int] = set()
+
+    async def fetch(self, tweet_ids: List[int]) -> None:
+        for tid in tweet_ids:
+            if tid not in self.cache and tid not in self._tasks:
+                self._tasks[tid] = asyncio.create_task(self._fetch_one(tid))
+        pending = [self._tasks[t] for t in tweet_ids if t in self._tasks]
+        if pending:
+            # wait, not gather: a cancelled strand must not cancel fetches other strands share
+            await asyncio.wait(pending)
+        for tid in tweet_ids:
+            task = self._tasks.get(tid)
+            if task is None or task.cancelled() or tid in self._reported:
+                continue
+            e = task.exception()
+            if e is not None:
+                # The strand goes on without this tweet's descriptions, like a failed fetch in the sync path
+                self._reported.add(tid)
+                print(f"[ERROR] Image descriptions for {tid}: {type(e).__name__}: {e}")
+
+    async def _fetch_one(self, tid: int) -> None:
+        new = await get_image_descriptions_batch_async(self.http, [tid], {})
+        self.cache.update(new)
+        self.new.update(new)
+
+    def cancel(self) -> None:
+        for task in self._tasks.values():
+            task.cancel()
+
+
+class _AsyncTrees:
+    """
+    Tree filtering for concurrent strands, batched like Phase 2 of build_strands_phased.
+
+    Strands that reach filtering while a batch is queued or every executor
+    slot is busy join the next batch, which runs filter_conversation_trees_batch
+    once for all of them. A failed batch fails each of its strands.
+    """
+
+    def __init__(self, cpu: ThreadPoolExecutor, max_batches: int, conversation_trees: Dict[int, ConversationTree],
+                 tweet_dict: Dict[int, EnrichedTweet], depth: int):
+        self.cpu = cpu
+        self.max_batches = max_batches
+        self.conversation_trees = conversation_trees
+        self.tweet_dict = tweet_dict
+        self.depth = depth
+        self.pending: Dict[int, Tuple[List[int], asyncio.Future]] = {}
+        self.running = 0
+        self.batches = 0
+        self._scheduled = False
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def filter(self, tid: int, seed_ids: List[int]) -> Dict[int, ConversationTree]:
+        future = asyncio.get_running_loop().create_future()
+        self.pending[tid] = (seed_ids, future)
+        self._schedule()
+        return await future
+
+    def _schedule(self) -> None:
+        if self.pending and not self._scheduled and self.running < self.max_batches:
+            self._scheduled = True
+            task = asyncio.create_task(self._run_batch())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self) -> None:
+        # One loop turn, so strands whose seeds arrived together share the batch
+        await asyncio.sleep(0)
+        self._scheduled = False
+        batch = {tid: entry for tid, entry in self.pending.items() if not entry[1].done()}
+        self.pending = {}
+        if not batch:
+            return
+        self.running += 1
+        self.batches += 1
+        try:
+            trees = await asyncio.get_running_loop().run_in_executor(self.cpu, lambda: filter_conversation_trees_batch(
+                {tid: seed_ids for tid, (seed_ids, _) in batch.items()}, self.conversation_trees, self.tweet_dict,
+                depth=self.depth, depth_up=self.depth, depth_from_root=self.depth
+            ))
+        except Exception as e:
+            for _, future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for tid, (_, future) in batch.items():
+                if not future.done():
+                    future.set_result(trees[tid])
+        finally:
+            self.running -= 1
+            self._schedule()
+
+    def cancel(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+
+
+async def build_strands_async(
+    tweet_ids: List[int],
+    tweet_dict: Dict[int, EnrichedTweet],
+    quote_dict: Dict[int, List[int]],
+    conversation_trees: Dict[int, ConversationTree],
+    image_cache: Dict[int, List[MediaDescription]],
+    depth: int = 10,
+    quote_depth: int = 1,
+    max_strands: int = 256,
+    cpu_workers: int = 2,
+    strands_dir: Optional[Union[str, Path]] = None,
+    http: Optional[AsyncHTTP] = None
+) -> Tuple[Dict[int, StrandBuildResult], Dict[int, List[MediaDescription]]]:
+    """
+    Build strands as tasks on the running event loop (await it, or asyncio.run it).
+
+    Each strand runs seeds -> filter trees -> images -> render on its own,
+    at most max_strands at a time; per-host limits of http (a new AsyncHTTP
+    unless given) bound the requests. Filtering and rendering run on
+    cpu_workers threads; strands waiting to filter at the same time share one
+    filter_conversation_trees_batch call. A failed strand is logged and left out, like in
+    build_strands_phased, whose output this matches.
+
+    Returns:
+        Tuple of (results keyed by tweet_id in tweet_ids order, updated image cache)
+    """
+    if http is None:
+        async with AsyncHTTP() as http:
+            return await build_strands_async(
+                tweet_ids, tweet_dict, quote_dict, conversation_trees, image_cache,
+                depth, quote_depth, max_strands, cpu_workers, strands_dir, http
+            )
+
+    loop = asyncio.get_running_loop()
+    images = _AsyncImages(http, image_cache)
+    fragments = RenderFragments(tweet_dict, images.cache)
+    slots = asyncio.Semaphore(max_strands)
+    failed: List[int] = []
+    if strands_dir is not None:
+        Path(strands_dir).mkdir(parents=True, exist_ok=True)
+
+    async def build_one(tid: int, cpu: ThreadPoolExecutor, tree_filter: _AsyncTrees) -> Optional[StrandBuildResult]:
+        async with slots:
+            try:
+                seeds = await get_strand_seeds_async(http, tid, tweet_dict, quote_dict, quote_depth=quote_depth)
+                trees = await tree_filter.filter(tid, [s.tweet_id for s in seeds])
+                await images.fetch(list(extract_tree_tweet_ids(trees)))
+                seed_info = {s.tweet_id: s.source_type for s in seeds}
+                return await loop.run_in_executor(cpu, lambda: _render_strand(
+                    tid, trees, seed_info, tweet_dict, images.cache, fragments, strands_dir
+                ))
+            except Exception as e:
+                print(f"[ERROR] {tid}: {type(e).__name__}: {e}")
+                failed.append(tid)
+                return None
+
+    with ThreadPoolExecutor(max_workers=cpu_workers) as cpu:
+        tree_filter = _AsyncTrees(cpu, cpu_workers, conversation_trees, tweet_dict, depth)
+        try:
+            async with asyncio.TaskGroup() as tg:
+                tasks = {tid: tg.create_task(build_one(tid, cpu, tree_filter)) for tid in dict.fromkeys(tweet_ids)}
+        finally:
+            images.cancel()
+            tree_filter.cancel()
+
+    if failed:
+        print(f"[WARN] {len(failed)} strands failed: {failed}")
+    results = {tid: t.result() for tid, t in tasks.items() if t.result() is not None}
+    return results, images.cache
+
+# %%
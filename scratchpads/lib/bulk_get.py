@@ -0,0 +1,80 @@
+# %%
+"""
+Batched multi-key reads for the cache mappings.
+
+TweetStore and ConversationForest implement get_many() with vectorized
+lookups; BulkCache adds it to diskcache as one SQLite query per chunk of keys
+instead of one round trip per key. get_many() falls back to .get() for plain
+dicts, so consumers accept any mapping.
+"""
+import time
+from typing import Any, Dict, Hashable, Iterable, List, Mapping, Tuple
+
+from diskcache import Cache
+
+# Stay under SQLite's bound-parameter limit
+SQL_CHUNK = 500
+
+
+class BulkCache(Cache):
+    """
+    diskcache.Cache with get_many().
+
+    get_many() is built on diskcache internals (Cache._sql, Disk.put,
+    Disk.fetch and the Cache table's columns), written against diskcache
+    5.6.3. They are not public API; if a release drops them, get_many()
+    falls back to one Cache.get per key.
+    """
+
+    def get_many(self, keys: Iterable[Hashable], default: Any = None) -> List[Any]:
+        """
+        Values for keys in order (default for missing or expired keys).
+
+        Reads with the same fast path as Cache.get, so hit/miss statistics
+        and access-based eviction bookkeeping are not updated.
+        """
+        keys = list(keys)
+        if not _has_bulk_internals(self):
+            return [self.get(key, default) for key in keys]
+        out = [default] * len(keys)
+        positions: Dict[Tuple[Any, bool], List[int]] = {}
+        for i, key in enumerate(keys):
+            db_key, raw = self._disk.put(key)
+            positions.setdefault((db_key, raw), []).append(i)
+
+        by_raw: Dict[bool, List[Any]] = {}
+        for db_key, raw in positions:
+            by_raw.setdefault(raw, []).append(db_key)
+        now = time.time()
+        for raw, db_keys in by_raw.items():
+            for lo in range(0, len(db_keys), SQL_CHUNK):
+                chunk = db_keys[lo:lo + SQL_CHUNK]
+                rows = self._sql(
+                    'SELECT key, mode, filename, value FROM Cache'
+                    f' WHERE key IN ({",".join("?" * len(chunk))}) AND raw = ?'
+                    ' AND (expire_time IS NULL OR expire_time > ?)',
+                    (*chunk, raw, now),
+                ).fetchall()
+                for db_key, mode, filename, db_value in rows:
+                    try:
+                        value = self._disk.fetch(mode, filename, db_value, False)
+                    except IOError:
+                        # Key was deleted before we could retrieve result
+                        continue
+                    for i in positions[(db_key, raw)]:
+                        out[i] = value
+        return out
+
+
+def _has_bulk_internals(cache: Cache) -> bool:
+    disk = getattr(cache, '_disk', None)
+    return callable(getattr(cache, '_sql', None)) and all(callable(getattr(disk, name, None)) for name in ('put', 'fetch'))
+
+
+def get_many(mapping: Mapping, keys: Iterable[Hashable], default: Any = None) -> List[Any]:
+    """mapping.get_many(keys) when available, else one .get() per key."""
+    if hasattr(mapping, 'get_many'):
+        return mapping.get_many(keys, default)
+    return [mapping.get(k, default) for k in keys]
+
+# %%
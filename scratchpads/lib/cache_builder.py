@@ -0,0 +1,246 @@
+# %%
+"""
+Streaming cache builder: enriched_tweets parquet -> tweet store, reply forest, quote index.
+
+The old path went parquet -> pandas -> to_dict(orient='records') -> joblib, and
+migrate_to_diskcache then loaded every joblib file back into RAM to write it
+key by key. Here the parquet is read once, in Arrow record batches:
+
+1. scan         each batch is spilled column by column to flat files (TweetStoreWriter);
+                only the id columns (5 x int64 per tweet) are kept in memory
+2. quoted_count computed from the id columns (count_quotes.compute_quoted_counts)
+3. tweet store  spilled columns gathered into tweet_id order through memory maps
+4. reply forest conversation edges straight from the id columns into CSR arrays
+5. quote index  (quoted, quoting) id pairs written as sorted arrays (QuoteIndex)
+6. quote forest the same pairs as CSR quote chains with depth and root (QuoteForest)
+
+Peak memory is one record batch plus the id columns, instead of several copies
+of the whole corpus. Each stage reports its rows/sec. Every store written is
+stamped with the source parquet's fingerprint and the build timings (see
+lib/cache_manifest.py), and any subset of the stores can be rebuilt on its own.
+"""
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+import numpy as np
+
+from .array_store import INT_NULL, int_column, isin_sorted
+from .cache_delta import discard_ingest_journal, load_ingest_manifest, save_ingest_manifest
+from .cache_manifest import source_fingerprint, stamp_store
+from .conversation_explorer import conversation_edges, incomplete_tree_edges
+from .conversation_forest import build_forest_arrays, write_conversation_forest
+from .count_quotes import compute_quoted_counts
+from .quote_forest import write_quote_forest
+from .quote_index import write_quote_index
+from .tweet_store import TweetStoreWriter, dedupe_rows
+
+KEY_COLUMNS = ('tweet_id', 'account_id', 'quoted_tweet_id', 'reply_to_tweet_id', 'conversation_id')
+
+
+def _stage(stats: Dict[str, dict], name: str, rows: int, t0: float) -> None:
+    dt = max(time.time() - t0, 1e-9)
+    stats[name] = {'rows': rows, 'seconds': dt, 'rows_per_sec': rows / dt}
+    print(f"[{name}] {rows:,} rows in {dt:.1f}s ({rows / dt:,.0f} rows/s)")
+
+
+def _timings(stats: Dict[str, dict], *stages: str) -> Dict[str, dict]:
+    """The shared scan stage plus a store's own stages, for its manifest."""
+    return {name: stats[name] for name in ('scan',) + stages if name in stats}
+
+
+def _peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    import sys
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024**2 if sys.platform == 'darwin' else rss / 1024
+
+
+def forest_arrays_from_columns(ids: np.ndarray, reply_to: np.ndarray, conv: np.ndarray):
+    """
+    Reply forest arrays (plus the incomplete-tree index delta updates need) from id columns in file order.
+
+    Matches generate_caches' {**conversation_trees, **incomplete_trees}: a conversation
+    tree's root is the last tweet without reply_to, and incomplete trees win key collisions.
+
+    Returns:
+        (forest arrays, extra arrays)
+    """
+    in_conv = conv != INT_NULL
+
+    # Incomplete trees: tweets without conversation_id
+    loose = ~in_conv
+    inc = incomplete_tree_edges(ids[loose], reply_to[loose], np.ones(int(loose.sum()), dtype=bool))
+    incomplete_ids = inc['tree_ids']
+    if inc['cycles'][0]:
+        print(f"Broke {int(inc['cycles'][0])} reply cycle(s)")
+    print(f"Built {len(incomplete_ids)} incomplete trees")
+
+    # Conversation trees, minus ids taken by incomplete trees
+    conv_edges = conversation_edges(ids[in_conv], reply_to[in_conv], conv[in_conv], stable=False)
+    keep = ~isin_sorted(conv_edges['tree_ids'], incomplete_ids)
+    keep_edge = np.repeat(keep, np.diff(conv_edges['edge_start']))
+    conv_tree_ids, conv_roots = conv_edges['tree_ids'][keep], conv_edges['roots'][keep]
+
+    edge_tree = [
+        np.repeat(conv_tree_ids, np.diff(conv_edges['edge_start'])[keep]),
+        np.repeat(incomplete_ids, np.diff(inc['edge_start'])),
+    ]
+    edge_child = [conv_edges['edge_child'][keep_edge], inc['edge_child']]
+    edge_parent = [conv_edges['edge_parent'][keep_edge], inc['edge_parent']]
+    arrays = build_forest_arrays(
+        np.concatenate([conv_tree_ids, incomplete_ids]),
+        np.concatenate([conv_roots, incomplete_ids]),
+        np.concatenate(edge_tree), np.concatenate(edge_child), np.concatenate(edge_parent),
+    )
+
+    # Incomplete roots that reply to a tweet we don't have yet
+    loose_ids, loose_reply = ids[loose], reply_to[loose]
+    order = np.argsort(loose_ids)
+    root_reply = loose_reply[order[np.searchsorted(loose_ids[order], incomplete_ids)]]
+    waiting = root_reply != INT_NULL
+    by_parent = np.argsort(root_reply[waiting], kind='stable')
+    extra = {
+        'incomplete_ids': incomplete_ids,
+        'orphan_parent': root_reply[waiting][by_parent],
+        'orphan_root': incomplete_ids[waiting][by_parent],
+    }
+    return arrays, extra
+
+
+def build_caches(
+    parquet_path: Path,
+    tweet_store_dir: Optional[Path],
+    forest_dir: Optional[Path] = None,
+    quote_index_dir: Optional[Path] = None,
+    manifest_path: Optional[Path] = None,
+    batch_size: int = 65_536,
+    quote_forest_dir: Optional[Path] = None,
+) -> Dict[str, dict]:
+    """
+    Build the caches from the enriched_tweets parquet in one streaming pass.
+
+    Args:
+        parquet_path: enriched_tweets parquet
+        tweet_store_dir: TweetStore output directory (skipped if None; only the
+            id columns are read then)
+        forest_dir: ConversationForest output directory (skipped if None)
+        quote_index_dir: QuoteIndex output directory (skipped if None)
+        manifest_path: ingest manifest for update_caches (skipped if None)
+        batch_size: Rows per Arrow record batch
+        quote_forest_dir: QuoteForest output directory (skipped if None)
+
+    Returns:
+        Dict of stage -> {'rows', 'seconds', 'rows_per_sec'}, plus 'peak_rss_mb'
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+    from tqdm import tqdm
+
+    stats: Dict[str, dict] = {}
+    source = source_fingerprint(parquet_path)
+    pf = pq.ParquetFile(parquet_path)
+    n_total = pf.metadata.num_rows
+    print(f"Streaming {n_total:,} rows from {parquet_path} in batches of {batch_size:,}...")
+
+    # 1. Scan: spill columns, keep id columns
+    t0 = time.time()
+    writer = TweetStoreWriter(tweet_store_dir) if tweet_store_dir is not None else None
+    columns = None
+    if writer is None:
+        columns = [c for c in pf.schema_arrow.names if c in KEY_COLUMNS or c == 'archive_upload_id']
+    keys: Dict[str, List[np.ndarray]] = {k: [] for k in KEY_COLUMNS}
+    uploads: Set[str] = set()
+    batches = pf.iter_batches(batch_size=batch_size, columns=columns)
+    for batch in tqdm(batches, total=-(-n_total // batch_size), desc="Scanning"):
+        table = pa.Table.from_batches([batch])
+        table = table.filter(pc.is_valid(table['tweet_id']))
+        if 'quoted_count' in table.column_names:
+            table = table.drop(['quoted_count'])
+        if writer is not None:
+            writer.append(table)
+        for k in KEY_COLUMNS:
+            keys[k].append(int_column(table, k))
+        if 'archive_upload_id' in table.column_names:
+            uploads.update(u for u in pc.unique(table['archive_upload_id']).to_pylist() if u is not None)
+        del table, batch
+    cols = {k: np.concatenate(v) if v else np.zeros(0, dtype=np.int64) for k, v in keys.items()}
+    del keys
+    _stage(stats, 'scan', len(cols['tweet_id']), t0)
+
+    # Dedupe (last copy wins) and order by tweet_id
+    rows = writer.rows() if writer is not None else dedupe_rows(cols['tweet_id'])
+    n = len(rows)
+
+    if writer is not None:
+        # 2. quoted_count
+        t0 = time.time()
+        by_id = {k: v[rows] for k, v in cols.items()}
+        quoted_count = compute_quoted_counts(by_id['tweet_id'], by_id['account_id'], by_id['quoted_tweet_id'])
+        _stage(stats, 'quoted_count', n, t0)
+
+        # 3. Tweet store
+        t0 = time.time()
+        writer.close({'quoted_count': ('int', quoted_count)})
+        del by_id, quoted_count
+        _stage(stats, 'tweet_store', n, t0)
+        stamp_store(tweet_store_dir, source, _timings(stats, 'quoted_count', 'tweet_store'))
+        print(f"Wrote {n:,} tweets to {tweet_store_dir}")
+
+    file_rows = np.sort(rows)
+    in_file_order = {k: v[file_rows] for k, v in cols.items()}
+    del cols
+
+    # 4. Reply forest
+    if forest_dir is not None:
+        t0 = time.time()
+        arrays, extra = forest_arrays_from_columns(
+            in_file_order['tweet_id'], in_file_order['reply_to_tweet_id'], in_file_order['conversation_id']
+        )
+        write_conversation_forest(arrays, forest_dir, extra=extra)
+        _stage(stats, 'reply_forest', n, t0)
+        stamp_store(forest_dir, source, _timings(stats, 'reply_forest'))
+        print(f"Wrote {len(arrays['tree_ids']):,} reply trees to {forest_dir}")
+
+    # 5. Quote index
+    has_q = in_file_order['quoted_tweet_id'] != INT_NULL
+    quoted, quoting = in_file_order['quoted_tweet_id'][has_q], in_file_order['tweet_id'][has_q]
+    if quote_index_dir is not None:
+        t0 = time.time()
+        n_keys = write_quote_index(quote_index_dir, quoted, quoting)
+        _stage(stats, 'quote_index', n, t0)
+        stamp_store(quote_index_dir, source, _timings(stats, 'quote_index'))
+        print(f"Wrote {n_keys:,} quoted tweets to {quote_index_dir}")
+
+    # 6. Quote forest (pairs grouped by quoted id, as in the index, so children keep index order)
+    if quote_forest_dir is not None:
+        t0 = time.time()
+        by_quoted = np.argsort(quoted, kind='stable')
+        forest_stats = write_quote_forest(quote_forest_dir, quoted[by_quoted], quoting[by_quoted])
+        _stage(stats, 'quote_forest', len(quoted), t0)
+        stamp_store(quote_forest_dir, source, _timings(stats, 'quote_forest'))
+        print(f"Wrote {forest_stats['chains']:,} quote chains (max depth {forest_stats['max_depth']}) to {quote_forest_dir}")
+
+    if manifest_path is not None:
+        # The rebuilt store already holds whatever an unfinished ingest was adding
+        discard_ingest_journal(manifest_path)
+        manifest = load_ingest_manifest(manifest_path)
+        manifest['archive_upload_ids'] = sorted(uploads)
+        manifest['drops'] = [{
+            'parquet': str(parquet_path),
+            'mtime': Path(parquet_path).stat().st_mtime,
+            'new_tweets': n,
+            'ingested_at': time.time(),
+        }]
+        save_ingest_manifest(manifest_path, manifest)
+
+    stats['peak_rss_mb'] = _peak_rss_mb()
+    if stats['peak_rss_mb'] is not None:
+        print(f"Peak RSS: {stats['peak_rss_mb']:,.0f} MB")
+    return stats
+
+# %%
@@ -0,0 +1,456 @@
+# %%
+"""
+Incremental cache updates for new enriched_tweets parquet drops.
+
+Archive dumps only grow, so instead of regenerating everything we:
+1. Diff the parquet against the ingest manifest (archive_upload_ids) and the
+   tweet store (tweet_ids), reading full rows only for row groups with new tweets
+2. Compute quoted_count for the new rows and the new totals of already-stored tweets
+3. Stage the new rows as a tweet store delta segment
+4. Stage the new quotes as a quote index delta segment
+5. Stage only the affected reply trees as a forest delta segment
+6. Commit (below), then rewrite the quote forest from the quote index pairs
+   (vectorized, no parquet read)
+
+Cost is proportional to the new tweets plus the trees they touch.
+
+Ingests are all-or-nothing. Steps 2-5 only write staged-* directories, which
+readers ignore. The commit point is one atomic write of the ingest journal
+(<manifest>.pending): the staged directories to move into place, the
+quoted_count totals to set and the new manifest. Rolling a journal forward is
+idempotent (renames of what is still staged, counts set rather than added), so
+the next run finishes an interrupted commit (recover_ingest) and a run that
+died before its journal simply leaves staged directories to discard.
+"""
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from .array_store import INT_NULL, int_column, isin_sorted, next_delta_dir, open_array_dir, write_array_dir
+from .cache_manifest import source_fingerprint, stamp_store
+from .conversation_explorer import build_incomplete_conversation_trees
+from .conversation_forest import ConversationForest, forest_arrays_from_trees, write_conversation_forest
+from .count_quotes import non_self_quotes
+from .quote_forest import write_quote_forest
+from .quote_index import QuoteIndex, write_quote_index
+from .tweet_store import TweetStore, build_tweet_store, dedupe_rows
+
+STAGED_PREFIX = 'staged-'
+
+
+def load_ingest_manifest(path: Path) -> dict:
+    """Load the ingest manifest, or an empty one if it doesn't exist yet."""
+    if not path.exists():
+        return {'archive_upload_ids': [], 'drops': []}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_ingest_manifest(path: Path, manifest: dict) -> None:
+    tmp = path.with_name(path.name + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    tmp.replace(path)
+
+
+def ingest_journal_path(manifest_path: Path) -> Path:
+    """Journal of an ingest that committed but may not have finished (see apply_delta)."""
+    return manifest_path.with_name(manifest_path.name + '.pending')
+
+
+def discard_ingest_journal(manifest_path: Path) -> None:
+    """Drop a pending ingest, e.g. because the stores are being rebuilt from scratch."""
+    ingest_journal_path(manifest_path).unlink(missing_ok=True)
+
+
+def _staged(path: Path) -> Path:
+    return path.with_name(STAGED_PREFIX + path.name)
+
+
+def _discard_staged(*store_dirs: Optional[Path]) -> None:
+    """Remove what an ingest that died before its commit staged."""
+    for store_dir in store_dirs:
+        if store_dir is not None:
+            for p in store_dir.glob(STAGED_PREFIX + '*'):
+                shutil.rmtree(p, ignore_errors=True)
+
+
+def read_new_rows(parquet_path: Path, store: TweetStore, ingested_uploads: Set[str]):
+    """
+    Read only the rows of a parquet drop that are not in the store yet.
+
+    Row groups are first scanned on (tweet_id, archive_upload_id) alone; full
+    rows are read only for row groups that contain unseen tweets.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    pf = pq.ParquetFile(parquet_path)
+    key_columns = ['tweet_id']
+    if 'archive_upload_id' in pf.schema_arrow.names:
+        key_columns.append('archive_upload_id')
+    upload_set = pa.array(sorted(ingested_uploads), type=pa.string())
+
+    parts = []
+    for rg in range(pf.num_row_groups):
+        keys = pf.read_row_group(rg, columns=key_columns)
+        candidate = np.ones(len(keys), dtype=bool)
+        if 'archive_upload_id' in key_columns and len(upload_set):
+            seen = pc.is_in(keys['archive_upload_id'], value_set=upload_set).fill_null(False)
+            candidate = ~seen.to_numpy(zero_copy_only=False)
+        if not candidate.any():
+            continue
+        ids = int_column(keys, 'tweet_id')
+        new = candidate & (ids != INT_NULL)
+        new[new] = ~store.contains_many(ids[new])
+        if new.any():
+            parts.append(pf.read_row_group(rg).filter(pa.array(new)))
+
+    if not parts:
+        return None
+    table = pa.concat_tables(parts)
+    # The same tweet can appear in several uploads of one drop; the last copy wins, as in a full build
+    return table.take(pa.array(np.sort(dedupe_rows(int_column(table, 'tweet_id')))))
+
+
+def _authors(tweet_ids: np.ndarray, new_ids: np.ndarray, new_acc: np.ndarray, store: TweetStore) -> np.ndarray:
+    """account_id for each tweet id, looked up in the new rows first, then the store."""
+    order = np.argsort(new_ids)
+    sorted_new = new_ids[order]
+    out = np.full(len(tweet_ids), INT_NULL, dtype=np.int64)
+    in_new = isin_sorted(tweet_ids, sorted_new)
+    out[in_new] = new_acc[order[np.searchsorted(sorted_new, tweet_ids[in_new])]]
+    rest = ~in_new
+    if rest.any():
+        _, out[rest] = store.lookup_column(tweet_ids[rest], 'account_id')
+    return out
+
+
+def quoted_count_updates(table, store: TweetStore, quote_index: QuoteIndex) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    quoted_count after the quotes in the new rows, without changing the store.
+
+    Returns:
+        (quoted_count for the new rows: new quoters plus earlier quoters already
+        in the quote index, stored tweet ids the new rows quote, their new
+        quoted_count totals to set)
+    """
+    ids = int_column(table, 'tweet_id')
+    acc = int_column(table, 'account_id')
+    quoted = int_column(table, 'quoted_tweet_id')
+
+    has_q = quoted != INT_NULL
+    targets = quoted[has_q]
+    counted = non_self_quotes(acc[has_q], _authors(targets, ids, acc, store))
+    uniq, counts = np.unique(targets[counted], return_counts=True)
+
+    stored = store.contains_many(uniq)
+    stored_ids = uniq[stored]
+    _, current = store.lookup_column(stored_ids, 'quoted_count')
+    stored_totals = np.where(current == INT_NULL, 0, current) + counts[stored]
+
+    new_counts = np.zeros(len(ids), dtype=np.int64)
+    is_new_target = isin_sorted(uniq, np.sort(ids))
+    order = np.argsort(ids)
+    pos = order[np.searchsorted(ids[order], uniq[is_new_target])]
+    new_counts[pos] += counts[is_new_target]
+
+    # Tweets quoted before they were ingested (quote_index isn't updated with this drop yet)
+    q_pos, quoters = quote_index.lookup_many(ids)
+    _, quoter_acc = store.lookup_column(quoters, 'account_id')
+    earlier = non_self_quotes(quoter_acc, acc[q_pos])
+    new_counts += np.bincount(q_pos[earlier], minlength=len(ids))
+    return new_counts, stored_ids, stored_totals
+
+
+def update_quote_index(table, out_dir: Path) -> int:
+    """Write the new rows' quotes as a quote index delta segment in out_dir. Returns keys touched."""
+    ids = int_column(table, 'tweet_id')
+    quoted = int_column(table, 'quoted_tweet_id')
+    has_q = quoted != INT_NULL
+    if not has_q.any():
+        return 0
+    return write_quote_index(out_dir, quoted[has_q], ids[has_q])
+
+
+def _segment_arrays(forest: ConversationForest, name: str) -> List[np.ndarray]:
+    return [seg.arrays[name] for seg in forest._segments if name in seg.arrays]
+
+
+def _affected_conversation_trees(
+    forest: ConversationForest, store: TweetStore,
+    ids: np.ndarray, reply_to: np.ndarray, conv: np.ndarray, extra_ids: List[int]
+) -> Dict[int, dict]:
+    """
+    Rebuild conversation trees that received new tweets (old edges + new edges).
+
+    Conversation and incomplete trees share one key space and incomplete trees win
+    (see generate_caches), so a conversation tree whose id is or was an incomplete
+    tree isn't in the forest; those, plus extra_ids, are rebuilt from the store.
+    """
+    trees: Dict[int, dict] = {}
+    in_conv = conv != INT_NULL
+    affected = np.unique(conv[in_conv])
+    incomplete = _incomplete_ids(forest)
+    shadowed = np.union1d(
+        affected[isin_sorted(affected, incomplete)],
+        np.array(extra_ids, dtype=np.int64)
+    )
+
+    for c in np.setdiff1d(affected, shadowed).tolist():
+        tree = {'root': None, 'children': {}, 'parents': {}}
+        if c in forest:
+            old = forest[c]
+            tree['root'] = old.root
+            children, parents = old.edges()
+            tree['parents'] = dict(zip(children.tolist(), parents.tolist()))
+        trees[c] = tree
+    for tid, rt, c in zip(ids[in_conv].tolist(), reply_to[in_conv].tolist(), conv[in_conv].tolist()):
+        if c not in trees:
+            continue
+        if rt != INT_NULL:
+            trees[c]['parents'][tid] = rt
+        else:
+            trees[c]['root'] = tid
+
+    # Still hidden behind a live incomplete tree of the same id
+    tombstoned = set(extra_ids)
+    shadowed = np.array([
+        c for c in shadowed.tolist() if c in tombstoned or not _is_live_incomplete(forest, c)
+    ], dtype=np.int64)
+    if len(shadowed):
+        members = store.select_in('conversation_id', shadowed)
+        _, m_conv = store.lookup_column(members, 'conversation_id')
+        _, m_reply = store.lookup_column(members, 'reply_to_tweet_id')
+        for tid, rt, c in zip(members.tolist(), m_reply.tolist(), m_conv.tolist()):
+            tree = trees.setdefault(c, {'root': None, 'children': {}, 'parents': {}})
+            if rt != INT_NULL:
+                tree['parents'][tid] = rt
+            else:
+                tree['root'] = tid
+    return trees
+
+
+def _incomplete_ids(forest: ConversationForest) -> np.ndarray:
+    """Ids that were written as incomplete trees by any segment (some may be shadowed since)."""
+    return np.unique(np.concatenate(_segment_arrays(forest, 'incomplete_ids') or [np.zeros(0, np.int64)]))
+
+
+def _is_live_incomplete(forest: ConversationForest, tree_id: int) -> bool:
+    for seg in reversed(forest._segments):
+        if seg.tree_index(tree_id) >= 0:
+            incomplete = seg.arrays.get('incomplete_ids')
+            return incomplete is not None and bool(isin_sorted(np.array([tree_id]), incomplete)[0])
+    return False
+
+
+def _affected_incomplete_trees(
+    forest: ConversationForest, store: TweetStore,
+    ids: np.ndarray, reply_to: np.ndarray, conv: np.ndarray
+) -> Tuple[Dict[int, dict], List[int], Dict[int, int]]:
+    """
+    Rebuild incomplete trees touched by new non-conversation tweets.
+
+    Returns (rebuilt trees, old tree ids to tombstone, orphan index entries root -> missing parent).
+    """
+    loose = conv == INT_NULL
+    new_ids, new_reply = ids[loose], reply_to[loose]
+    if not len(new_ids):
+        return {}, [], {}
+
+    incomplete = _incomplete_ids(forest)
+
+    # Trees that contain the parent of a new reply
+    parents = np.unique(new_reply[new_reply != INT_NULL])
+    _, owner = forest.trees_containing(parents)
+    affected = set(owner[isin_sorted(owner, incomplete)].tolist())
+
+    # Trees whose root was waiting for one of the new tweets as its parent
+    orphan_parent = _segment_arrays(forest, 'orphan_parent')
+    orphan_root = _segment_arrays(forest, 'orphan_root')
+    for op, orr in zip(orphan_parent, orphan_root):
+        hit = isin_sorted(op, np.sort(new_ids))
+        affected.update(int(r) for r in orr[hit] if r in forest)
+
+    # Members of affected trees (all present tweets) + the new tweets
+    member_ids = [forest[t].node_ids() for t in affected]
+    old_ids = np.unique(np.concatenate(member_ids)) if member_ids else np.zeros(0, dtype=np.int64)
+    old_ids = old_ids[~isin_sorted(old_ids, np.sort(new_ids))]
+    _, old_reply = store.lookup_column(old_ids, 'reply_to_tweet_id')
+
+    found = [
+        {'tweet_id': t, 'reply_to_tweet_id': None if r == INT_NULL else r}
+        for t, r in zip(np.concatenate([old_ids, new_ids]).tolist(), np.concatenate([old_reply, new_reply]).tolist())
+    ]
+    rebuilt = build_incomplete_conversation_trees(found, [])
+    tombstones = [t for t in affected if t not in rebuilt]
+    reply_of = {d['tweet_id']: d['reply_to_tweet_id'] for d in found}
+    orphans = {r: reply_of[r] for r in rebuilt if reply_of.get(r) is not None}
+    return rebuilt, tombstones, orphans
+
+
+def update_reply_forest(table, forest_dir: Path, store: TweetStore, out_dir: Path) -> int:
+    """Write affected conversation/incomplete trees as a forest delta segment in out_dir. Returns trees written."""
+    forest = ConversationForest(forest_dir)
+    ids = int_column(table, 'tweet_id')
+    reply_to = int_column(table, 'reply_to_tweet_id')
+    conv = int_column(table, 'conversation_id')
+
+    incomplete, tombstones, orphans = _affected_incomplete_trees(forest, store, ids, reply_to, conv)
+    trees = _affected_conversation_trees(forest, store, ids, reply_to, conv, tombstones)
+    trees.update(incomplete)
+    for t in tombstones:
+        trees.setdefault(t, {'root': None, 'children': {}, 'parents': {}})
+    if not trees:
+        return 0
+
+    orphan_parent = np.array(list(orphans.values()), dtype=np.int64)
+    orphan_root = np.array(list(orphans.keys()), dtype=np.int64)
+    by_parent = np.argsort(orphan_parent, kind='stable')
+    write_conversation_forest(forest_arrays_from_trees(trees), out_dir, extra={
+        'incomplete_ids': np.sort(np.array(list(incomplete), dtype=np.int64)),
+        'orphan_parent': orphan_parent[by_parent],
+        'orphan_root': orphan_root[by_parent],
+    })
+    return len(trees)
+
+
+def _stamp_stores(parquet_path: Path, *store_dirs: Optional[Path]) -> None:
+    """The stores now reflect parquet_path; keep the build timings of their base."""
+    source = source_fingerprint(parquet_path)
+    for path in store_dirs:
+        if path is not None:
+            stamp_store(path, source)
+
+
+def apply_delta(
+    parquet_path: Path,
+    store_dir: Path,
+    forest_dir: Path,
+    quote_index_dir: Path,
+    manifest_path: Path,
+    quote_forest_dir: Optional[Path] = None,
+) -> int:
+    """
+    Ingest the new tweets of a parquet drop into existing stores, all or nothing.
+
+    An ingest interrupted by a previous run is finished first (recover_ingest).
+    A quote chain can be extended at either end by new tweets, so the quote
+    forest (if given) is rewritten from the updated quote index rather than patched.
+
+    Returns:
+        Number of new tweets ingested
+    """
+    import pyarrow as pa
+
+    recover_ingest(manifest_path)
+    _discard_staged(store_dir, forest_dir, quote_index_dir)
+    t0 = time.time()
+    store = TweetStore(store_dir)
+    quote_index = QuoteIndex(quote_index_dir)
+    manifest = load_ingest_manifest(manifest_path)
+    table = read_new_rows(parquet_path, store, set(manifest['archive_upload_ids']))
+    print(f"Diffed {parquet_path} against manifest in {time.time() - t0:.1f}s")
+    if table is None:
+        print("No new tweets")
+        _stamp_stores(parquet_path, store_dir, forest_dir, quote_index_dir, quote_forest_dir)
+        return 0
+    print(f"Found {len(table)} new tweets")
+
+    # Stage every output; the live stores are untouched until the journal is written
+    t0 = time.time()
+    new_counts, stored_ids, stored_totals = quoted_count_updates(table, store, quote_index)
+    if 'quoted_count' in table.column_names:
+        table = table.drop(['quoted_count'])
+    table = table.append_column('quoted_count', pa.array(new_counts))
+    store_delta = next_delta_dir(store_dir)
+    build_tweet_store(table, _staged(store_delta))
+    counts_dir = store_dir / (STAGED_PREFIX + 'quoted_count')
+    write_array_dir(counts_dir, {'tweet_id': stored_ids, 'quoted_count': stored_totals})
+    moves = [(_staged(store_delta), store_delta)]
+    print(f"Computed quoted counts and staged tweet store delta in {time.time() - t0:.1f}s")
+
+    t0 = time.time()
+    quote_delta = next_delta_dir(quote_index_dir)
+    n_keys = update_quote_index(table, _staged(quote_delta))
+    if n_keys:
+        moves.append((_staged(quote_delta), quote_delta))
+    print(f"Staged {n_keys} quote index keys in {time.time() - t0:.1f}s")
+
+    t0 = time.time()
+    forest_delta = next_delta_dir(forest_dir)
+    n_trees = update_reply_forest(table, forest_dir, store.with_segment(_staged(store_delta)), _staged(forest_delta))
+    if n_trees:
+        moves.append((_staged(forest_delta), forest_delta))
+    print(f"Staged {n_trees} affected reply trees in {time.time() - t0:.1f}s")
+
+    uploads = set(manifest['archive_upload_ids'])
+    if 'archive_upload_id' in table.column_names:
+        uploads.update(u for u in table['archive_upload_id'].unique().to_pylist() if u is not None)
+    manifest['archive_upload_ids'] = sorted(uploads)
+    manifest['drops'].append({
+        'parquet': str(parquet_path),
+        'mtime': parquet_path.stat().st_mtime,
+        'new_tweets': len(table),
+        'ingested_at': time.time(),
+    })
+    journal = {
+        'parquet': str(parquet_path),
+        'moves': [[str(staged), str(final)] for staged, final in moves],
+        'quoted_counts': str(counts_dir),
+        'store_dir': str(store_dir),
+        'forest_dir': str(forest_dir),
+        'quote_index_dir': str(quote_index_dir),
+        'quote_forest_dir': str(quote_forest_dir) if quote_forest_dir is not None else None,
+        'manifest': manifest,
+    }
+    save_ingest_manifest(ingest_journal_path(manifest_path), journal)
+    _finish_ingest(manifest_path, journal)
+    return len(table)
+
+
+def recover_ingest(manifest_path: Path) -> bool:
+    """Finish an ingest that committed its journal but did not complete. Returns whether there was one."""
+    path = ingest_journal_path(manifest_path)
+    if not path.exists():
+        return False
+    with open(path) as f:
+        journal = json.load(f)
+    print(f"Finishing the interrupted ingest of {journal['parquet']}")
+    _finish_ingest(manifest_path, journal)
+    return True
+
+
+def _finish_ingest(manifest_path: Path, journal: dict) -> None:
+    """Roll a committed ingest journal forward; every step can be repeated."""
+    t0 = time.time()
+    for staged, final in journal['moves']:
+        if Path(staged).exists():
+            os.replace(staged, final)
+
+    store_dir = Path(journal['store_dir'])
+    counts_dir = Path(journal['quoted_counts'])
+    if counts_dir.exists():
+        arrays, _ = open_array_dir(counts_dir)
+        TweetStore(store_dir).set_column(arrays['tweet_id'], arrays['quoted_count'], 'quoted_count')
+
+    quote_forest_dir = Path(journal['quote_forest_dir']) if journal['quote_forest_dir'] else None
+    if quote_forest_dir is not None:
+        forest_stats = write_quote_forest(quote_forest_dir, *QuoteIndex(journal['quote_index_dir']).pairs())
+        print(f"Rewrote quote forest ({forest_stats['chains']} chains)")
+
+    save_ingest_manifest(manifest_path, journal['manifest'])
+    _stamp_stores(
+        Path(journal['parquet']), store_dir, Path(journal['forest_dir']), Path(journal['quote_index_dir']), quote_forest_dir
+    )
+    shutil.rmtree(counts_dir, ignore_errors=True)
+    ingest_journal_path(manifest_path).unlink()
+    print(f"Committed ingest in {time.time() - t0:.1f}s")
+
+# %%
@@ -0,0 +1,130 @@
+# %%
+"""
+Versioning and integrity manifest for the cache stores.
+
+Every store's meta.json carries, besides its own layout fields:
+    files            size and crc32 of each array file (written by commit_array_dir)
+    builder_version  BUILDER_VERSION of the code that built it
+    source           path, mtime, bytes, rows and schema hash of the parquet it reflects
+    built_at         unix time of the build
+    timings          build stage stats (rows, seconds, rows_per_sec)
+
+validate_store() checks a store against the current code and the parquet it
+was built from using only meta.json, a stat() per file and the parquet footer,
+so loading stays O(1) in the data size. deep=True also recomputes the checksums.
+"""
+import hashlib
+import time
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+from .array_store import delta_dirs, file_checksum, read_meta, write_meta
+
+# Bump when the builder's output changes for the same input
+BUILDER_VERSION = 1
+
+SOURCE_FIELDS = ('mtime', 'bytes', 'rows', 'schema_hash')
+
+
+def schema_hash(schema) -> str:
+    """Stable hash of a pyarrow schema (field names and types, metadata ignored)."""
+    return hashlib.sha256(schema.remove_metadata().to_string().encode()).hexdigest()[:16]
+
+
+def source_fingerprint(parquet_path: Union[str, Path]) -> Dict:
+    """Identity of a parquet file from its stat() and footer (no data pages read)."""
+    import pyarrow.parquet as pq
+
+    path = Path(parquet_path)
+    st = path.stat()
+    pf = pq.ParquetFile(path)
+    return {
+        'path': str(path),
+        'mtime': st.st_mtime,
+        'bytes': st.st_size,
+        'rows': pf.metadata.num_rows,
+        'schema_hash': schema_hash(pf.schema_arrow),
+    }
+
+
+def stamp_store(path: Union[str, Path], source: Dict, timings: Optional[Dict] = None) -> None:
+    """Record builder version, source fingerprint and build timings in a store's meta.json."""
+    meta = read_meta(path)
+    meta['builder_version'] = BUILDER_VERSION
+    meta['source'] = source
+    meta['built_at'] = time.time()
+    if timings is not None:
+        meta['timings'] = timings
+    write_meta(path, meta)
+
+
+def _check_files(path: Path, meta: dict, deep: bool) -> Optional[str]:
+    for name, recorded in meta.get('files', {}).items():
+        f = path / name
+        if not f.exists():
+            return f"missing {f}"
+        if f.stat().st_size != recorded['bytes']:
+            return f"{f} is {f.stat().st_size} bytes, expected {recorded['bytes']}"
+        if deep and file_checksum(f)['crc32'] != recorded['crc32']:
+            return f"checksum mismatch in {f}"
+    return None
+
+
+def recorded_source(path: Union[str, Path]) -> Optional[Path]:
+    """Parquet a store was last built or updated from, if its manifest records one."""
+    try:
+        source = read_meta(path).get('source')
+    except (FileNotFoundError, ValueError):
+        return None
+    return Path(source['path']) if source else None
+
+
+def validate_store(
+    path: Union[str, Path],
+    version: int,
+    check_source: bool = True,
+    deep: bool = False,
+) -> Optional[str]:
+    """
+    Check a store (and its delta segments) against the manifest in its meta.json.
+
+    Args:
+        path: Store directory
+        version: Layout version the reading code expects
+        check_source: Compare the recorded source parquet's fingerprint with
+            the file on disk (skipped if the parquet is no longer there)
+        deep: Also verify file crc32s (reads every file)
+
+    Returns:
+        None if the store is valid, otherwise the reason it is stale or corrupt
+    """
+    path = Path(path)
+    try:
+        meta = read_meta(path)
+    except FileNotFoundError:
+        return f"{path} is missing or incomplete"
+    except ValueError:
+        return f"{path}/meta.json is unreadable"
+    if meta.get('version') != version:
+        return f"{path} has layout version {meta.get('version')}, expected {version}"
+    if meta.get('builder_version') != BUILDER_VERSION:
+        return f"{path} was built by builder version {meta.get('builder_version')}, expected {BUILDER_VERSION}"
+    recorded = meta.get('source')
+    if recorded is None:
+        return f"{path} has no source manifest"
+    if check_source and Path(recorded['path']).exists():
+        current = source_fingerprint(recorded['path'])
+        changed = [k for k in SOURCE_FIELDS if recorded.get(k) != current[k]]
+        if changed:
+            return f"{recorded['path']} changed since {path} was built ({', '.join(changed)})"
+    for segment in [path] + delta_dirs(path):
+        try:
+            seg_meta = meta if segment == path else read_meta(segment)
+        except (FileNotFoundError, ValueError):
+            return f"{segment} is missing or incomplete"
+        problem = _check_files(segment, seg_meta, deep)
+        if problem:
+            return problem
+    return None
+
+# %%
@@ -1,8 +1,14 @@
 # %%
+import gc
+from contextlib import contextmanager
+
 from lib.image_describer import MediaDescription
+from lib.array_store import INT_NULL, id_columns, sorted_unique
+from lib.bulk_get import get_many
+from lib.conversation_forest import ConversationForest, ForestTree, build_forest_arrays
 import pandas as pd
 import numpy as np
-from collections import defaultdict
+from collections import defaultdict, deque
 from typing import TypedDict, Optional, Annotated, List
 from pandas import DataFrame
 from datetime import datetime
@@ -13,10 +19,13 @@ from typing import (
     List,
     Callable,
     Any,
+    Mapping,
     Union,
     Optional,
     TypedDict,
     Set,
+    Iterator,
+    TextIO,
 )
 
 import tqdm
@@ -51,43 +60,275 @@ class ConversationTree(TypedDict):
     parents: Dict[int, int]
 
 
-def build_conversation_trees(
-    tweets: List[EnrichedTweet]
-) -> Dict[int, ConversationTree]:
+CONVERSATION_COLUMNS = ("tweet_id", "reply_to_tweet_id", "conversation_id")
+
+
+def conversation_edges(
+    ids: np.ndarray, reply_to: np.ndarray, conv: np.ndarray, stable: bool = True
+) -> Dict[str, np.ndarray]:
+    """
+    Group conversation tweets by conversation_id with one argsort.
+
+    Args:
+        ids, reply_to, conv: int64 id columns (INT_NULL for no reply)
+        stable: Keep input order within each conversation's edges; without it
+            the (faster) sort leaves them in arbitrary order, which is enough
+            for build_forest_arrays
+
+    Returns:
+        Dict of arrays:
+            tree_ids    sorted conversation ids
+            roots       root of each conversation: its last tweet without reply_to (INT_NULL if none)
+            first_row   input row where each conversation first appears
+            edge_start  (M+1,) edge range of each conversation
+            edge_child, edge_parent  reply edges, grouped by conversation
+    """
+    order = np.argsort(conv, kind="stable" if stable else "quicksort")
+    conv_s, reply_s = conv[order], reply_to[order]
+    new_tree = np.ones(len(conv_s), dtype=bool)
+    new_tree[1:] = conv_s[1:] != conv_s[:-1]
+    starts = np.flatnonzero(new_tree)
+    tree_ids = conv_s[starts]
+    tree_of_row = np.cumsum(new_tree) - 1
+
+    # Root: last tweet (highest input row) without reply_to in each conversation
+    root_rows = np.flatnonzero(reply_s == INT_NULL)
+    root_tree = tree_of_row[root_rows]
+    roots = np.full(len(tree_ids), INT_NULL, dtype=np.int64)
+    if len(root_rows):
+        group = np.flatnonzero(np.diff(root_tree, prepend=-1))
+        roots[root_tree[group]] = ids[np.maximum.reduceat(order[root_rows], group)]
+
+    is_edge = reply_s != INT_NULL
+    edge_start = np.zeros(len(tree_ids) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(tree_of_row[is_edge], minlength=len(tree_ids)), out=edge_start[1:])
+    return {
+        "tree_ids": tree_ids,
+        "roots": roots,
+        "first_row": np.minimum.reduceat(order, starts) if len(starts) else starts,
+        "edge_start": edge_start,
+        "edge_child": ids[order[is_edge]],
+        "edge_parent": reply_s[is_edge],
+    }
+
+
+def build_conversation_trees(tweets, compact: bool = False) -> Mapping[int, ConversationTree]:
     """
     Organize tweets into conversation trees. Takes only tweets with conversation_id not None.
+
+    Args:
+        tweets: List of EnrichedTweet, or a DataFrame / pyarrow Table with
+            tweet_id, reply_to_tweet_id and conversation_id columns
+        compact: Return an in-memory ConversationForest (same tree shape, children
+            sorted by tweet id, trees decoded on access) instead of building
+            every tree as dicts; much faster on the full archive
+
     Returns dict of conversation_id -> {
         'root': tweet_id of root,
         'children': dict of tweet_id -> list of child tweet_ids,
         'parents': dict of tweet_id -> parent tweet_id
     }
     """
-    print(f"Building trees from {len(tweets)} conversation tweets")
-    conversations: Dict[int, ConversationTree] = {}
-
-    # Organize tweets by conversation
-    for tweet in tqdm.tqdm(tweets, desc="Building conversations"):
-        conv_id = tweet["conversation_id"]
-        if conv_id is None:
-            raise ValueError(f"Conversation ID is None for tweet {tweet['tweet_id']}")
-        if conv_id is not None and conv_id not in conversations:
-            conversations[conv_id] = {  
-                "children": defaultdict(list),
-                "parents": {},
-                "root": None,
-            }
+    ids, reply_to, conv = id_columns(tweets, CONVERSATION_COLUMNS)
+    print(f"Building trees from {len(ids)} conversation tweets")
+    missing = np.flatnonzero(conv == INT_NULL)
+    if len(missing):
+        raise ValueError(f"Conversation ID is None for tweet {int(ids[missing[0]])}")
+
+    e = conversation_edges(ids, reply_to, conv, stable=not compact)
+    edge_start, child, parent = e["edge_start"], e["edge_child"], e["edge_parent"]
+    if compact:
+        forest = ConversationForest.from_arrays(build_forest_arrays(
+            e["tree_ids"], e["roots"], np.repeat(e["tree_ids"], np.diff(edge_start)), child, parent
+        ))
+        print(f"Built {len(forest)} conversation trees")
+        return forest
+    conversations = _tree_dicts(e["tree_ids"], e["roots"], e["first_row"], edge_start, child, parent)
+    print(f"Built {len(conversations)} conversation trees")
+    return conversations
 
-        tweet_id = tweet["tweet_id"]
 
-        reply_to = tweet.get("reply_to_tweet_id")
-        if reply_to:
-            conversations[conv_id]["children"][reply_to].append(tweet_id)
-            conversations[conv_id]["parents"][tweet_id] = reply_to
-        else:
-            conversations[conv_id]["root"] = tweet_id
+def _tree_dicts(
+    tree_ids: np.ndarray,
+    roots: np.ndarray,
+    first_row: np.ndarray,
+    edge_start: np.ndarray,
+    child: np.ndarray,
+    parent: np.ndarray,
+) -> Dict[int, ConversationTree]:
+    """
+    ConversationTree dicts from edges grouped by tree (edge_start ranges, input order within a tree).
 
-    print(f"Built {len(conversations)} conversation trees")
-    return conversations
+    Trees are inserted in first_row order; children lists keep input order,
+    as when the trees were built one tweet at a time.
+    """
+    edge_tree = np.repeat(np.arange(len(tree_ids)), np.diff(edge_start))
+
+    # Children lists: edges grouped by (tree, parent), groups in order of first reply
+    by_parent = np.lexsort((parent, edge_tree))
+    new_group = np.ones(len(by_parent), dtype=bool)
+    new_group[1:] = (edge_tree[by_parent][1:] != edge_tree[by_parent][:-1]) | (
+        parent[by_parent][1:] != parent[by_parent][:-1]
+    )
+    group_start = np.flatnonzero(new_group)
+    group_end = np.append(group_start[1:], len(by_parent))
+    group_first = by_parent[group_start]
+    group_order = np.argsort(group_first, kind="stable")
+    grouped = child[by_parent].tolist()
+    child_lists = [grouped[a:b] for a, b in zip(group_start[group_order].tolist(), group_end[group_order].tolist())]
+    group_parent = parent[group_first[group_order]].tolist()
+    tree_group_start = np.searchsorted(edge_tree[group_first[group_order]], np.arange(len(tree_ids) + 1))
+
+    child_l, parent_l = child.tolist(), parent.tolist()
+    bounds = lambda starts: zip(starts[:-1].tolist(), starts[1:].tolist())
+    roots = [None if r == INT_NULL else r for r in roots.tolist()]
+    tree_ids = tree_ids.tolist()
+    with _gc_paused():
+        children = [defaultdict(list, zip(group_parent[a:b], child_lists[a:b])) for a, b in bounds(tree_group_start)]
+        parents = [dict(zip(child_l[a:b], parent_l[a:b])) for a, b in bounds(edge_start)]
+        return {
+            tree_ids[t]: {"root": roots[t], "children": children[t], "parents": parents[t]}
+            for t in np.argsort(first_row, kind="stable").tolist()
+        }
+
+
+@contextmanager
+def _gc_paused():
+    """Pause the cyclic GC while allocating many acyclic containers (it would rescan them repeatedly)."""
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def link_incomplete_trees(
+    ids: np.ndarray, reply_to: np.ndarray, found: np.ndarray
+) -> Dict[str, np.ndarray]:
+    """
+    Assign every tweet of a set of orphan reply chains to the root of its tree.
+
+    Reply edges are unioned into a disjoint-set forest (union by size, path
+    halving), so the whole set is linked in O(n α(n)). An edge whose two ends
+    are already connected would close a cycle and is dropped, which leaves
+    its replying tweet as the root of the chain. Each component is then
+    exactly one tree, rooted at its only tweet without a parent.
+
+    Args:
+        ids, reply_to: int64 id columns in input order (INT_NULL for no reply);
+            a tweet listed twice keeps its last reply_to
+        found: Rows that may start trees and reply to others (the rest,
+            e.g. liked tweets, can only be replied to)
+
+    Returns:
+        Dict of arrays over the distinct tweet ids:
+            node_ids   sorted tweet ids
+            row        input row each node was taken from
+            parent     node index of the parent, -1 for none
+            tree_root  node index of the node's tree root, -1 if the root isn't a found tweet
+            cycles     (1,) number of reply edges dropped to break cycles
+    """
+    # Last found row wins for each id; non-found rows only add missing ids
+    order = np.lexsort((np.arange(len(ids)), found, ids))
+    last = np.ones(len(order), dtype=bool)
+    last[:-1] = ids[order][1:] != ids[order][:-1]
+    rows = order[last]
+    node_ids = ids[rows]
+    n = len(node_ids)
+    is_found = found[rows]
+
+    target = reply_to[rows]
+    pos = np.minimum(np.searchsorted(node_ids, target), max(n - 1, 0))
+    linked = is_found & (target != INT_NULL) & (node_ids[pos] == target) if n else np.zeros(0, dtype=bool)
+    parent = np.where(linked, pos, -1)
+
+    # Union-find over the reply edges, in input order
+    uf = list(range(n))
+    size = [1] * n
+
+    def find(x: int) -> int:
+        while uf[x] != x:
+            uf[x] = uf[uf[x]]
+            x = uf[x]
+        return x
+
+    edges = np.flatnonzero(linked)
+    edges = edges[np.argsort(rows[edges], kind="stable")]
+    dropped = []
+    for c, p in zip(edges.tolist(), parent[edges].tolist()):
+        rc, rp = find(c), find(p)
+        if rc == rp:
+            dropped.append(c)
+            continue
+        if size[rc] < size[rp]:
+            rc, rp = rp, rc
+        uf[rp] = rc
+        size[rc] += size[rp]
+    parent[dropped] = -1
+
+    # Each component's root is its one parentless node
+    rep = np.fromiter((find(x) for x in range(n)), dtype=np.int64, count=n)
+    component_root = np.full(n, -1, dtype=np.int64)
+    tops = np.flatnonzero((parent < 0) & is_found)
+    component_root[rep[tops]] = tops
+    return {
+        "node_ids": node_ids,
+        "row": rows,
+        "parent": parent,
+        "tree_root": component_root[rep],
+        "cycles": np.array([len(dropped)], dtype=np.int64),
+    }
+
+
+def break_parent_cycles(parent: np.ndarray) -> Tuple[np.ndarray, int]:
+    """
+    Drop the edges that close cycles in a parent-pointer array (-1 for no parent).
+
+    Edges are linked in node order with link_incomplete_trees, so the same
+    edge is dropped as when reply chains are linked. Returns (parent, edges dropped).
+    """
+    n = len(parent)
+    linked = link_incomplete_trees(
+        np.arange(n, dtype=np.int64), np.where(parent >= 0, parent, INT_NULL), np.ones(n, dtype=bool)
+    )
+    return linked["parent"], int(linked["cycles"][0])
+
+
+def incomplete_tree_edges(
+    ids: np.ndarray, reply_to: np.ndarray, found: np.ndarray
+) -> Dict[str, np.ndarray]:
+    """
+    Incomplete trees from id columns, in the same layout as conversation_edges.
+
+    Every found tweet without a linked parent roots a tree (keyed by its own
+    id), including single-tweet trees.
+
+    Returns:
+        Dict with tree_ids, roots, first_row, edge_start, edge_child, edge_parent
+        (edges grouped by tree, input order within one) and cycles
+    """
+    linked = link_incomplete_trees(ids, reply_to, found)
+    node_ids, row, parent, tree_root = linked["node_ids"], linked["row"], linked["parent"], linked["tree_root"]
+    tops = np.flatnonzero((parent < 0) & (tree_root >= 0))
+    tree_of_top = np.full(len(node_ids), -1, dtype=np.int64)
+    tree_of_top[tops] = np.arange(len(tops))
+
+    edges = np.flatnonzero((parent >= 0) & (tree_root >= 0))
+    edge_tree = tree_of_top[tree_root[edges]]
+    edges = edges[np.lexsort((row[edges], edge_tree))]
+    edge_start = np.zeros(len(tops) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(tree_of_top[tree_root[edges]], minlength=len(tops)), out=edge_start[1:])
+    return {
+        "tree_ids": node_ids[tops],
+        "roots": node_ids[tops],
+        "first_row": row[tops],
+        "edge_start": edge_start,
+        "edge_child": node_ids[edges],
+        "edge_parent": node_ids[parent[edges]],
+        "cycles": linked["cycles"],
+    }
 
 
 def build_incomplete_conversation_trees(
@@ -96,9 +337,13 @@ def build_incomplete_conversation_trees(
     """
     Build conversation trees from incomplete reply chains.
 
+    Tweets are linked to their roots with a disjoint-set forest in one pass
+    (see link_incomplete_trees); reply cycles are broken instead of dropping
+    the chain, and branching replies all keep their parent.
+
     Args:
-        found_tweets: list of tweet data
-        found_liked: list of liked tweet data
+        found_tweets: list of tweet data (or a DataFrame / pyarrow Table)
+        found_liked: list of liked tweet data; they can be replied to but don't start trees
 
     Returns:
         Dict of root_id -> {
@@ -107,59 +352,16 @@ def build_incomplete_conversation_trees(
             'parents': dict of tweet_id -> parent id
         }
     """
-    # Combine tweets and build parent relationships
-    all_tweets = {tweet["tweet_id"]: tweet for tweet in found_tweets + found_liked}
-    parents = {}
-    children = defaultdict(list)
-    visited = set()  # Track visited nodes to prevent cycles
-
-    # Build parent/child relationships with cycle check
-    for tweet in tqdm.tqdm(found_tweets, desc="Building parent/child relationships"):
-        tweet_id = tweet["tweet_id"]
-        reply_to = tweet.get("reply_to_tweet_id")
-        if reply_to and reply_to in all_tweets:
-            if reply_to not in visited and tweet_id not in visited:
-                parents[tweet_id] = reply_to
-                children[reply_to].append(tweet_id)
-                visited.update({tweet_id, reply_to})
-
-    # Find roots (tweets with no parents that exist in our data)
-    found_tweet_ids = {tweet["tweet_id"] for tweet in found_tweets}
-    roots = {
-        tid: tweet
-        for tid, tweet in all_tweets.items()
-        if tid not in parents and tid in found_tweet_ids
-    }
-
-    trees = {}
-    # Build tree for each root with depth limit
-    for i, root_id in tqdm.tqdm(enumerate(roots), desc="Building trees", total=len(roots)):
-        tree = {
-            "root": root_id,
-            "children": defaultdict(list),
-            "parents": {},
-        }
-
-        # BFS with cycle protection and depth limit
-        from collections import deque
-        queue = deque([(root_id, 0)])
-        while queue:
-            current_id, depth = queue.popleft()
-
-            # Safety against infinite loops
-            if depth > 100:  # Max depth for any reasonable conversation
-                print(f"Max depth reached at {current_id}")
-                break
-
-            # Process children with cycle check
-            for child_id in children.get(current_id, []):
-                if child_id not in tree["parents"]:  # Prevent re-parenting
-                    tree["parents"][child_id] = current_id
-                    tree["children"][current_id].append(child_id)
-                    queue.append((child_id, depth + 1))
-
-        trees[root_id] = tree
-
+    found_cols = id_columns(found_tweets, ("tweet_id", "reply_to_tweet_id"))
+    liked_ids, = id_columns(found_liked, ("tweet_id",))
+    ids = np.concatenate([found_cols[0], liked_ids])
+    reply_to = np.concatenate([found_cols[1], np.full(len(liked_ids), INT_NULL, dtype=np.int64)])
+    found = np.arange(len(ids)) < len(found_cols[0])
+
+    e = incomplete_tree_edges(ids, reply_to, found)
+    if e["cycles"][0]:
+        print(f"Broke {int(e['cycles'][0])} reply cycle(s)")
+    trees = _tree_dicts(e["tree_ids"], e["roots"], e["first_row"], e["edge_start"], e["edge_child"], e["edge_parent"])
     print(f"Built {len(trees)} incomplete trees")
     return trees
 
@@ -168,6 +370,9 @@ def build_incomplete_conversation_trees(
 def build_quote_trees(tweets: List[EnrichedTweet]) -> Dict[int, ConversationTree]:
     """Build trees of quote tweet relationships.
     
+    For whole-corpus quote chains use the persisted QuoteForest (lib/quote_forest.py,
+    strand_caches.get_quote_forest()) instead.
+    
     Args:
         tweets: List of tweets with quoted_tweet_id field
         
@@ -237,6 +442,11 @@ def filter_conversation_trees(
     """
     Filter conversation trees to include only subtrees relevant to the given tweet IDs.
     
+    Keeps the union of every target's ancestors (up to depth_up) and descendants.
+    Forest trees use their Euler tour arrays (ForestTree.windows), so the work is
+    a range scan per target instead of a BFS; dict trees use _window_nodes.
+    For many strands at once use filter_conversation_trees_batch.
+    
     Args:
         tweet_ids: List of tweet IDs to filter trees for
         conversation_trees: Pre-computed conversation trees
@@ -248,72 +458,125 @@ def filter_conversation_trees(
     Returns:
         Dict mapping conversation_id -> filtered ConversationTree
     """
+    return filter_conversation_trees_batch(
+        {0: tweet_ids}, conversation_trees, tweet_dict, depth, depth_up, depth_from_root
+    )[0]
+
+
+def filter_conversation_trees_batch(
+    seed_lists: Mapping[Any, List[int]],
+    conversation_trees: Dict[int, ConversationTree],
+    tweet_dict: Dict[int, EnrichedTweet],
+    depth: int = 5,
+    depth_up: int | None = None,
+    depth_from_root: int | None = None
+) -> Dict[Any, Dict[int, ConversationTree]]:
+    """
+    filter_conversation_trees for many strands at once, sharing work between them.
+    
+    Tweets and trees are fetched once for all strands. In each conversation the
+    window of every distinct seed is computed once, in one pass over all seeds
+    of all strands, and each strand then takes the union of its seeds' windows.
+    
+    Args:
+        seed_lists: Strand key -> seed tweet IDs
+        (other args as in filter_conversation_trees)
+        
+    Returns:
+        Strand key -> (conversation_id -> filtered ConversationTree)
+    """
     if depth_up is None:
         depth_up = depth
     if depth_from_root is None:
         depth_from_root = depth
-    filtered_trees = {}
     
-    # Pre-filter: map conversation_id -> set of relevant tweet_ids
-    conv_to_targets = defaultdict(set)
-    for tid in tweet_ids:
-        if tid not in tweet_dict:
+    # Pre-filter: conversation_id of every distinct seed, then conversation -> strand -> seeds
+    all_ids = list(dict.fromkeys(tid for ids in seed_lists.values() for tid in ids))
+    conv_of = {}
+    for tid, tweet in zip(all_ids, get_many(tweet_dict, all_ids)):
+        if tweet is None:
+            continue
+        conv_id = tweet.get("conversation_id")
+        if conv_id:
+            conv_of[tid] = conv_id
+    strands_in_conv: Dict[int, Dict[Any, List[int]]] = defaultdict(dict)
+    for key, ids in seed_lists.items():
+        for tid in dict.fromkeys(ids):
+            conv_id = conv_of.get(tid)
+            if conv_id is not None:
+                strands_in_conv[conv_id].setdefault(key, []).append(tid)
+    trees = dict(zip(strands_in_conv, get_many(conversation_trees, strands_in_conv)))
+
+    results: Dict[Any, Dict[int, ConversationTree]] = {key: {} for key in seed_lists}
+    for conv_id, strands in strands_in_conv.items():
+        tree = trees[conv_id]
+        if tree is None:
             continue
-        conv_id = tweet_dict[tid].get("conversation_id")
-        if conv_id and conv_id in conversation_trees:
-            conv_to_targets[conv_id].add(tid)
+        seeds = list(dict.fromkeys(tid for ids in strands.values() for tid in ids))
+        # Tree roots (tweets that key a tree) get depth_from_root below them
+        down = [depth_from_root if tid in conversation_trees else depth for tid in seeds]
+        if isinstance(tree, ForestTree):
+            q, nodes = tree.windows(np.array(seeds, dtype=np.int64), np.array(down), depth_up)
+            bounds = np.searchsorted(q, np.arange(len(seeds) + 1)).tolist()
+            window = {tid: nodes[bounds[i]:bounds[i + 1]] for i, tid in enumerate(seeds)}
+            for key, ids in strands.items():
+                child, parent = tree.edges_among(sorted_unique(np.concatenate([window[tid] for tid in ids])))
+                results[key][conv_id] = _filtered_tree(tree.get("root"), child.tolist(), parent.tolist())
+        else:
+            down_of = dict(zip(seeds, down))
+            for key, ids in strands.items():
+                nodes = _window_nodes(tree, ids, [down_of[tid] for tid in ids], depth_up)
+                results[key][conv_id] = _filtered_tree(tree.get("root"), *_edges_among(tree, nodes))
+    
+    return results
 
-    for conv_id, target_ids in conv_to_targets.items():
-        tree = conversation_trees[conv_id]
-        
-        # Identify all nodes to include
-        nodes_to_include = set()
-        
-        for tid in target_ids:
-            nodes_to_include.add(tid)
-            
-            # Walk ancestors up to depth limit
-            curr = tid
-            ancestor_depth = 0
-            while ancestor_depth < depth_up:
-                parent = tree["parents"].get(curr)
-                if parent is None:
-                    break
-                nodes_to_include.add(parent)
-                curr = parent
-                ancestor_depth += 1
-            
 
-            # Add descendants up to depth
-            queue = [(tid, depth_from_root if tid in conversation_trees else depth)]
-            while queue:
-                curr, curr_depth = queue.pop(0)
-                if curr_depth > 0:
-                    for child in tree["children"].get(curr, []):
-                        if child not in nodes_to_include:
-                            nodes_to_include.add(child)
-                            queue.append((child, curr_depth - 1))
-        
-        # Build filtered tree structure
-        filtered_children = defaultdict(list)
-        filtered_parents = {}
-        
-        for node in nodes_to_include:
-            # Include parent relationship if parent is also in filtered set
-            parent = tree["parents"].get(node)
-            if parent is not None and parent in nodes_to_include:
-                filtered_parents[node] = parent
-                filtered_children[parent].append(node)
-        
-        original_root = tree.get("root")
-        
-        filtered_trees[conv_id] = {
-            "root": original_root,
-            "children": filtered_children,
-            "parents": filtered_parents,
-        }
-    
-    return filtered_trees
+def _filtered_tree(root: Optional[int], child: List[int], parent: List[int]) -> ConversationTree:
+    filtered_children = defaultdict(list)
+    for c, p in zip(child, parent):
+        filtered_children[p].append(c)
+    return {"root": root, "children": filtered_children, "parents": dict(zip(child, parent))}
+
+
+def _window_nodes(tree: ConversationTree, targets: List[int], down: List[int], depth_up: int) -> Set[int]:
+    """
+    Nodes around targets in a dict tree (trees without Euler tour arrays, e.g. legacy diskcache).
+
+    Frontier depths are memoised: a node is only re-expanded when reached with
+    more depth left than before, so overlapping targets don't repeat each other's walks.
+    """
+    parents, children = tree["parents"], tree["children"]
+    included = set(targets)
+    climbed: Dict[int, int] = {}
+    for tid in targets:
+        curr, left = tid, depth_up
+        while left > 0 and climbed.get(curr, -1) < left:
+            climbed[curr] = left
+            parent = parents.get(curr)
+            if parent is None:
+                break
+            included.add(parent)
+            curr, left = parent, left - 1
+
+    reached: Dict[int, int] = {}
+    queue = deque(zip(targets, down))
+    while queue:
+        curr, left = queue.popleft()
+        if reached.get(curr, -1) >= left:
+            continue
+        reached[curr] = left
+        included.add(curr)
+        if left > 0:
+            queue.extend((c, left - 1) for c in children.get(curr, []))
+    return included
+
+
+def _edges_among(tree: ConversationTree, nodes: Set[int]) -> Tuple[List[int], List[int]]:
+    """(child ids, parent ids) of the edges of a dict tree between nodes, by child id."""
+    parents = tree["parents"]
+    edges = [(node, parents.get(node)) for node in sorted(nodes)]
+    edges = [(c, p) for c, p in edges if p is not None and p in nodes]
+    return [c for c, _ in edges], [p for _, p in edges]
 
 
 
@@ -344,15 +607,103 @@ def _render_header_default(tweet: EnrichedTweet) -> str:
     return f"{tweet['tweet_id']} [{date_str}] @{username} {stats_str}"
 
 
-def strand_header_print_factory(seed_info: Dict[int, str]) -> Callable[[EnrichedTweet], str]:
-    def print_header(tweet: EnrichedTweet) -> str:
-        base = _render_header_default(tweet)
-        seed_type_str = seed_info.get(tweet.get("tweet_id"), "")
+@dataclass(frozen=True)
+class StrandHeader:
+    """Header of a strand's tweets: the default header, plus a tag on seed tweets."""
+    seed_info: Dict[int, str]
+
+    def __call__(self, tweet: EnrichedTweet) -> str:
+        return self.annotate(tweet, _render_header_default(tweet))
+
+    def annotate(self, tweet: EnrichedTweet, base: str) -> str:
+        """Header from an already rendered default header (e.g. a RenderFragments entry)."""
+        seed_type_str = self.seed_info.get(tweet.get("tweet_id"), "")
         if seed_type_str:
             return f'{base} [(SEED) type={seed_type_str}]'
         else:
             return base
-    return print_header
+
+
+def strand_header_print_factory(seed_info: Dict[int, str]) -> Callable[[EnrichedTweet], str]:
+    return StrandHeader(seed_info)
+
+
+class RenderFragments:
+    """
+    Prefix-independent parts of each tweet's rendering, formatted once and shared across strands.
+
+    An entry holds a tweet's default header (before any seed tag) and its body
+    lines (text, quoted-tweet block, images) without indentation; renderers
+    only add connectors, indentation and the strand's seed tags. Entries are
+    keyed by tweet_id within one renderer config, the tweet_dict and
+    image_descriptions the cache was made for (e.g. one build_strands_phased
+    batch): make a new one when image descriptions change.
+    """
+
+    def __init__(
+        self,
+        tweet_dict: Dict[int, EnrichedTweet],
+        image_descriptions: Dict[int, list[MediaDescription]] = {},
+    ):
+        self.tweet_dict = tweet_dict
+        self.image_descriptions = image_descriptions
+        self._entries: Dict[int, Optional[Tuple[EnrichedTweet, str, Tuple[str, ...]]]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, tweet_id: int) -> Optional[Tuple[EnrichedTweet, str, Tuple[str, ...]]]:
+        """(tweet, default header, body lines) of tweet_id, None if the tweet is missing."""
+        try:
+            entry = self._entries[tweet_id]
+            self.hits += 1
+            return entry
+        except KeyError:
+            self.misses += 1
+        tweet = self.tweet_dict.get(tweet_id)
+        entry = None
+        if tweet:
+            body = _body_lines(tweet, self.tweet_dict, self.image_descriptions.get(tweet_id, []))
+            entry = (tweet, _render_header_default(tweet), tuple(body))
+        self._entries[tweet_id] = entry
+        return entry
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __repr__(self) -> str:
+        return f"RenderFragments({len(self)} tweets, {self.hits} hits, {self.misses} misses)"
+
+
+def _body_lines(
+    tweet: EnrichedTweet,
+    tweets: Dict[int, EnrichedTweet],
+    images: list[MediaDescription],
+) -> List[str]:
+    """Text, quoted-tweet block and image lines of a tweet, before indentation."""
+    lines = tweet.get("full_text", "").split("\n")
+
+    # Handle quoted text
+    q_id = tweet.get("quoted_tweet_id")
+    if q_id is not None:
+        q_tweet = tweets.get(q_id)
+        if q_tweet:
+            q_text = q_tweet.get("full_text", "").replace("\n", " ")
+            lines.append(f"  [Quoting @{q_tweet.get('username')}: {q_text}]")
+        else:
+            lines.append(f"  [Quoting Tweet {q_id} (missing)]")
+
+    # Render images
+    if images:
+        lines.append("Images:")
+        for i, image_desc in enumerate(images):
+            description = image_desc['description']
+            description_lines = description.split('\n')
+            for j, desc_line in enumerate(description_lines):
+                if j == 0:
+                    lines.append(f"  - [Image #{i}] {desc_line}")
+                else:
+                    lines.append(f"    {desc_line}")
+    return lines
 
 
 def render_conversation_trees(
@@ -360,6 +711,7 @@ def render_conversation_trees(
     tweet_dict: Dict[int, EnrichedTweet],
     render_header: Callable[[EnrichedTweet], str] = _render_header_default,
     image_descriptions: Dict[int, list[MediaDescription]] = {},
+    fragments: Optional[RenderFragments] = None,
 ) -> str:
     """
     Render filtered conversation trees to a string representation.
@@ -367,11 +719,63 @@ def render_conversation_trees(
     Args:
         filtered_trees: Dict mapping conversation_id -> filtered ConversationTree
         tweet_dict: Dictionary of tweet data keyed by tweet_id
+        fragments: Shared RenderFragments of tweet_dict and image_descriptions
+            (to reuse formatted tweets across strands)
         
     Returns:
         String representation of the threads formatted like 'tree' command
     """
-    output_lines = []
+    return "\n".join(iter_conversation_trees(filtered_trees, tweet_dict, render_header, image_descriptions, fragments))
+
+
+def write_conversation_trees(
+    sink: TextIO,
+    filtered_trees: Dict[int, ConversationTree],
+    tweet_dict: Dict[int, EnrichedTweet],
+    render_header: Callable[[EnrichedTweet], str] = _render_header_default,
+    image_descriptions: Dict[int, list[MediaDescription]] = {},
+    fragments: Optional[RenderFragments] = None,
+) -> int:
+    """
+    Stream render_conversation_trees' output to sink (anything with .write) line by line.
+    
+    Returns:
+        Number of characters written
+    """
+    written = 0
+    lines = iter_conversation_trees(filtered_trees, tweet_dict, render_header, image_descriptions, fragments)
+    for i, line in enumerate(lines):
+        if i:
+            line = "\n" + line
+        sink.write(line)
+        written += len(line)
+    return written
+
+
+def iter_conversation_trees(
+    filtered_trees: Dict[int, ConversationTree],
+    tweet_dict: Dict[int, EnrichedTweet],
+    render_header: Callable[[EnrichedTweet], str] = _render_header_default,
+    image_descriptions: Dict[int, list[MediaDescription]] = {},
+    fragments: Optional[RenderFragments] = None,
+) -> Iterator[str]:
+    """
+    Lines of render_conversation_trees' output, yielded as they are rendered.
+    
+    "\n".join of the lines is exactly render_conversation_trees' string; the
+    "===" separators between components are yielded as single lines "\n===\n".
+    Tweets are formatted through fragments (a RenderFragments of tweet_dict
+    and image_descriptions), or through a cache local to this call.
+    """
+    if fragments is None:
+        fragments = RenderFragments(tweet_dict, image_descriptions)
+    # Headers from cached default headers when render_header is built on them
+    if isinstance(render_header, StrandHeader):
+        header_of = render_header.annotate
+    elif render_header is _render_header_default:
+        header_of = lambda tweet, base: base
+    else:
+        header_of = lambda tweet, base: render_header(tweet)
     
     # Sort conversations to make output deterministic
     sorted_conv_ids = sorted(filtered_trees.keys())
@@ -398,111 +802,59 @@ def render_conversation_trees(
         
         # Render each component
         for root in display_roots:
-            output_lines.extend(_render_tree_node(root, nodes_to_show, tree, tweet_dict, render_header=render_header, image_descriptions=image_descriptions))
-            output_lines.append("\n===\n")
-    
-    return "\n".join(output_lines)
+            yield from _iter_tree_lines(root, nodes_to_show, tree, fragments, header_of)
+            yield "\n===\n"
+
 
-def _render_tree_node(
-    node_id: int,
+def _iter_tree_lines(
+    root_id: int,
     visible_nodes: Set[int],
     tree: ConversationTree,
-    tweets: Dict[int, EnrichedTweet],
-    prefix: str = "",
-    is_last_child: bool = True,
-    is_root_of_view: bool = True,
-    render_header: Callable[[EnrichedTweet], str] = _render_header_default,
-    image_descriptions: Dict[int, list[MediaDescription]] = {},
-    is_linear_continuation: bool = False
-) -> List[str]:
-    lines = []
-    tweet = tweets.get(node_id)
-    if not tweet:
-        return []
-
-    # Handle quoted text
-    quoted_text_block = []
-    q_id = tweet.get("quoted_tweet_id")
-    if q_id is not None:
-        q_tweet = tweets.get(q_id)
-        if q_tweet:
-            q_text = q_tweet.get("full_text", "").replace("\n", " ")
-            quoted_text_block.append(f"  [Quoting @{q_tweet.get('username')}: {q_text}]")
-        else:
-             quoted_text_block.append(f"  [Quoting Tweet {q_id} (missing)]")
-
-    # Format main text
-    full_text = tweet.get("full_text", "")
-    text_lines = full_text.split("\n")
-    
-    connector = ""
-    if not is_root_of_view and not is_linear_continuation:
-        connector = "└── " if is_last_child else "├── "
-    
-    header = f"{connector}{render_header(tweet)}"
-    lines.append(prefix + header)
-    
-    # Determine indentation for content and children
-    if is_root_of_view or is_linear_continuation:
-        child_prefix = prefix
-        content_prefix = prefix
-    else:
-        child_prefix = prefix + ("    " if is_last_child else "│   ")
-        content_prefix = child_prefix 
+    fragments: RenderFragments,
+    header_of: Callable[[EnrichedTweet, str], str],
+) -> Iterator[str]:
+    """
+    Lines of one displayed component, depth first, with an explicit stack.
     
-    for line in text_lines:
-        lines.append(f"{content_prefix}{line}")
+    Stack entries are (node_id, prefix, is_last_child, is_root_of_view,
+    is_linear_continuation); children are pushed in reverse so they pop in
+    id order. A node whose tweet is missing is skipped with its subtree.
+    """
+    stack = [(root_id, "", True, True, False)]
+    while stack:
+        node_id, prefix, is_last_child, is_root_of_view, is_linear_continuation = stack.pop()
+        entry = fragments.get(node_id)
+        if entry is None:
+            continue
+        tweet, base_header, body = entry
+        
+        connector = ""
+        if not is_root_of_view and not is_linear_continuation:
+            connector = "└── " if is_last_child else "├── "
+        
+        yield f"{prefix}{connector}{header_of(tweet, base_header)}"
         
-    for q_line in quoted_text_block:
-        lines.append(f"{content_prefix}{q_line}")
+        # Determine indentation for content and children
+        if is_root_of_view or is_linear_continuation:
+            child_prefix = prefix
+            content_prefix = prefix
+        else:
+            child_prefix = prefix + ("    " if is_last_child else "│   ")
+            content_prefix = child_prefix 
+        
+        for line in body:
+            yield f"{content_prefix}{line}"
 
-    # Render images
-    image_descriptions_list = image_descriptions.get(node_id, [])
-    if image_descriptions_list:
-        lines.append(f"{content_prefix}Images:")
-        for i, image_desc in enumerate(image_descriptions_list):
-            description = image_desc['description']
-            description_lines = description.split('\n')
-            for j, desc_line in enumerate(description_lines):
-                if j == 0:
-                    lines.append(f"{content_prefix}  - [Image #{i}] {desc_line}")
-                else:
-                    lines.append(f"{content_prefix}    {desc_line}")
-    # Process children
-    children = [c for c in tree["children"].get(node_id, []) if c in visible_nodes]
-    children.sort()
-    
-    if len(children) == 1:
-        lines.append(f"{content_prefix}↓")
-        lines.extend(_render_tree_node(
-            children[0], 
-            visible_nodes, 
-            tree, 
-            tweets, 
-            child_prefix, 
-            is_last_child=True, 
-            is_root_of_view=False,
-            render_header=render_header,
-            image_descriptions=image_descriptions,
-            is_linear_continuation=True
-        ))
-    else:
-        for i, child in enumerate(children):
-            is_last = (i == len(children) - 1)
-            lines.extend(_render_tree_node(
-                child, 
-                visible_nodes, 
-                tree, 
-                tweets, 
-                child_prefix, 
-                is_last, 
-                is_root_of_view=False,
-                render_header=render_header,
-                image_descriptions=image_descriptions,
-                is_linear_continuation=False
-            ))
+        # Process children: a single child continues the chain below an arrow
+        children = [c for c in tree["children"].get(node_id, []) if c in visible_nodes]
+        children.sort()
         
-    return lines
+        if len(children) == 1:
+            yield f"{content_prefix}↓"
+            stack.append((children[0], child_prefix, True, False, True))
+        else:
+            last = len(children) - 1
+            stack.extend((child, child_prefix, i == last, False, False) for i, child in reversed(list(enumerate(children))))
 
 
 def print_conversation_threads(
@@ -0,0 +1,535 @@
+# %%
+"""
+Conversation forest in compressed-sparse-row form.
+
+All reply trees live in one set of arrays instead of one pickled dict per tree:
+    tree_ids        (M,)   sorted tree keys (conversation_id, or root id for incomplete trees)
+    tree_start      (M+1,) node range of each tree
+    tree_root       (M,)   global node index of the root, -1 if the root tweet is missing
+    node_ids        (N,)   tweet ids, sorted within each tree's range
+    parent          (N,)   global index of the parent node, -1 for none
+    child_offsets   (N+1,) CSR offsets into children
+    children        (E,)   global indices of child nodes, sorted by tweet id
+    euler           (N,)   nodes in preorder (children in id order), within each tree's range
+    tin             (N,)   preorder position of each node
+    tout            (N,)   end of each node's subtree: its descendants are euler[tin + 1:tout]
+    depth           (N,)   reply hops from the node's top (the root, or a node whose parent is missing)
+
+With the Euler tour arrays a subtree is one contiguous range, so "descendants
+within d hops" is a range scan plus a depth mask (see ForestTree.windows).
+
+ConversationForest and ForestTree are read-only views that keep the
+ConversationTree shape ({'root', 'children', 'parents'}), so existing
+consumers such as filter_conversation_trees work unchanged.
+"""
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+from .array_store import (
+    INT_NULL, chain_tops, delta_dirs, isin_sorted, key_array, open_array_dir, sorted_unique, write_array_dir,
+)
+
+FOREST_VERSION = 2
+FOREST_ARRAYS = (
+    'tree_ids', 'tree_start', 'tree_root', 'node_ids', 'parent', 'child_offsets', 'children',
+    'euler', 'tin', 'tout', 'depth',
+)
+
+
+def _range_positions(lo: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """Concatenated aranges lo[i] .. lo[i] + counts[i] (CSR gather positions)."""
+    total = int(counts.sum())
+    return np.repeat(lo - np.cumsum(counts) + counts, counts) + np.arange(total)
+
+
+def euler_tour(parent: np.ndarray, child_offsets: np.ndarray, children: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Preorder entry/exit times and depths of an acyclic parent-pointer forest.
+
+    Tops are visited in node order and children in CSR order, so every tree's
+    tour stays inside its node range. Subtree sizes are summed one depth level
+    at a time from the deepest up, then entry times are set level by level from
+    the tops down; each pass is vectorized over a whole level.
+
+    Returns:
+        Dict with euler, tin, tout, depth (see module docstring)
+    """
+    n = len(parent)
+    _, depth = chain_tops(parent)
+    max_depth = int(depth.max()) if n else 0
+    by_depth = np.argsort(depth, kind='stable')
+    level_start = np.searchsorted(depth[by_depth], np.arange(max_depth + 2))
+    levels = [by_depth[level_start[d]:level_start[d + 1]] for d in range(max_depth + 1)]
+
+    size = np.ones(n, dtype=np.int64)
+    for level in reversed(levels[1:]):
+        np.add.at(size, parent[level], size[level])
+
+    # Sizes of earlier siblings (children) and earlier tops (which also spans earlier trees)
+    child_size = size[children]
+    before_child = np.cumsum(child_size) - child_size
+    before = np.zeros(n, dtype=np.int64)
+    before[children] = before_child - before_child[child_offsets[parent[children]]]
+
+    tin = np.zeros(n, dtype=np.int64)
+    tops = levels[0] if levels else np.zeros(0, dtype=np.int64)
+    tin[tops] = np.cumsum(size[tops]) - size[tops]
+    for level in levels[1:]:
+        tin[level] = tin[parent[level]] + 1 + before[level]
+
+    euler = np.empty(n, dtype=np.int64)
+    euler[tin] = np.arange(n)
+    return {'euler': euler, 'tin': tin, 'tout': tin + size, 'depth': depth}
+
+
+def build_forest_arrays(
+    tree_ids: np.ndarray,
+    roots: np.ndarray,
+    edge_tree: np.ndarray,
+    edge_child: np.ndarray,
+    edge_parent: np.ndarray,
+) -> Dict[str, np.ndarray]:
+    """
+    Build CSR forest arrays from flat edge lists.
+
+    Args:
+        tree_ids: Key of each tree (unique)
+        roots: Root tweet id of each tree, aligned with tree_ids (INT_NULL if unknown)
+        edge_tree: Tree key of each reply edge
+        edge_child: Replying tweet id of each edge
+        edge_parent: Replied-to tweet id of each edge
+
+    Returns:
+        Dict of forest arrays (see module docstring)
+    """
+    tree_ids = np.asarray(tree_ids, dtype=np.int64)
+    roots = np.asarray(roots, dtype=np.int64)
+    edge_tree = np.asarray(edge_tree, dtype=np.int64)
+    edge_child = np.asarray(edge_child, dtype=np.int64)
+    edge_parent = np.asarray(edge_parent, dtype=np.int64)
+
+    order = np.argsort(tree_ids, kind='stable')
+    tree_ids, roots = tree_ids[order], roots[order]
+    n_trees = len(tree_ids)
+
+    keep = edge_child != edge_parent
+    edge_tree, edge_child, edge_parent = edge_tree[keep], edge_child[keep], edge_parent[keep]
+    et = np.searchsorted(tree_ids, edge_tree)
+    root_trees = np.flatnonzero(roots != INT_NULL)
+
+    # Dense-rank node ids so (tree, node) pairs fit in one sortable int64 key
+    node_tree = np.concatenate([et, et, root_trees])
+    uniq_nodes, node_rank = np.unique(
+        np.concatenate([edge_child, edge_parent, roots[root_trees]]), return_inverse=True
+    )
+    width = max(len(uniq_nodes), 1)
+    pair_keys = node_tree * width + node_rank
+    keys = sorted_unique(pair_keys)
+    node_ids = uniq_nodes[keys % width]
+    tree_start = np.zeros(n_trees + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys // width, minlength=n_trees), out=tree_start[1:])
+
+    n_edges = len(edge_child)
+    gidx = np.searchsorted(keys, pair_keys)
+    child_g, parent_g, root_g = gidx[:n_edges], gidx[n_edges:2 * n_edges], gidx[2 * n_edges:]
+
+    parent = np.full(len(keys), -1, dtype=np.int64)
+    parent[child_g] = parent_g
+    if chain_tops(parent) is None:
+        from .conversation_explorer import break_parent_cycles
+
+        parent, dropped = break_parent_cycles(parent)
+        print(f"Broke {dropped} reply cycle(s)")
+    child_g = np.flatnonzero(parent >= 0)
+    parent_g = parent[child_g]
+    by_parent = np.argsort(parent_g, kind='stable')
+    child_offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(parent_g, minlength=len(keys)), out=child_offsets[1:])
+
+    tree_root = np.full(n_trees, -1, dtype=np.int64)
+    tree_root[root_trees] = root_g
+
+    children = child_g[by_parent]
+    return {
+        'tree_ids': tree_ids,
+        'tree_start': tree_start,
+        'tree_root': tree_root,
+        'node_ids': node_ids,
+        'parent': parent,
+        'child_offsets': child_offsets,
+        'children': children,
+        **euler_tour(parent, child_offsets, children),
+    }
+
+
+def forest_arrays_from_trees(trees: Dict[int, dict]) -> Dict[str, np.ndarray]:
+    """Convert a dict of ConversationTree dicts into CSR forest arrays."""
+    tree_ids = np.fromiter(trees.keys(), dtype=np.int64, count=len(trees))
+    roots = np.fromiter(
+        (INT_NULL if t.get('root') is None else t['root'] for t in trees.values()),
+        dtype=np.int64, count=len(trees)
+    )
+    edge_tree: List[int] = []
+    edge_child: List[int] = []
+    edge_parent: List[int] = []
+    for tree_id, tree in trees.items():
+        parents = tree['parents']
+        edge_tree.extend([tree_id] * len(parents))
+        edge_child.extend(parents.keys())
+        edge_parent.extend(parents.values())
+    return build_forest_arrays(tree_ids, roots, np.array(edge_tree, dtype=np.int64),
+                               np.array(edge_child, dtype=np.int64), np.array(edge_parent, dtype=np.int64))
+
+
+def write_conversation_forest(
+    arrays: Dict[str, np.ndarray],
+    out_dir: Union[str, Path],
+    extra: Optional[Dict[str, np.ndarray]] = None
+) -> None:
+    """
+    Persist forest arrays as a memory-mappable directory.
+
+    Also writes node_order (argsort of node_ids) so tweet_id -> tree lookups
+    are a binary search, plus any extra arrays (e.g. the orphan index).
+    """
+    out = {k: arrays[k] for k in FOREST_ARRAYS}
+    out['node_order'] = np.argsort(arrays['node_ids'], kind='stable')
+    out.update(extra or {})
+    write_array_dir(out_dir, out, {
+        'version': FOREST_VERSION,
+        'trees': int(len(arrays['tree_ids'])),
+        'nodes': int(len(arrays['node_ids'])),
+    })
+
+
+class _ForestSegment:
+    """One set of forest arrays (the base forest or one delta)."""
+
+    def __init__(self, arrays: Dict[str, np.ndarray], path: Optional[Path] = None):
+        self.path = path
+        self.arrays = arrays
+        self.tree_ids = arrays['tree_ids']
+        self.tree_start = arrays['tree_start']
+        self.tree_root = arrays['tree_root']
+        self.node_ids = arrays['node_ids']
+        self.parent = arrays['parent']
+        self.child_offsets = arrays['child_offsets']
+        self.children = arrays['children']
+        self.euler = arrays['euler']
+        self.tin = arrays['tin']
+        self.tout = arrays['tout']
+        self.depth = arrays['depth']
+
+    def tree_index(self, tid: int) -> int:
+        i = int(np.searchsorted(self.tree_ids, tid))
+        if i < len(self.tree_ids) and self.tree_ids[i] == tid:
+            return i
+        return -1
+
+    def is_tombstone(self, t: int) -> bool:
+        # Deltas mark trees absorbed into another tree with an empty node range
+        return self.tree_start[t] == self.tree_start[t + 1]
+
+    def node_order(self) -> np.ndarray:
+        order = self.arrays.get('node_order')
+        if order is None:
+            order = self.arrays['node_order'] = np.argsort(self.node_ids, kind='stable')
+        return order
+
+
+class _TreeParents(Mapping):
+    """tweet_id -> parent tweet_id within one ForestTree."""
+    __slots__ = ('_tree',)
+
+    def __init__(self, tree: 'ForestTree'):
+        self._tree = tree
+
+    def __getitem__(self, node_id) -> int:
+        seg, g = self._tree._seg, self._tree._find(node_id)
+        if g < 0 or seg.parent[g] < 0:
+            raise KeyError(node_id)
+        return int(seg.node_ids[seg.parent[g]])
+
+    def _with_parent(self) -> np.ndarray:
+        t = self._tree
+        return np.flatnonzero(t._seg.parent[t._lo:t._hi] >= 0) + t._lo
+
+    def __iter__(self) -> Iterator[int]:
+        ids = self._tree._seg.node_ids
+        return (int(ids[g]) for g in self._with_parent())
+
+    def __len__(self) -> int:
+        return len(self._with_parent())
+
+
+class _TreeChildren(Mapping):
+    """tweet_id -> list of child tweet_ids within one ForestTree."""
+    __slots__ = ('_tree',)
+
+    def __init__(self, tree: 'ForestTree'):
+        self._tree = tree
+
+    def __getitem__(self, node_id) -> List[int]:
+        seg, g = self._tree._seg, self._tree._find(node_id)
+        if g < 0:
+            raise KeyError(node_id)
+        lo, hi = seg.child_offsets[g], seg.child_offsets[g + 1]
+        if lo == hi:
+            raise KeyError(node_id)
+        return seg.node_ids[seg.children[lo:hi]].tolist()
+
+    def _with_children(self) -> np.ndarray:
+        t = self._tree
+        offsets = t._seg.child_offsets
+        return np.flatnonzero(offsets[t._lo + 1:t._hi + 1] > offsets[t._lo:t._hi]) + t._lo
+
+    def __iter__(self) -> Iterator[int]:
+        ids = self._tree._seg.node_ids
+        return (int(ids[g]) for g in self._with_children())
+
+    def __len__(self) -> int:
+        return len(self._with_children())
+
+
+class ForestTree(Mapping):
+    """ConversationTree-shaped view of one tree in a ConversationForest."""
+    __slots__ = ('_seg', '_t', '_lo', '_hi')
+    _KEYS = ('root', 'children', 'parents')
+
+    def __init__(self, seg: _ForestSegment, t: int):
+        self._seg = seg
+        self._t = t
+        self._lo = int(seg.tree_start[t])
+        self._hi = int(seg.tree_start[t + 1])
+
+    def _find(self, node_id) -> int:
+        """Index of node_id in this tree's segment, or -1."""
+        try:
+            nid = int(node_id)
+        except (TypeError, ValueError):
+            return -1
+        ids = self._seg.node_ids
+        i = self._lo + int(np.searchsorted(ids[self._lo:self._hi], nid))
+        if i < self._hi and ids[i] == nid:
+            return i
+        return -1
+
+    def find_many(self, node_ids: np.ndarray) -> np.ndarray:
+        """Index of each node id in this tree's segment, -1 where it isn't in the tree."""
+        node_ids = np.asarray(node_ids, dtype=np.int64)
+        if self._hi == self._lo:
+            return np.full(len(node_ids), -1, dtype=np.int64)
+        ids = self._seg.node_ids[self._lo:self._hi]
+        pos = np.minimum(np.searchsorted(ids, node_ids), len(ids) - 1)
+        return np.where(ids[pos] == node_ids, pos + self._lo, -1)
+
+    def windows(self, node_ids: np.ndarray, down: np.ndarray, up: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Nodes within reach of each of node_ids, in one vectorized pass for all of them.
+
+        Each node brings itself, its ancestors up to `up` hops (all chains
+        stepped at once) and its descendants up to down[i] hops (a scan of its
+        Euler tour range with a depth mask). Ids not in the tree are skipped.
+
+        Returns:
+            (query positions, segment indices of nodes), grouped by query position
+        """
+        seg = self._seg
+        g = self.find_many(node_ids)
+        q = np.flatnonzero(g >= 0)
+        g, down = g[q], np.asarray(down, dtype=np.int64)[q]
+        out_q, out_g = [q], [g]
+        aq, ag = q, g
+        for _ in range(up):
+            ag = seg.parent[ag]
+            has = ag >= 0
+            aq, ag = aq[has], ag[has]
+            if not len(ag):
+                break
+            out_q.append(aq)
+            out_g.append(ag)
+        lo = seg.tin[g] + 1
+        counts = seg.tout[g] - lo
+        below = seg.euler[_range_positions(lo, counts)]
+        keep = seg.depth[below] <= np.repeat(seg.depth[g] + down, counts)
+        out_q.append(np.repeat(q, counts)[keep])
+        out_g.append(below[keep])
+        q, g = np.concatenate(out_q), np.concatenate(out_g)
+        order = np.argsort(q, kind='stable')
+        return q[order], g[order]
+
+    def edges_among(self, nodes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(child ids, parent ids) of the reply edges between sorted segment indices (e.g. from windows())."""
+        seg = self._seg
+        parent = seg.parent[nodes]
+        linked = parent >= 0
+        linked[linked] = isin_sorted(parent[linked], nodes)
+        return seg.node_ids[nodes[linked]], seg.node_ids[parent[linked]]
+
+    @property
+    def root(self) -> Optional[int]:
+        g = self._seg.tree_root[self._t]
+        return None if g < 0 else int(self._seg.node_ids[g])
+
+    def node_ids(self) -> np.ndarray:
+        """All tweet ids in this tree (including referenced-but-missing parents)."""
+        return self._seg.node_ids[self._lo:self._hi]
+
+    def edges(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(child ids, parent ids) of every reply edge in this tree."""
+        seg = self._seg
+        g = np.flatnonzero(seg.parent[self._lo:self._hi] >= 0) + self._lo
+        return seg.node_ids[g], seg.node_ids[seg.parent[g]]
+
+    def __getitem__(self, key: str):
+        if key == 'root':
+            return self.root
+        if key == 'children':
+            return _TreeChildren(self)
+        if key == 'parents':
+            return _TreeParents(self)
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._KEYS)
+
+    def __len__(self) -> int:
+        return len(self._KEYS)
+
+    def __repr__(self) -> str:
+        return f"ForestTree(root={self.root}, nodes={self._hi - self._lo})"
+
+
+class ConversationForest(Mapping):
+    """
+    Mapping tree_id -> ForestTree over CSR forest arrays (memory-mapped when opened from disk).
+
+    A forest directory holds the base arrays plus optional delta-NNNN/ segments
+    written by incremental updates. Later segments shadow earlier ones tree by
+    tree; an empty tree in a delta is a tombstone.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        arrays, self.meta = open_array_dir(self.path)
+        self._segments = [_ForestSegment(arrays, self.path)]
+        for p in delta_dirs(self.path):
+            self._segments.append(_ForestSegment(open_array_dir(p)[0], p))
+        self._live: Optional[np.ndarray] = None
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> 'ConversationForest':
+        """Wrap in-memory forest arrays (e.g. straight from build_forest_arrays)."""
+        forest = cls.__new__(cls)
+        forest.path = None
+        forest.meta = {'version': FOREST_VERSION}
+        forest._segments = [_ForestSegment(dict(arrays))]
+        forest._live = None
+        return forest
+
+    def __reduce__(self):
+        if self.path is not None:
+            return (self.__class__, (str(self.path),))
+        arrays = {k: np.asarray(v) for k, v in self._segments[0].arrays.items()}
+        return (self.__class__.from_arrays, (arrays,))
+
+    def _lookup(self, tree_id) -> Tuple[Optional[_ForestSegment], int]:
+        try:
+            tid = int(tree_id)
+        except (TypeError, ValueError):
+            return None, -1
+        for seg in reversed(self._segments):
+            t = seg.tree_index(tid)
+            if t >= 0:
+                return (None, -1) if seg.is_tombstone(t) else (seg, t)
+        return None, -1
+
+    def __getitem__(self, tree_id) -> ForestTree:
+        seg, t = self._lookup(tree_id)
+        if seg is None:
+            raise KeyError(tree_id)
+        return ForestTree(seg, t)
+
+    def __contains__(self, tree_id) -> bool:
+        return self._lookup(tree_id)[0] is not None
+
+    def get_many(self, tree_ids: Iterable, default=None) -> List[Optional[ForestTree]]:
+        """Trees for tree_ids in order (default where missing), newest segment first."""
+        keys = list(tree_ids)
+        ids, remaining = key_array(keys)
+        out = [default] * len(keys)
+        for seg in reversed(self._segments):
+            hit = remaining & isin_sorted(ids, seg.tree_ids)
+            if not hit.any():
+                continue
+            remaining &= ~hit
+            idx = np.flatnonzero(hit)
+            for i, t in zip(idx.tolist(), np.searchsorted(seg.tree_ids, ids[idx]).tolist()):
+                if not seg.is_tombstone(t):
+                    out[i] = ForestTree(seg, t)
+        return out
+
+    def _live_tree_ids(self) -> np.ndarray:
+        if len(self._segments) == 1:
+            return self._segments[0].tree_ids
+        if self._live is None:
+            shadowed = np.zeros(0, dtype=np.int64)
+            live = []
+            for seg in reversed(self._segments):
+                keep = ~isin_sorted(seg.tree_ids, shadowed)
+                nonempty = seg.tree_start[1:] > seg.tree_start[:-1]
+                live.append(seg.tree_ids[keep & nonempty])
+                shadowed = np.union1d(shadowed, seg.tree_ids)
+            self._live = np.sort(np.concatenate(live))
+        return self._live
+
+    def __iter__(self) -> Iterator[int]:
+        return (int(t) for t in self._live_tree_ids())
+
+    def __len__(self) -> int:
+        return len(self._live_tree_ids())
+
+    def __repr__(self) -> str:
+        nodes = sum(len(s.node_ids) for s in self._segments)
+        return f"ConversationForest({len(self)} trees, {nodes} nodes, {len(self._segments) - 1} deltas)"
+
+    def trees_containing(self, node_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the live trees each node appears in.
+
+        Returns:
+            (query positions, tree ids) pairs; a node can appear in several trees
+            (e.g. as a referenced-but-missing parent).
+        """
+        node_ids = np.asarray(node_ids, dtype=np.int64)
+        out_q, out_t = [], []
+        for k, seg in enumerate(self._segments):
+            order = seg.node_order()
+            sorted_ids = seg.node_ids[order]
+            lo = np.searchsorted(sorted_ids, node_ids, side='left')
+            counts = np.searchsorted(sorted_ids, node_ids, side='right') - lo
+            total = int(counts.sum())
+            q = np.repeat(np.arange(len(node_ids)), counts)
+            pos = np.repeat(lo - np.cumsum(counts) + counts, counts) + np.arange(total)
+            t = seg.tree_ids[np.searchsorted(seg.tree_start, order[pos], side='right') - 1]
+            # Drop trees that a later segment rewrote or tombstoned
+            owned = np.ones(total, dtype=bool)
+            for later in self._segments[k + 1:]:
+                owned &= ~isin_sorted(t, later.tree_ids)
+            out_q.append(q[owned])
+            out_t.append(t[owned])
+        return np.concatenate(out_q), np.concatenate(out_t)
+
+
+def materialize_tree(tree: Mapping) -> dict:
+    """Copy a ConversationTree-shaped mapping (e.g. a ForestTree) into plain dicts."""
+    return {
+        'root': tree['root'],
+        'children': {k: list(v) for k, v in tree['children'].items()},
+        'parents': dict(tree['parents'].items()),
+    }
+
+# %%
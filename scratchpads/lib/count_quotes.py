@@ -1,11 +1,136 @@
 # %%
-def count_quotes(tweets_df):
+"""
+Quote counts from the three id columns, without merging the tweets table with itself.
+
+The quoted tweet's author is found by binary search in the tweet ids sorted
+once, so only tweet_id, account_id and quoted_tweet_id are ever touched, and
+count_quotes_parquet streams just those columns from the parquet in record batches.
+"""
+from pathlib import Path
+from typing import Tuple, Union
+
+import numpy as np
+
+from .array_store import INT_NULL, id_columns, int_column
+from .tweet_store import dedupe_rows
+
+QUOTE_COLUMNS = ('tweet_id', 'account_id', 'quoted_tweet_id')
+
+
+def non_self_quotes(quoter_acc: np.ndarray, target_acc: np.ndarray) -> np.ndarray:
+    """Mask of quotes that count: both authors known and different."""
+    return (quoter_acc != INT_NULL) & (target_acc != INT_NULL) & (quoter_acc != target_acc)
+
+
+def compute_quoted_counts(ids: np.ndarray, account: np.ndarray, quoted: np.ndarray) -> np.ndarray:
+    """
+    quoted_count per tweet from aligned id columns sorted by tweet_id (unique ids).
+
+    Self-quotes and quotes of unknown tweets are not counted.
+    """
+    has_q = quoted != INT_NULL
+    targets = quoted[has_q]
+    if not len(ids):
+        return np.zeros(0, dtype=np.int64)
+    pos = np.minimum(np.searchsorted(ids, targets), len(ids) - 1)
+    known = ids[pos] == targets
+    target_acc = np.where(known, account[pos], INT_NULL)
+    counted = known & non_self_quotes(account[has_q], target_acc)
+    return np.bincount(pos[counted], minlength=len(ids)).astype(np.int64)
+
+
+def _counts_by_id(ids: np.ndarray, account: np.ndarray, quoted: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(unique sorted tweet ids, quoted_count of each); the last copy of a duplicated tweet wins."""
+    rows = dedupe_rows(ids)
+    return ids[rows], compute_quoted_counts(ids[rows], account[rows], quoted[rows])
+
+
+def _as_frame(ids: np.ndarray, counts: np.ndarray):
+    import pandas as pd
+
+    quoted = counts > 0
+    ids, counts = ids[quoted], counts[quoted]
+    order = np.argsort(-counts, kind='stable')
+    return pd.DataFrame({'quoted_tweet_id': ids[order], 'quoted_count': counts[order]})
+
+
+def count_quotes(tweets):
     """
     Count how many times each tweet is quoted by others (excluding self-quotes).
-    
+
+    Args:
+        tweets: DataFrame (tweet_id as column or index) or pyarrow Table with
+            'quoted_tweet_id', 'tweet_id', 'account_id'
+
+    Returns:
+        DataFrame with columns 'quoted_tweet_id' and 'quoted_count', sorted by count descending
+    """
+    return _as_frame(*_counts_by_id(*id_columns(tweets, QUOTE_COLUMNS)))
+
+
+def count_quotes_parquet(parquet_path: Union[str, Path], batch_size: int = 1_000_000):
+    """count_quotes over a parquet file, streaming only the three id columns."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    pf = pq.ParquetFile(parquet_path)
+    columns = [c for c in QUOTE_COLUMNS if c in pf.schema_arrow.names]
+    parts = {c: [] for c in QUOTE_COLUMNS}
+    for batch in pf.iter_batches(batch_size=batch_size, columns=columns):
+        batch = pa.Table.from_batches([batch])
+        for c in QUOTE_COLUMNS:
+            parts[c].append(int_column(batch, c))
+    cols = [np.concatenate(parts[c]) if parts[c] else np.zeros(0, dtype=np.int64) for c in QUOTE_COLUMNS]
+    ids, account, quoted = cols
+    valid = ids != INT_NULL
+    return _as_frame(*_counts_by_id(ids[valid], account[valid], quoted[valid]))
+
+
+def add_quoted_counts(tweets, quoted_counts=None):
+    """
+    Set a quoted_count column on tweets by sorted-array lookup instead of a merge.
+
+    Args:
+        tweets: DataFrame (modified in place) or pyarrow Table (a new Table sharing
+            the other columns is returned)
+        quoted_counts: count_quotes() output, e.g. read back from a cache; computed
+            from tweets if None
+
+    Returns:
+        tweets with quoted_count (0 for tweets nobody quoted)
+    """
+    import pyarrow as pa
+
+    ids, account, quoted = id_columns(tweets, QUOTE_COLUMNS)
+    if quoted_counts is None:
+        keys, counts = _counts_by_id(ids, account, quoted)
+    else:
+        keys = quoted_counts['quoted_tweet_id'].to_numpy(dtype=np.int64)
+        counts = quoted_counts['quoted_count'].to_numpy(dtype=np.int64)
+        order = np.argsort(keys, kind='stable')
+        keys, counts = keys[order], counts[order]
+
+    values = np.zeros(len(ids), dtype=np.int64)
+    if len(keys):
+        pos = np.minimum(np.searchsorted(keys, ids), len(keys) - 1)
+        hit = keys[pos] == ids
+        values[hit] = counts[pos[hit]]
+
+    if isinstance(tweets, pa.Table):
+        if 'quoted_count' in tweets.column_names:
+            tweets = tweets.drop(['quoted_count'])
+        return tweets.append_column('quoted_count', pa.array(values))
+    tweets['quoted_count'] = values
+    return tweets
+
+
+def count_quotes_merge(tweets_df):
+    """
+    The original pandas implementation (full-table self-merge), kept as the benchmark reference.
+
     Args:
         tweets_df: DataFrame with columns 'quoted_tweet_id', 'tweet_id', 'account_id'
-    
+
     Returns:
         DataFrame with columns 'quoted_tweet_id' and 'quoted_count', sorted by count descending
     """
@@ -14,22 +139,24 @@ def count_quotes(tweets_df):
     quoted_tweet_authors = tweets_df[['tweet_id', 'account_id']].rename(
         columns={'tweet_id': 'quoted_tweet_id', 'account_id': 'quoted_author_id'}
     )
-    
+
     # Merge to get both the quoting user and the quoted tweet's author
     tweets_with_authors = tweets_df.merge(
-        quoted_tweet_authors, 
-        on='quoted_tweet_id', 
+        quoted_tweet_authors,
+        on='quoted_tweet_id',
         how='left'
     )
-    
+
     # Filter to only quotes where account_id != quoted_author_id (exclude self-quotes)
     non_self_quotes = tweets_with_authors[
         tweets_with_authors['account_id'] != tweets_with_authors['quoted_author_id']
     ]
-    
+
     # Count number of times tweets are quoted (by others)
     quoted_counts = non_self_quotes.groupby('quoted_tweet_id').size().reset_index(
         name='quoted_count'
     ).sort_values(by='quoted_count', ascending=False)
-    
+
     return quoted_counts
+
+# %%
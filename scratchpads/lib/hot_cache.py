@@ -0,0 +1,170 @@
+# %%
+"""
+In-process LRU in front of the on-disk caches.
+
+Strands overlap heavily (popular roots, quoted tweets and semantic neighbours
+recur across seeds), so decoded tweets and trees are kept in memory up to a
+byte budget instead of being re-read and re-unpickled on every access.
+"""
+import sys
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from datetime import datetime
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, List, Optional
+
+from .bulk_get import get_many
+
+_MISSING = object()
+
+
+def estimate_size(obj: Any) -> int:
+    """Approximate deep size in bytes of decoded cache values (dicts, lists, strs, numbers)."""
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(estimate_size(k) + estimate_size(v) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(estimate_size(v) for v in obj)
+    elif not isinstance(obj, (str, bytes, int, float, bool, datetime, type(None))) and hasattr(obj, '__dict__'):
+        size += estimate_size(vars(obj))
+    return size
+
+
+class HotCache(Mapping):
+    """
+    Thread-safe, byte-bounded LRU around a read-only mapping.
+
+    Values are passed through `materialize` (e.g. dict(row) for TweetStore rows)
+    before caching, so repeated reads skip decoding. Values that load parts
+    lazily (TweetRecord.track_size) are re-measured when they do, so the
+    budget covers what they load later. Counters: hits, misses, evictions
+    (see stats()).
+    """
+
+    def __init__(
+        self,
+        backing: Mapping,
+        max_bytes: int,
+        materialize: Optional[Callable[[Any], Any]] = None,
+        sizeof: Callable[[Any], int] = estimate_size,
+    ):
+        self.backing = backing
+        self.max_bytes = max_bytes
+        self.materialize = materialize
+        self.sizeof = sizeof
+        self._items: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __reduce__(self):
+        # Other processes get an empty cache over the same backing store
+        return (self.__class__, (self.backing, self.max_bytes, self.materialize, self.sizeof))
+
+    def _cached(self, key: Hashable) -> Any:
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None:
+                self.misses += 1
+                return _MISSING
+            self._items.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def _insert(self, key: Hashable, value: Any) -> Any:
+        if self.materialize is not None:
+            value = self.materialize(value)
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            return value
+        # Not shared with other threads until inserted, so nothing loads in between
+        track_size = getattr(value, 'track_size', None)
+        if track_size is not None:
+            track_size(lambda: self._resize(key, value))
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            self._items[key] = (value, size)
+            self.bytes += size
+            self._evict()
+        return value
+
+    def _resize(self, key: Hashable, value: Any) -> None:
+        """Re-measure value after it loaded more, if it is still the entry for key."""
+        size = self.sizeof(value)
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None or entry[0] is not value:
+                return
+            self._items[key] = (value, size)
+            self.bytes += size - entry[1]
+            self._evict()
+
+    def _evict(self) -> None:
+        while self.bytes > self.max_bytes:
+            _, (_, evicted) = self._items.popitem(last=False)
+            self.bytes -= evicted
+            self.evictions += 1
+
+    def __getitem__(self, key: Hashable) -> Any:
+        value = self._cached(key)
+        if value is _MISSING:
+            value = self._insert(key, self.backing[key])
+        return value
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def get_many(self, keys: Iterable[Hashable], default: Any = None) -> List[Any]:
+        """Cached values where present; the rest fetched from the backing store in one batch."""
+        keys = list(keys)
+        out = [self._cached(k) for k in keys]
+        missing = [i for i, v in enumerate(out) if v is _MISSING]
+        if missing:
+            fetched = get_many(self.backing, [keys[i] for i in missing], _MISSING)
+            for i, value in zip(missing, fetched):
+                out[i] = default if value is _MISSING else self._insert(keys[i], value)
+        return out
+
+    def __contains__(self, key: object) -> bool:
+        with self._lock:
+            if key in self._items:
+                return True
+        return key in self.backing
+
+    def __iter__(self) -> Iterator:
+        return iter(self.backing)
+
+    def __len__(self) -> int:
+        return len(self.backing)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self.bytes = 0
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'items': len(self._items),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+    def __repr__(self) -> str:
+        s = self.stats()
+        return (f"HotCache({s['items']} items, {s['bytes'] / 1024**2:.1f}/{s['max_bytes'] / 1024**2:.0f} MB, "
+                f"hit rate {s['hit_rate']:.1%}, {s['evictions']} evictions)")
+
+# %%
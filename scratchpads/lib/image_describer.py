@@ -1,16 +1,20 @@
 # %%
+import asyncio
 import os
 import re
 import csv
 from pathlib import Path
-from typing import TypedDict, Dict, List
+from typing import TYPE_CHECKING, TypedDict, Dict, List
 import httpx
-from groq import Groq
+from groq import AsyncGroq, Groq
 from dotenv import load_dotenv
 
-from .retry import with_retry, is_transient_error
+from .retry import with_retry, with_retry_async, is_transient_error
 from .parallel import parallel_map_to_dict
 
+if TYPE_CHECKING:
+    from .async_http import AsyncHTTP
+
 load_dotenv(Path(__file__).parent.parent.parent / ".env")
 
 class MediaDescription(TypedDict):
@@ -86,19 +90,25 @@ def save_to_cache(entries: list[MediaDescription], cache_path: Path = DEFAULT_CA
             writer.writeheader()
         writer.writerows(entries)
 
+DESCRIBE_MODEL = "meta-llama/llama-4-maverick-17b-128e-instruct"
+
+
+def _describe_messages(image_url: str, tweet_text: str) -> list[dict]:
+    return [{
+        "role": "user",
+        "content": [
+            {"type": "text", "text": f"Describe this image briefly. For images with text, exhaustively transcribe the text. For diagrams and memes, describe them as if you want someone else to reproduce them. For visual pictures stick to 1-2 sentences. Tweet context: \"{tweet_text}\""},
+            {"type": "image_url", "image_url": {"url": image_url}},
+        ],
+    }]
+
 @with_retry(max_retries=3, base_delay=2.0)
 def describe_image(image_url: str, tweet_text: str) -> str:
     """Describe an image using Groq vision model. Retries on transient errors."""
     client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
     completion = client.chat.completions.create(
-        model="meta-llama/llama-4-maverick-17b-128e-instruct",
-        messages=[{
-            "role": "user",
-            "content": [
-                {"type": "text", "text": f"Describe this image briefly. For images with text, exhaustively transcribe the text. For diagrams and memes, describe them as if you want someone else to reproduce them. For visual pictures stick to 1-2 sentences. Tweet context: \"{tweet_text}\""},
-                {"type": "image_url", "image_url": {"url": image_url}},
-            ],
-        }],
+        model=DESCRIBE_MODEL,
+        messages=_describe_messages(image_url, tweet_text),
         temperature=0.7,
         max_completion_tokens=512,
     )
@@ -196,4 +206,86 @@ def get_image_descriptions_batch(
     return {tid: descs for tid, descs in results.items() if descs}
 
 
+# --- Async path: one shared AsyncHTTP pool for Supabase and Groq ---
+
+async def fetch_tweet_async(http: 'AsyncHTTP', tweet_id: str) -> dict | None:
+    url = f"{SUPABASE_URL}/rest/v1/tweets?tweet_id=eq.{tweet_id}&select=tweet_id,full_text"
+    resp = await http.get(url, headers=_headers())
+    resp.raise_for_status()
+    rows = resp.json()
+    return rows[0] if rows else None
+
+async def fetch_tweet_media_async(http: 'AsyncHTTP', tweet_id: str) -> list[dict]:
+    url = f"{SUPABASE_URL}/rest/v1/tweet_media?tweet_id=eq.{tweet_id}&media_type=eq.photo&select=media_url"
+    resp = await http.get(url, headers=_headers())
+    resp.raise_for_status()
+    return resp.json()
+
+@with_retry_async(max_retries=3, base_delay=2.0)
+async def describe_image_async(http: 'AsyncHTTP', groq: AsyncGroq, image_url: str, tweet_text: str) -> str:
+    """describe_image through an AsyncGroq client built on http.client, within Groq's host limit."""
+    async with http.limit("api.groq.com"):
+        completion = await groq.chat.completions.create(
+            model=DESCRIBE_MODEL,
+            messages=_describe_messages(image_url, tweet_text),
+            temperature=0.7,
+            max_completion_tokens=512,
+        )
+    return completion.choices[0].message.content or ""
+
+async def get_image_descriptions_async(http: 'AsyncHTTP', groq: AsyncGroq, tweet_id: int) -> list[MediaDescription]:
+    """get_image_descriptions on the shared pool; the images of a tweet are described concurrently."""
+    tweet_id_str = str(tweet_id)
+    tweet = await fetch_tweet_async(http, tweet_id_str)
+    if not tweet:
+        return []
+    media_rows = await fetch_tweet_media_async(http, tweet_id_str)
+    if not media_rows:
+        return []
+    async with asyncio.TaskGroup() as tg:
+        tasks = [tg.create_task(describe_image_async(http, groq, m["media_url"], tweet["full_text"])) for m in media_rows]
+    return [
+        {
+            "tweet_id": tweet_id_str,
+            "tweet_text": tweet["full_text"],
+            "media_url": m["media_url"],
+            "description": task.result(),
+        }
+        for m, task in zip(media_rows, tasks)
+    ]
+
+def async_groq(http: 'AsyncHTTP') -> AsyncGroq:
+    """AsyncGroq client sharing http's connection pool."""
+    return AsyncGroq(api_key=os.environ.get("GROQ_API_KEY"), http_client=http.client)
+
+async def get_image_descriptions_batch_async(
+    http: 'AsyncHTTP',
+    tweet_ids: List[int],
+    existing_cache: Dict[int, List[MediaDescription]],
+) -> Dict[int, List[MediaDescription]]:
+    """
+    get_image_descriptions_batch as tasks on one event loop instead of a thread pool.
+
+    Concurrency comes from http's per-host limits. A failed tweet gets the
+    same "[PIC NOT AVAILABLE]" placeholder; cancelling the caller cancels
+    every fetch (TaskGroup).
+    """
+    missing_ids = [tid for tid in tweet_ids if tid not in existing_cache]
+    if not missing_ids:
+        return {}
+    groq = async_groq(http)
+
+    async def fetch_one(tid: int) -> List[MediaDescription]:
+        try:
+            return await get_image_descriptions_async(http, groq, tid)
+        except Exception as e:
+            print(f"[ERROR] Image descriptions for {tid}: {e}")
+            return [{"description": "[PIC NOT AVAILABLE]", "tweet_id": str(tid), "tweet_text": "", "media_url": ""}]
+
+    async with asyncio.TaskGroup() as tg:
+        tasks = {tid: tg.create_task(fetch_one(tid)) for tid in missing_ids}
+    # Filter out empty results (tweets with no images)
+    return {tid: task.result() for tid, task in tasks.items() if task.result()}
+
+
 # %%
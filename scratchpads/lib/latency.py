@@ -0,0 +1,101 @@
+# %%
+"""
+Latency histograms for remote calls.
+
+Each call's duration lands in a log-spaced bucket (20 per decade, 1 ms to
+100 s, so percentiles are within ~12%), which keeps recording O(1) and
+memory fixed however many calls a strand batch makes. Failed calls are
+counted separately from the latencies of successful ones.
+"""
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List
+
+BUCKETS_PER_DECADE = 20
+MIN_LATENCY = 0.001
+MAX_LATENCY = 100.0
+# Upper edges of the buckets, in seconds; the last bucket takes everything above
+BUCKET_EDGES: List[float] = [
+    MIN_LATENCY * 10 ** (i / BUCKETS_PER_DECADE)
+    for i in range(int(math.log10(MAX_LATENCY / MIN_LATENCY) * BUCKETS_PER_DECADE) + 1)
+]
+
+
+class LatencyHistogram:
+    """Thread-safe histogram of call latencies with error and retry counts."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counts = [0] * (len(BUCKET_EDGES) + 1)
+            self.calls = 0
+            self.errors = 0
+            self.retries = 0
+            self.total = 0.0
+            self.max = 0.0
+
+    def record(self, seconds: float, ok: bool = True) -> None:
+        """Add one call; failed calls only count as errors."""
+        with self._lock:
+            if not ok:
+                self.errors += 1
+                return
+            self.counts[bisect.bisect_left(BUCKET_EDGES, seconds)] += 1
+            self.calls += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+
+    def count_retry(self) -> None:
+        with self._lock:
+            self.retries += 1
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        """Record the duration of the block, as an error if it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.record(time.perf_counter() - start, ok=False)
+            raise
+        self.record(time.perf_counter() - start)
+
+    def percentile(self, p: float) -> float:
+        """Upper edge of the bucket holding the p-th percentile (0-100) of successful calls, in seconds."""
+        with self._lock:
+            if not self.calls:
+                return 0.0
+            rank = math.ceil(p / 100 * self.calls) or 1
+            seen = 0
+            for i, count in enumerate(self.counts):
+                seen += count
+                if seen >= rank:
+                    return min(BUCKET_EDGES[i], self.max) if i < len(BUCKET_EDGES) else self.max
+            return self.max
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'retries': self.retries,
+            'mean': self.total / self.calls if self.calls else 0.0,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'max': self.max,
+        }
+
+    def __repr__(self) -> str:
+        s = self.stats()
+        return (f"{self.name}: {s['calls']} calls, {s['errors']} errors, {s['retries']} retries, "
+                f"p50 {s['p50'] * 1000:.0f} ms, p90 {s['p90'] * 1000:.0f} ms, "
+                f"p99 {s['p99'] * 1000:.0f} ms, max {s['max'] * 1000:.0f} ms")
+
+# %%
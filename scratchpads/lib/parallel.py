@@ -1,6 +1,10 @@
 """Parallel execution utilities for phase-level parallelism."""
-from typing import TypeVar, Callable, Dict, List, Optional, Tuple
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import threading
+import time
+from dataclasses import dataclass, field
+from queue import Empty, Queue
+from typing import Any, TypeVar, Callable, Dict, List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 
 K = TypeVar('K')
@@ -67,3 +71,197 @@ def batch_keys(keys: List[K], batch_size: int) -> List[List[K]]:
     """Split keys into batches of batch_size."""
     return [keys[i:i + batch_size] for i in range(0, len(keys), batch_size)]
 
+
+# Per-process context of process_map_ordered workers, set once by the pool initializer
+_worker_context: Any = None
+
+
+def _init_worker(context: Any) -> None:
+    global _worker_context
+    _worker_context = context
+
+
+def _call_with_context(args: Tuple[Callable[[K, Any], V], K]) -> V:
+    fn, item = args
+    return fn(item, _worker_context)
+
+
+def process_map_ordered(
+    items: List[K],
+    fn: Callable[[K, Any], V],
+    context: Any,
+    max_workers: int = 4,
+    desc: str = "Processing"
+) -> List[V]:
+    """
+    Map fn(item, context) over items in a process pool, results in input order.
+    
+    context is sent once to each worker instead of with every item; the
+    mmap-backed stores pickle by path (see TweetStore.__reduce__), so workers
+    reopen them and share pages through the OS page cache. fn must be a
+    module-level function. The first exception is raised in the caller.
+    """
+    if not items:
+        return []
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(context,)) as ex:
+        return list(tqdm(ex.map(_call_with_context, [(fn, item) for item in items]), total=len(items), desc=desc))
+
+
+# --- Pipelines: items flow through stages as soon as their input is ready ---
+
+_DONE = object()
+
+
+@dataclass
+class PipelineStage:
+    """
+    One stage of run_pipeline, run by `workers` threads reading a queue of at most queue_size items.
+    
+    fn(key, value) returns the value passed to the next stage. With
+    batch_size > 1, fn takes a list of (key, value) pairs instead (whatever is
+    queued, up to batch_size, without waiting for more) and returns
+    {key: value}; keys missing from the result count as failed.
+    """
+    name: str
+    fn: Callable
+    workers: int = 1
+    queue_size: int = 16
+    batch_size: int = 1
+
+
+@dataclass
+class PipelineMetrics:
+    """Timings of a run_pipeline call (seconds from its start)."""
+    items: int
+    completed: int = 0
+    failed: Dict[str, int] = field(default_factory=dict)
+    first_output: Optional[float] = None
+    elapsed: float = 0.0
+    busy: Dict[str, float] = field(default_factory=dict)
+    max_queued: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def throughput(self) -> float:
+        """Completed items per second."""
+        return self.completed / self.elapsed if self.elapsed else 0.0
+
+    def __repr__(self) -> str:
+        first = f"{self.first_output:.2f}s" if self.first_output is not None else "n/a"
+        stages = ", ".join(
+            f"{name} busy {busy:.1f}s max queued {self.max_queued.get(name, 0)}"
+            for name, busy in self.busy.items()
+        )
+        return (f"PipelineMetrics({self.completed}/{self.items} done in {self.elapsed:.2f}s, "
+                f"first after {first}, {self.throughput:.2f}/s, failed {self.failed}; {stages})")
+
+
+def run_pipeline(
+    keys: List[K],
+    stages: List[PipelineStage],
+    desc: str = "Pipeline"
+) -> Tuple[Dict[K, Any], List[K], PipelineMetrics]:
+    """
+    Stream keys through stages connected by bounded queues.
+    
+    Each key enters the first stage as (key, key) and moves on as soon as a
+    stage is done with it, so a slow item only delays itself. A full queue
+    blocks the stage feeding it (backpressure), which bounds the items in
+    flight to the sum of the queue sizes plus the workers. A key whose stage
+    raises is logged and dropped.
+    
+    Returns:
+        Tuple of (last stage's output by key in keys order, failed keys, metrics)
+    """
+    metrics = PipelineMetrics(items=len(keys))
+    metrics.busy = {stage.name: 0.0 for stage in stages}
+    metrics.max_queued = {stage.name: 0 for stage in stages}
+    queues = [Queue(maxsize=stage.queue_size) for stage in stages]
+    running = [stage.workers for stage in stages]
+    results: Dict[K, Any] = {}
+    failed: List[K] = []
+    lock = threading.Lock()
+    start = time.perf_counter()
+    pbar = tqdm(total=len(keys), desc=desc)
+
+    def put(i: int, item) -> None:
+        queues[i].put(item)
+        queued = queues[i].qsize()
+        if queued > metrics.max_queued[stages[i].name]:
+            with lock:
+                metrics.max_queued[stages[i].name] = max(metrics.max_queued[stages[i].name], queued)
+
+    def emit(i: int, key: K, value: Any) -> None:
+        if i + 1 < len(stages):
+            put(i + 1, (key, value))
+            return
+        with lock:
+            results[key] = value
+            metrics.completed += 1
+            if metrics.first_output is None:
+                metrics.first_output = time.perf_counter() - start
+        pbar.update(1)
+
+    def fail(i: int, failed_keys: List[K], e: Exception) -> None:
+        print(f"[ERROR] {stages[i].name} {failed_keys if len(failed_keys) > 1 else failed_keys[0]}: {type(e).__name__}: {e}")
+        with lock:
+            failed.extend(failed_keys)
+            metrics.failed[stages[i].name] = metrics.failed.get(stages[i].name, 0) + len(failed_keys)
+        pbar.update(len(failed_keys))
+
+    def work(i: int) -> None:
+        stage, q = stages[i], queues[i]
+        done = False
+        while not done:
+            item = q.get()
+            if item is _DONE:
+                break
+            batch = [item]
+            while len(batch) < stage.batch_size:
+                try:
+                    item = q.get_nowait()
+                except Empty:
+                    break
+                if item is _DONE:
+                    done = True
+                    break
+                batch.append(item)
+            t0 = time.perf_counter()
+            try:
+                if stage.batch_size > 1:
+                    out = stage.fn(batch)
+                    outputs = [(k, out[k]) for k, _ in batch if k in out]
+                    missing = [k for k, _ in batch if k not in out]
+                    if missing:
+                        fail(i, missing, KeyError("no output"))
+                else:
+                    outputs = [(batch[0][0], stage.fn(*batch[0]))]
+            except Exception as e:
+                outputs = []
+                fail(i, [k for k, _ in batch], e)
+            with lock:
+                metrics.busy[stage.name] += time.perf_counter() - t0
+            for key, value in outputs:
+                emit(i, key, value)
+        # The last worker out tells every worker of the next stage to stop
+        with lock:
+            running[i] -= 1
+            last = running[i] == 0
+        if last and i + 1 < len(stages):
+            for _ in range(stages[i + 1].workers):
+                queues[i + 1].put(_DONE)
+
+    threads = [
+        threading.Thread(target=work, args=(i,), name=f"{stage.name}-{w}", daemon=True)
+        for i, stage in enumerate(stages) for w in range(stage.workers)
+    ]
+    for t in threads:
+        t.start()
+    for key in keys:
+        put(0, (key, key))
+    for _ in range(stages[0].workers):
+        queues[0].put(_DONE)
+    for t in threads:
+        t.join()
+    pbar.close()
+    metrics.elapsed = time.perf_counter() - start
+    return {k: results[k] for k in keys if k in results}, failed, metrics
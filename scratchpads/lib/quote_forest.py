@@ -0,0 +1,269 @@
+# %%
+"""
+Quote forest: every quote chain of the corpus as one set of CSR arrays.
+
+A tweet quotes at most one other tweet, so the quote graph is a forest whose
+edges point from a quoting tweet up to the tweet it quotes. It is built once
+from the quote index pairs with vectorized passes and stored next to the
+reply forest:
+    node_ids        (N,)   sorted ids of every tweet that quotes or is quoted
+    parent          (N,)   node index of the quoted tweet, -1 at the top of a chain
+    depth           (N,)   quote hops from the top of the chain
+    root            (N,)   node index of the top of the chain
+    child_offsets   (N+1,) CSR offsets into children
+    children        (E,)   quoting nodes, in quote index order within a parent
+
+Quoted tweets missing from the corpus are still nodes, so their quoters can
+be found. "All transitive quoters of X up to depth k" expands the CSR one
+level at a time and "quote ancestry of X" follows parent pointers, both
+vectorized over any number of query ids and proportional to the output.
+"""
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+from .array_store import INT_NULL, chain_tops, key_array, open_array_dir, sorted_unique, write_array_dir
+from .tweet_store import dedupe_rows
+
+QUOTE_FOREST_VERSION = 1
+QUOTE_FOREST_ARRAYS = ('node_ids', 'parent', 'depth', 'root', 'child_offsets', 'children')
+
+
+def quote_forest_arrays(quoted_ids: np.ndarray, quoting_ids: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Build quote forest arrays from (quoted, quoting) id pairs.
+
+    Children of a node keep the pairs' order. Self-quotes are dropped; a quote
+    that would close a cycle (only possible with corrupt data) is dropped with
+    the same disjoint-set pass that breaks reply cycles.
+
+    Returns:
+        Dict of quote forest arrays (see module docstring) plus 'cycles' (1,)
+    """
+    from .conversation_explorer import break_parent_cycles
+
+    quoted_ids = np.asarray(quoted_ids, dtype=np.int64)
+    quoting_ids = np.asarray(quoting_ids, dtype=np.int64)
+    keep = (quoted_ids != quoting_ids) & (quoted_ids != INT_NULL) & (quoting_ids != INT_NULL)
+    quoted_ids, quoting_ids = quoted_ids[keep], quoting_ids[keep]
+    # A tweet quotes one tweet; if it is listed twice the last pair wins
+    rows = np.sort(dedupe_rows(quoting_ids))
+    quoted_ids, quoting_ids = quoted_ids[rows], quoting_ids[rows]
+
+    node_ids = sorted_unique(np.concatenate([quoting_ids, quoted_ids]))
+    n = len(node_ids)
+    child = np.searchsorted(node_ids, quoting_ids)
+    parent = np.full(n, -1, dtype=np.int64)
+    parent[child] = np.searchsorted(node_ids, quoted_ids)
+
+    cycles = 0
+    tops = chain_tops(parent)
+    if tops is None:
+        parent, cycles = break_parent_cycles(parent)
+        tops = chain_tops(parent)
+    root, depth = tops
+
+    # Children in pair order: stable sort of the surviving edges by parent
+    child = child[parent[child] >= 0]
+    by_parent = np.argsort(parent[child], kind='stable')
+    child_offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(parent[child], minlength=n), out=child_offsets[1:])
+    return {
+        'node_ids': node_ids,
+        'parent': parent,
+        'depth': depth,
+        'root': root,
+        'child_offsets': child_offsets,
+        'children': child[by_parent],
+        'cycles': np.array([cycles], dtype=np.int64),
+    }
+
+
+def write_quote_forest(out_dir: Union[str, Path], quoted_ids: np.ndarray, quoting_ids: np.ndarray) -> Dict[str, int]:
+    """Persist the quote forest of (quoted, quoting) pairs as a memory-mappable directory. Returns its stats."""
+    arrays = quote_forest_arrays(quoted_ids, quoting_ids)
+    stats = {
+        'nodes': int(len(arrays['node_ids'])),
+        'quotes': int(len(arrays['children'])),
+        'chains': int((arrays['parent'] < 0).sum()),
+        'max_depth': int(arrays['depth'].max()) if len(arrays['depth']) else 0,
+        'cycles': int(arrays['cycles'][0]),
+    }
+    write_array_dir(out_dir, {k: arrays[k] for k in QUOTE_FOREST_ARRAYS}, {'version': QUOTE_FOREST_VERSION, **stats})
+    return stats
+
+
+def _range_positions(lo: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """Concatenated aranges lo[i] .. lo[i] + counts[i] (CSR gather positions)."""
+    total = int(counts.sum())
+    return np.repeat(lo - np.cumsum(counts) + counts, counts) + np.arange(total)
+
+
+class QuoteForest(Mapping):
+    """
+    Quote chains over memory-mapped quote forest arrays.
+
+    As a Mapping it is a drop-in for the quote index (quoted id -> direct
+    quoting ids); quoters() and ancestry() follow whole chains.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        arrays, self.meta = open_array_dir(self.path)
+        self._init_arrays(arrays)
+
+    def _init_arrays(self, arrays: Dict[str, np.ndarray]) -> None:
+        self.node_ids = arrays['node_ids']
+        self.parent = arrays['parent']
+        self.depth = arrays['depth']
+        self.root = arrays['root']
+        self.child_offsets = arrays['child_offsets']
+        self.children = arrays['children']
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> 'QuoteForest':
+        """Wrap in-memory arrays (e.g. straight from quote_forest_arrays)."""
+        forest = cls.__new__(cls)
+        forest.path = None
+        forest.meta = {'version': QUOTE_FOREST_VERSION}
+        forest._init_arrays(arrays)
+        return forest
+
+    def __reduce__(self):
+        # Reopen from disk in other processes instead of pickling the arrays
+        if self.path is not None:
+            return (self.__class__, (str(self.path),))
+        arrays = {k: np.asarray(getattr(self, k)) for k in QUOTE_FOREST_ARRAYS}
+        return (self.__class__.from_arrays, (arrays,))
+
+    def find_many(self, tweet_ids: np.ndarray) -> np.ndarray:
+        """Node index of each tweet id, -1 where it neither quotes nor is quoted."""
+        tweet_ids = np.asarray(tweet_ids, dtype=np.int64)
+        if not len(self.node_ids):
+            return np.full(len(tweet_ids), -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self.node_ids, tweet_ids), len(self.node_ids) - 1)
+        return np.where(self.node_ids[pos] == tweet_ids, pos, -1)
+
+    def _node(self, tweet_id) -> int:
+        try:
+            return int(self.find_many(np.array([int(tweet_id)]))[0])
+        except (TypeError, ValueError, OverflowError):
+            return -1
+
+    def quoters_many(self, tweet_ids: np.ndarray, depth: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Transitive quoters of many tweets, one CSR expansion per level.
+
+        Args:
+            tweet_ids: Quoted tweet ids
+            depth: Max quote hops (None for whole subtrees)
+
+        Returns:
+            (query positions, quoting ids, hops), grouped by query position,
+            level by level within a query
+        """
+        node = self.find_many(tweet_ids)
+        q = np.flatnonzero(node >= 0)
+        frontier = node[q]
+        out_q, out_nodes, out_hops = [], [], []
+        hop = 0
+        while len(frontier) and (depth is None or hop < depth):
+            hop += 1
+            lo = self.child_offsets[frontier]
+            counts = self.child_offsets[frontier + 1] - lo
+            q = np.repeat(q, counts)
+            frontier = self.children[_range_positions(lo, counts)]
+            out_q.append(q)
+            out_nodes.append(frontier)
+            out_hops.append(np.full(len(q), hop, dtype=np.int64))
+        return self._grouped(out_q, out_nodes, out_hops)
+
+    def ancestry_many(self, tweet_ids: np.ndarray, depth: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Quote ancestry of many tweets: the tweet each quotes, the tweet that one quotes, ...
+
+        Returns:
+            (query positions, ancestor ids, hops), grouped by query position,
+            nearest ancestor first
+        """
+        node = self.find_many(tweet_ids)
+        q = np.flatnonzero(node >= 0)
+        frontier = node[q]
+        out_q, out_nodes, out_hops = [], [], []
+        hop = 0
+        while len(frontier) and (depth is None or hop < depth):
+            hop += 1
+            up = self.parent[frontier]
+            has = up >= 0
+            q, frontier = q[has], up[has]
+            out_q.append(q)
+            out_nodes.append(frontier)
+            out_hops.append(np.full(len(q), hop, dtype=np.int64))
+        return self._grouped(out_q, out_nodes, out_hops)
+
+    def _grouped(self, out_q: List[np.ndarray], out_nodes: List[np.ndarray], out_hops: List[np.ndarray]):
+        if not out_q:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, empty
+        q, nodes, hops = np.concatenate(out_q), np.concatenate(out_nodes), np.concatenate(out_hops)
+        order = np.argsort(q, kind='stable')
+        return q[order], self.node_ids[nodes[order]], hops[order]
+
+    def quoters(self, tweet_id, depth: Optional[int] = None) -> List[int]:
+        """All tweets quoting tweet_id directly or through a chain of quotes, up to depth hops."""
+        return self.get_many([tweet_id], [], depth=depth)[0]
+
+    def ancestry(self, tweet_id, depth: Optional[int] = None) -> List[int]:
+        """Tweets tweet_id quotes transitively, nearest first, up to depth hops."""
+        ids, valid = key_array([tweet_id])
+        if not valid[0]:
+            return []
+        return self.ancestry_many(ids, depth)[1].tolist()
+
+    def chain_root(self, tweet_id) -> Optional[int]:
+        """Top of tweet_id's quote chain (the original tweet), None if it has no quote relations."""
+        g = self._node(tweet_id)
+        return None if g < 0 else int(self.node_ids[self.root[g]])
+
+    def get_many(self, quoted_ids: Iterable, default=None, depth: Optional[int] = 1) -> List[Optional[List[int]]]:
+        """Quoting id lists for quoted_ids in order, up to depth hops (default where none)."""
+        keys = list(quoted_ids)
+        ids, valid = key_array(keys)
+        q, found, _ = self.quoters_many(ids[valid], depth)
+        q = np.flatnonzero(valid)[q]
+        out = [default] * len(keys)
+        if not len(q):
+            return out
+        starts = np.flatnonzero(np.diff(q, prepend=-1))
+        ends = np.append(starts[1:], len(q))
+        found = found.tolist()
+        for s, e in zip(starts.tolist(), ends.tolist()):
+            out[int(q[s])] = found[s:e]
+        return out
+
+    def __getitem__(self, quoted_id) -> List[int]:
+        g = self._node(quoted_id)
+        if g < 0 or self.child_offsets[g] == self.child_offsets[g + 1]:
+            raise KeyError(quoted_id)
+        return self.node_ids[self.children[self.child_offsets[g]:self.child_offsets[g + 1]]].tolist()
+
+    def __contains__(self, quoted_id) -> bool:
+        g = self._node(quoted_id)
+        return g >= 0 and self.child_offsets[g] < self.child_offsets[g + 1]
+
+    def _quoted_nodes(self) -> np.ndarray:
+        return np.flatnonzero(self.child_offsets[1:] > self.child_offsets[:-1])
+
+    def __iter__(self) -> Iterator[int]:
+        return (int(self.node_ids[g]) for g in self._quoted_nodes())
+
+    def __len__(self) -> int:
+        return len(self._quoted_nodes())
+
+    def __repr__(self) -> str:
+        where = repr(str(self.path)) if self.path is not None else 'in memory'
+        return f"QuoteForest({where}, {len(self.node_ids)} tweets, {len(self.children)} quotes)"
+
+# %%
@@ -0,0 +1,173 @@
+# %%
+"""
+Quote index as sorted int64 arrays: quoted_tweet_id -> quoting tweet ids.
+
+Layout on disk (memory-mapped on open):
+    quoted_id.npy   (E,)   quoted tweet id of each quote, sorted
+    quoting_id.npy  (E,)   quoting tweet id, aligned with quoted_id (file order within a key)
+    keys.npy        (K,)   unique quoted ids
+    offsets.npy     (K+1,) range of each key in quoting_id
+
+Lookups are a binary search on keys; lookup_many resolves any number of
+quoted ids with a handful of vectorized operations. Incremental updates
+append delta-NNNN/ segments whose quoters follow the earlier ones.
+"""
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+from .array_store import delta_dirs, isin_sorted, key_array, next_delta_dir, open_array_dir, sorted_unique, write_array_dir
+
+QUOTE_INDEX_VERSION = 1
+
+
+def write_quote_index(out_dir: Union[str, Path], quoted_ids: np.ndarray, quoting_ids: np.ndarray) -> int:
+    """
+    Persist (quoted, quoting) pairs as a quote index directory.
+
+    Pairs are grouped by quoted id with a stable sort, so each key's quoters
+    keep their input order. Returns the number of distinct quoted ids.
+    """
+    quoted_ids = np.asarray(quoted_ids, dtype=np.int64)
+    quoting_ids = np.asarray(quoting_ids, dtype=np.int64)
+    order = np.argsort(quoted_ids, kind='stable')
+    quoted_ids, quoting_ids = quoted_ids[order], quoting_ids[order]
+    keys, starts = np.unique(quoted_ids, return_index=True)
+    offsets = np.append(starts, len(quoted_ids)).astype(np.int64)
+    write_array_dir(out_dir, {
+        'quoted_id': quoted_ids,
+        'quoting_id': quoting_ids,
+        'keys': keys,
+        'offsets': offsets,
+    }, {
+        'version': QUOTE_INDEX_VERSION,
+        'keys': int(len(keys)),
+        'quotes': int(len(quoted_ids)),
+    })
+    return len(keys)
+
+
+class _QuoteSegment:
+    def __init__(self, path: Path):
+        self.path = path
+        arrays, self.meta = open_array_dir(path)
+        self.quoted_id = arrays['quoted_id']
+        self.quoting_id = arrays['quoting_id']
+        self.keys = arrays['keys']
+        self.offsets = arrays['offsets']
+
+    def find(self, quoted_id: int) -> np.ndarray:
+        i = int(np.searchsorted(self.keys, quoted_id))
+        if i < len(self.keys) and self.keys[i] == quoted_id:
+            return self.quoting_id[self.offsets[i]:self.offsets[i + 1]]
+        return self.quoting_id[:0]
+
+
+class QuoteIndex(Mapping):
+    """Mapping quoted_tweet_id -> list of quoting tweet ids over memory-mapped arrays."""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self._segments = [_QuoteSegment(self.path)] + [_QuoteSegment(p) for p in delta_dirs(self.path)]
+        self._keys: Optional[np.ndarray] = None
+
+    def __reduce__(self):
+        # Reopen from disk in other processes instead of pickling the arrays
+        return (self.__class__, (str(self.path),))
+
+    def _find(self, quoted_id) -> Optional[np.ndarray]:
+        try:
+            qid = int(quoted_id)
+        except (TypeError, ValueError):
+            return None
+        parts = [seg.find(qid) for seg in self._segments]
+        if len(parts) == 1:
+            return parts[0] if len(parts[0]) else None
+        found = np.concatenate(parts)
+        return found if len(found) else None
+
+    def __getitem__(self, quoted_id) -> List[int]:
+        found = self._find(quoted_id)
+        if found is None:
+            raise KeyError(quoted_id)
+        return found.tolist()
+
+    def __contains__(self, quoted_id) -> bool:
+        return self._find(quoted_id) is not None
+
+    def _all_keys(self) -> np.ndarray:
+        if self._keys is None:
+            if len(self._segments) == 1:
+                self._keys = self._segments[0].keys
+            else:
+                self._keys = sorted_unique(np.concatenate([seg.keys for seg in self._segments]))
+        return self._keys
+
+    def __iter__(self) -> Iterator[int]:
+        return (int(k) for k in self._all_keys())
+
+    def __len__(self) -> int:
+        return len(self._all_keys())
+
+    def __repr__(self) -> str:
+        quotes = sum(len(seg.quoting_id) for seg in self._segments)
+        return f"QuoteIndex({str(self.path)!r}, {len(self)} quoted tweets, {quotes} quotes, {len(self._segments) - 1} deltas)"
+
+    def lookup_many(self, quoted_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Vectorized lookup of many quoted ids.
+
+        Returns:
+            (query positions, quoting ids): every quote of quoted_ids[i] appears
+            as a pair (i, quoting id), grouped by position, in index order
+        """
+        quoted_ids = np.asarray(quoted_ids, dtype=np.int64)
+        out_q, out_ids = [], []
+        for seg in self._segments:
+            hit = np.flatnonzero(isin_sorted(quoted_ids, seg.keys))
+            k = np.searchsorted(seg.keys, quoted_ids[hit])
+            lo, hi = seg.offsets[k], seg.offsets[k + 1]
+            counts = hi - lo
+            total = int(counts.sum())
+            pos = np.repeat(lo - np.cumsum(counts) + counts, counts) + np.arange(total)
+            out_q.append(np.repeat(hit, counts))
+            out_ids.append(seg.quoting_id[pos])
+        q, ids = np.concatenate(out_q), np.concatenate(out_ids)
+        if len(self._segments) > 1:
+            # Group by query, earlier segments first within each
+            order = np.argsort(q, kind='stable')
+            q, ids = q[order], ids[order]
+        return q, ids
+
+    def get_many(self, quoted_ids: Iterable, default=None) -> List[Optional[List[int]]]:
+        """Quoting id lists for quoted_ids in order (default where a tweet has no quotes)."""
+        keys = list(quoted_ids)
+        ids, valid = key_array(keys)
+        q, found = self.lookup_many(ids[valid])
+        q = np.flatnonzero(valid)[q]
+        out = [default] * len(keys)
+        if not len(q):
+            return out
+        starts = np.flatnonzero(np.diff(q, prepend=-1))
+        ends = np.append(starts[1:], len(q))
+        found = found.tolist()
+        for s, e in zip(starts.tolist(), ends.tolist()):
+            out[int(q[s])] = found[s:e]
+        return out
+
+    def pairs(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(quoted ids, quoting ids) of every quote, grouped by key within each segment, segments in order."""
+        return (
+            np.concatenate([seg.quoted_id for seg in self._segments]),
+            np.concatenate([seg.quoting_id for seg in self._segments]),
+        )
+
+    def append(self, quoted_ids: np.ndarray, quoting_ids: np.ndarray) -> int:
+        """Write new quotes as a delta segment (visible to indexes opened afterwards)."""
+        if not len(quoted_ids):
+            return 0
+        return write_quote_index(next_delta_dir(self.path), quoted_ids, quoting_ids)
+
+# %%
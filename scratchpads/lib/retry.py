@@ -1,7 +1,9 @@
 """Retry utilities with exponential backoff."""
+import asyncio
+import random
 import time
 from functools import wraps
-from typing import Callable, Tuple, Type, TypeVar, Optional
+from typing import Awaitable, Callable, Tuple, Type, TypeVar, Optional
 
 T = TypeVar('T')
 
@@ -10,7 +12,8 @@ def with_retry(
     max_retries: int = 5,
     base_delay: float = 1.0,
     retryable_errors: Tuple[Type[Exception], ...] = (Exception,),
-    on_retry: Optional[Callable[[Exception, int], None]] = None
+    on_retry: Optional[Callable[[Exception, int], None]] = None,
+    jitter: float = 0.0
 ):
     """
     Decorator for exponential backoff retry.
@@ -20,6 +23,8 @@ def with_retry(
         base_delay: Initial delay in seconds (doubles each retry)
         retryable_errors: Tuple of exception types to retry on
         on_retry: Optional callback(exception, attempt) called before each retry
+        jitter: Randomise each delay by up to this fraction (0.5: 50-150%), so
+            callers failing together do not retry in lockstep
     """
     def decorator(fn: Callable[..., T]) -> Callable[..., T]:
         @wraps(fn)
@@ -30,7 +35,7 @@ def with_retry(
                 except retryable_errors as e:
                     if attempt == max_retries - 1:
                         raise
-                    delay = base_delay * (2 ** attempt)
+                    delay = _backoff(base_delay, attempt, jitter)
                     if on_retry:
                         on_retry(e, attempt)
                     else:
@@ -41,6 +46,39 @@ def with_retry(
     return decorator
 
 
+def with_retry_async(
+    max_retries: int = 5,
+    base_delay: float = 1.0,
+    retryable_errors: Tuple[Type[Exception], ...] = (Exception,),
+    on_retry: Optional[Callable[[Exception, int], None]] = None,
+    jitter: float = 0.0
+):
+    """with_retry for coroutine functions: waits with asyncio.sleep, so cancellation interrupts the backoff."""
+    def decorator(fn: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        @wraps(fn)
+        async def wrapper(*args, **kwargs) -> T:
+            for attempt in range(max_retries):
+                try:
+                    return await fn(*args, **kwargs)
+                except retryable_errors as e:
+                    if attempt == max_retries - 1:
+                        raise
+                    delay = _backoff(base_delay, attempt, jitter)
+                    if on_retry:
+                        on_retry(e, attempt)
+                    else:
+                        print(f"Retry {attempt + 1}/{max_retries} in {delay:.1f}s: {type(e).__name__}: {e}")
+                    await asyncio.sleep(delay)
+            raise RuntimeError("Unreachable")
+        return wrapper
+    return decorator
+
+
+def _backoff(base_delay: float, attempt: int, jitter: float) -> float:
+    delay = base_delay * (2 ** attempt)
+    return delay * random.uniform(1 - jitter, 1 + jitter) if jitter else delay
+
+
 def is_rate_limit_error(e: Exception) -> bool:
     """Check if exception looks like a rate limit error."""
     error_str = str(e).lower()
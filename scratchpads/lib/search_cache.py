@@ -0,0 +1,127 @@
+# %%
+"""
+Persistent cache of semantic search responses.
+
+Strands are rebuilt often (a depth change, a crash halfway through a batch)
+and each rebuild re-issues the same searches. Responses are kept in a
+diskcache keyed by a hash of (search_term, k, threshold, filter), with a TTL
+and a size bound (least recently used entries go first). In offline mode a
+miss raises SearchCacheMiss instead of calling the API, so a rerun can be
+checked to make zero network calls.
+"""
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+from diskcache import Cache
+
+SEARCH_CACHE_DIR = Path(__file__).parent.parent / 'semantic_search.diskcache'
+SEARCH_CACHE_TTL_DAYS = float(os.environ.get('SEARCH_CACHE_TTL_DAYS', 30))
+SEARCH_CACHE_MB = int(os.environ.get('SEARCH_CACHE_MB', 512))
+SEARCH_OFFLINE = os.environ.get('SEARCH_OFFLINE', '') not in ('', '0', 'false')
+
+
+class SearchCacheMiss(LookupError):
+    """Raised in offline mode when a search is not cached."""
+    pass
+
+
+def search_key(search_term: str, k: int, threshold: float, filter: Optional[dict]) -> str:
+    """Stable hash of the search parameters that determine the response."""
+    blob = json.dumps([search_term, k, threshold, filter], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(blob.encode('utf-8')).hexdigest()
+
+
+class SearchCache:
+    """
+    Disk-backed search response cache with hit-rate counters.
+
+    Values are the raw result lists of successful responses, before any
+    per-call exclusion (exclude_tweet_id is not part of the key). Counters are
+    per process: hits, misses, and network calls made on misses.
+    """
+
+    def __init__(
+        self,
+        directory: Union[str, Path] = SEARCH_CACHE_DIR,
+        ttl_days: Optional[float] = SEARCH_CACHE_TTL_DAYS,
+        size_limit_mb: int = SEARCH_CACHE_MB,
+        offline: bool = SEARCH_OFFLINE,
+    ):
+        self.directory = Path(directory)
+        self.ttl = ttl_days * 86400 if ttl_days else None
+        self.offline = offline
+        self._cache = Cache(str(self.directory), size_limit=size_limit_mb * 1024**2, eviction_policy='least-recently-used')
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.network_calls = 0
+
+    def get(self, key: str) -> Optional[List[dict]]:
+        """Cached results for key, None on a miss (SearchCacheMiss when offline)."""
+        results = self._cache.get(key)
+        with self._lock:
+            if results is not None:
+                self.hits += 1
+                return results
+            self.misses += 1
+        if self.offline:
+            raise SearchCacheMiss(f"Search {key[:12]} is not cached and the search cache is offline")
+        return None
+
+    def set(self, key: str, results: List[dict]) -> None:
+        self._cache.set(key, results, expire=self.ttl)
+
+    def count_network_call(self) -> None:
+        with self._lock:
+            self.network_calls += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'network_calls': self.network_calls,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self._cache),
+                'bytes': self._cache.volume(),
+                'offline': self.offline,
+            }
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def close(self) -> None:
+        self._cache.close()
+
+    def __repr__(self) -> str:
+        s = self.stats()
+        mode = ", offline" if s['offline'] else ""
+        return (f"SearchCache({str(self.directory)!r}, {s['entries']} entries, {s['bytes'] / 1024**2:.1f} MB, "
+                f"hit rate {s['hit_rate']:.1%}, {s['network_calls']} network calls{mode})")
+
+
+_search_cache: Optional[SearchCache] = None
+
+
+def get_search_cache() -> SearchCache:
+    """The process-wide search cache (opened on first use)."""
+    global _search_cache
+    if _search_cache is None:
+        _search_cache = SearchCache()
+    return _search_cache
+
+
+def configure_search_cache(**kwargs) -> SearchCache:
+    """Reopen the process-wide search cache with other settings (directory, ttl_days, size_limit_mb, offline)."""
+    global _search_cache
+    if _search_cache is not None:
+        _search_cache.close()
+    _search_cache = SearchCache(**kwargs)
+    return _search_cache
+
+# %%
@@ -0,0 +1,210 @@
+# %%
+"""
+Pooled, retrying HTTP session for the embeddings search API.
+
+search_embeddings used to open a fresh connection per call, with no timeout
+and no retry, and turned any non-OK status into an empty result list, so a
+transient 503 silently produced an empty strand. SearchSession keeps one
+requests.Session whose connection pool is shared by all threads (keep-alive),
+sends every request with (connect, read) timeouts, retries 429s, 5xx,
+connection errors and timeouts with jittered exponential backoff, and raises
+SearchAPIError once retries run out or the API rejects the request.
+
+Two histograms are kept: `requests`, one entry per HTTP attempt, and
+`searches`, one per search including its retries.
+"""
+import json
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .latency import LatencyHistogram
+from .retry import with_retry, with_retry_async
+
+if TYPE_CHECKING:
+    from .async_http import AsyncHTTP
+
+SEARCH_URL = os.environ.get('SEARCH_URL', 'http://embed.tweetstack.app/embeddings/search')
+SEARCH_CONNECT_TIMEOUT = float(os.environ.get('SEARCH_CONNECT_TIMEOUT', 5))
+SEARCH_READ_TIMEOUT = float(os.environ.get('SEARCH_READ_TIMEOUT', 60))
+# Attempts per search, including the first
+SEARCH_MAX_RETRIES = int(os.environ.get('SEARCH_MAX_RETRIES', 4))
+SEARCH_POOL_SIZE = int(os.environ.get('SEARCH_POOL_SIZE', 16))
+
+
+class SearchAPIError(RuntimeError):
+    """The search API failed a request; status is the HTTP status, None if no response came back."""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+class TransientSearchError(SearchAPIError):
+    """A search failure worth retrying: 429, 5xx, connection error or timeout."""
+    pass
+
+
+def _status_error(status: int, text: str) -> SearchAPIError:
+    cls = TransientSearchError if status == 429 or status >= 500 else SearchAPIError
+    return cls(f"Search API returned {status}: {text[:200]}", status)
+
+
+def _json_body(status: int, text: str) -> dict:
+    """Parsed JSON of a response body; anything else (e.g. a proxy's HTML error page) is a non-retryable SearchAPIError."""
+    try:
+        data = json.loads(text)
+    except ValueError:
+        raise SearchAPIError(f"Search API returned {status} with a non-JSON body: {text[:200]}", status) from None
+    if not isinstance(data, dict):
+        raise SearchAPIError(f"Search API returned {status} with an unexpected body: {text[:200]}", status)
+    return data
+
+
+def _raw_results(data: dict) -> List[dict]:
+    """Results of a search API response; raises SearchAPIError if it did not succeed."""
+    if not data.get('success') or not isinstance(data.get('results'), list):
+        raise SearchAPIError(f"Search API response was not successful: {str(data)[:200]}")
+    return data['results']
+
+
+class SearchSession:
+    """
+    Keep-alive connection pool, timeouts, retries and latency histograms for the search API.
+
+    search() is safe to call from many threads; pool_size should cover the
+    threads searching at once (more wait for a free connection).
+    """
+
+    def __init__(
+        self,
+        url: str = SEARCH_URL,
+        connect_timeout: float = SEARCH_CONNECT_TIMEOUT,
+        read_timeout: float = SEARCH_READ_TIMEOUT,
+        max_retries: int = SEARCH_MAX_RETRIES,
+        base_delay: float = 0.5,
+        jitter: float = 0.5,
+        pool_size: int = SEARCH_POOL_SIZE,
+    ):
+        self.url = url
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.jitter = jitter
+        self.pool_size = pool_size
+        self.session = requests.Session()
+        self.session.headers['Content-Type'] = 'application/json'
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.requests = LatencyHistogram('search requests')
+        self.searches = LatencyHistogram('searches')
+
+    def search(self, payload: dict) -> List[dict]:
+        """Raw results of one search, retried on transient failures; raises SearchAPIError."""
+        post = with_retry(
+            max_retries=self.max_retries,
+            base_delay=self.base_delay,
+            retryable_errors=(TransientSearchError,),
+            on_retry=self._on_retry,
+            jitter=self.jitter,
+        )(self._post)
+        with self.searches.time():
+            return post(payload)
+
+    def _post(self, payload: dict) -> List[dict]:
+        start = time.perf_counter()
+        try:
+            response = self.session.post(self.url, json=payload, timeout=self.timeout)
+        except requests.RequestException as e:
+            self.requests.record(time.perf_counter() - start, ok=False)
+            raise TransientSearchError(f"Search API request failed: {type(e).__name__}: {e}") from e
+        try:
+            if not response.ok:
+                raise _status_error(response.status_code, response.text)
+            results = _raw_results(_json_body(response.status_code, response.text))
+        except SearchAPIError:
+            self.requests.record(time.perf_counter() - start, ok=False)
+            raise
+        self.requests.record(time.perf_counter() - start)
+        return results
+
+    async def search_async(self, http: 'AsyncHTTP', payload: dict) -> List[dict]:
+        """search() over the shared AsyncHTTP client, with the same timeouts, retries and histograms."""
+        import httpx
+
+        timeout = httpx.Timeout(self.timeout[1], connect=self.timeout[0])
+
+        async def post() -> List[dict]:
+            start = time.perf_counter()
+            try:
+                response = await http.post(self.url, json=payload, timeout=timeout)
+            except httpx.TransportError as e:
+                self.requests.record(time.perf_counter() - start, ok=False)
+                raise TransientSearchError(f"Search API request failed: {type(e).__name__}: {e}") from e
+            try:
+                if not response.is_success:
+                    raise _status_error(response.status_code, response.text)
+                results = _raw_results(_json_body(response.status_code, response.text))
+            except SearchAPIError:
+                self.requests.record(time.perf_counter() - start, ok=False)
+                raise
+            self.requests.record(time.perf_counter() - start)
+            return results
+
+        retrying = with_retry_async(
+            max_retries=self.max_retries,
+            base_delay=self.base_delay,
+            retryable_errors=(TransientSearchError,),
+            on_retry=self._on_retry,
+            jitter=self.jitter,
+        )(post)
+        start = time.perf_counter()
+        try:
+            results = await retrying()
+        except Exception:
+            self.searches.record(time.perf_counter() - start, ok=False)
+            raise
+        self.searches.record(time.perf_counter() - start)
+        return results
+
+    def _on_retry(self, e: Exception, attempt: int) -> None:
+        self.requests.count_retry()
+        self.searches.count_retry()
+        print(f"[WARN] Search retry {attempt + 1}/{self.max_retries}: {e}")
+
+    def close(self) -> None:
+        self.session.close()
+
+    def __repr__(self) -> str:
+        return f"SearchSession({self.url!r}, pool {self.pool_size}, timeout {self.timeout})\n  {self.searches}\n  {self.requests}"
+
+
+_search_session: Optional[SearchSession] = None
+_session_lock = threading.Lock()
+
+
+def get_search_session() -> SearchSession:
+    """The process-wide search session (created on first use)."""
+    global _search_session
+    if _search_session is None:
+        with _session_lock:
+            if _search_session is None:
+                _search_session = SearchSession()
+    return _search_session
+
+
+def configure_search_session(**kwargs) -> SearchSession:
+    """Replace the process-wide search session (url, connect_timeout, read_timeout, max_retries, base_delay, jitter, pool_size)."""
+    global _search_session
+    with _session_lock:
+        if _search_session is not None:
+            _search_session.close()
+        _search_session = SearchSession(**kwargs)
+    return _search_session
+
+# %%
@@ -0,0 +1,159 @@
+# %%
+"""
+Local stand-in for the embeddings search API, to benchmark search latency
+and failure handling without the real service.
+
+    with SearchStubServer(latency=0.02, failure_rate=0.1) as stub:
+        configure_search_session(url=stub.url, base_delay=0.01)
+        search_embeddings("cats", use_cache=False)
+
+It answers POST /embeddings/search like the API ({"success": true,
+"results": [...]}) with k deterministic results per search term, after a
+configurable delay (a base latency, uniform jitter and an occasional slow
+tail); connect_latency is added once per new connection, standing in for the
+TCP/TLS handshake with the remote API that keep-alive saves. A share of requests, or the first fail_first, get an error status
+instead; fail_status=None drops the connection without a response.
+Requests are served on threads with HTTP/1.1 keep-alive, like the API.
+"""
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+
+
+def stub_results(search_term: str, k: int) -> List[dict]:
+    """k results for search_term, the same on every call, most similar first."""
+    rng = random.Random(hashlib.sha256(search_term.encode('utf-8')).digest())
+    distances = sorted((rng.uniform(0.5, 1.0) for _ in range(k)), reverse=True)
+    results = []
+    for distance in distances:
+        tweet_id = str(rng.randrange(10**18, 2 * 10**18))
+        results.append({
+            'key': tweet_id,
+            'distance': distance,
+            'metadata': {'text': f"stub tweet {tweet_id} for {search_term[:40]}", 'tweet_id': tweet_id},
+        })
+    return results
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Room for a burst of new connections (the default backlog of 5 drops SYNs, adding 1s retransmits)
+    request_queue_size = 128
+
+
+class SearchStubServer:
+    """Threaded search API stub on 127.0.0.1 (a free port); use as a context manager, then point the search session at .url."""
+
+    def __init__(
+        self,
+        latency: float = 0.01,
+        connect_latency: float = 0.0,
+        latency_jitter: float = 0.0,
+        slow_rate: float = 0.0,
+        slow_latency: float = 1.0,
+        failure_rate: float = 0.0,
+        fail_first: int = 0,
+        fail_status: Optional[int] = 503,
+        max_results: int = 100,
+        seed: int = 0,
+    ):
+        self.latency = latency
+        self.connect_latency = connect_latency
+        self.latency_jitter = latency_jitter
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.failure_rate = failure_rate
+        self.fail_first = fail_first
+        self.fail_status = fail_status
+        self.max_results = max_results
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.failures = 0
+        self.connections = 0
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/embeddings/search"
+
+    def __enter__(self) -> 'SearchStubServer':
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body go out as two writes; with Nagle on, keep-alive requests wait ~40 ms for delayed ACKs
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with stub._lock:
+                    stub.connections += 1
+                time.sleep(stub.connect_latency)
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                delay, fail = stub._next_request()
+                time.sleep(delay)
+                if fail and stub.fail_status is None:
+                    self.close_connection = True
+                    return
+                if fail:
+                    self._send(stub.fail_status, {'success': False, 'error': 'stub failure'})
+                    return
+                try:
+                    payload = json.loads(body)
+                    results = stub_results(str(payload['searchTerm']), min(int(payload.get('k', 100)), stub.max_results))
+                except (ValueError, KeyError, TypeError) as e:
+                    self._send(400, {'success': False, 'error': str(e)})
+                    return
+                results = [r for r in results if r['distance'] >= float(payload.get('threshold', 0))]
+                self._send(200, {'success': True, 'results': results})
+
+            def _send(self, status: int, data: dict):
+                blob = json.dumps(data).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(blob)))
+                try:
+                    self.end_headers()
+                    self.wfile.write(blob)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client gave up (e.g. its read timeout) before the response
+                    self.close_connection = True
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = _Server(('127.0.0.1', 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def _next_request(self):
+        """(delay, fail) of the next request."""
+        with self._lock:
+            self.requests += 1
+            fail = self.requests <= self.fail_first or self._rng.random() < self.failure_rate
+            self.failures += fail
+            delay = self.latency + self._rng.uniform(0, self.latency_jitter)
+            if self._rng.random() < self.slow_rate:
+                delay += self.slow_latency
+            return delay, fail
+
+    def __repr__(self) -> str:
+        return (f"SearchStubServer({self.requests} requests, {self.failures} failed, "
+                f"{self.connections} connections)")
+
+# %%
@@ -0,0 +1,263 @@
+# %%
+"""
+Strand seed search pushed down into the local vector index.
+
+Against the search API, seeding over-fetches: it pulls the k=100 nearest
+tweets (excluded keywords as a must_not filter), then drops retweets, quotes
+of the root and tweets missing from the store, sorts by quoted_count and
+keeps `limit`, throwing most results away. SeedFilters keeps those tweet
+fields per index row so the filters become masks applied before the top k:
+
+Layout (<vector index>/seed_filters/, memory-mapped):
+    is_retweet.npy / in_store.npy       bitmaps over index rows (np.packbits)
+    quoted_count.npy                    int64 per row (0 if unknown)
+    quoted_sorted.npy / quoted_row.npy  sorted quoted tweet ids and the rows quoting them
+    token.offsets/.data                 sorted vocabulary of full_text tokens
+    token_offsets.npy / token_rows.npy  rows containing each token (inverted index)
+    meta.json                           rows, tweet store it was built from and its fingerprint
+
+The fields are a snapshot of the tweet store. An incremental update
+(update_caches) changes quoted counts and adds tweets, so get_seed_filters
+compares the store's fingerprint with the one recorded at build time and
+returns None while they differ: seeding falls back to the client-side path
+until build_seed_filters is re-run.
+
+A root's neighbourhood is then the k most similar useful rows, ranked by
+(quoted_count, similarity) as the client-side path ranks them, so `limit`
+seeds come back whenever that many useful tweets pass the threshold.
+"""
+import re
+from pathlib import Path
+from typing import Dict, List, Mapping, Optional, Sequence, Set
+
+import numpy as np
+
+from .array_store import INT_NULL, StringColumn, encode_strings, open_array_dir, write_array_dir
+from .bulk_get import get_many
+from .tweet_store import TweetStore, store_fingerprint
+from .vector_index import VectorIndex
+
+SEED_FILTERS_VERSION = 2
+SEED_FILTERS_DIR = 'seed_filters'
+TOKEN_RE = re.compile(r'\w+')
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens, as indexed for keyword exclusion."""
+    return TOKEN_RE.findall(text.lower())
+
+
+class SeedFilters:
+    """Per-row tweet fields of a VectorIndex for filtered seed search (see search_seeds)."""
+
+    def __init__(self, index: VectorIndex):
+        self.index = index
+        self.path = index.path / SEED_FILTERS_DIR
+        arrays, meta = open_array_dir(self.path)
+        self.meta = meta
+        n = len(index)
+        if meta['rows'] != n:
+            raise ValueError(f"Seed filters in {self.path} cover {meta['rows']} rows, the index has {n}; rebuild them")
+        self.is_retweet = np.unpackbits(arrays['is_retweet'], count=n).astype(bool)
+        self.in_store = np.unpackbits(arrays['in_store'], count=n).astype(bool)
+        self.quoted_count = arrays['quoted_count']
+        self.quoted_sorted = arrays['quoted_sorted']
+        self.quoted_rows = arrays['quoted_row']
+        self.tokens = StringColumn(arrays['token.offsets'], arrays['token.data'])
+        self.token_offsets = arrays['token_offsets']
+        self.token_rows = arrays['token_rows']
+        # Rows any seed may come from
+        self.useful = self.in_store & ~self.is_retweet
+
+    def stale(self) -> Optional[str]:
+        """Why the filters no longer match the tweet store they were built from, None if they do."""
+        if self.meta.get('version') != SEED_FILTERS_VERSION:
+            return f"layout version {self.meta.get('version')}, expected {SEED_FILTERS_VERSION}"
+        store = self.meta.get('tweet_store')
+        if not store:
+            return None  # Built from a plain mapping: nothing to compare with
+        if not Path(store).exists():
+            return f"tweet store {store} is gone"
+        if store_fingerprint(store) != self.meta.get('tweet_store_fingerprint'):
+            return f"tweet store {store} changed since they were built"
+        return None
+
+    def __repr__(self) -> str:
+        return (f"SeedFilters({str(self.path)!r}, {int(self.useful.sum()):,}/{len(self.useful):,} useful rows, "
+                f"{len(self.tokens):,} tokens)")
+
+    def rows_with_token(self, token: str) -> np.ndarray:
+        """Sorted rows whose full_text contains token."""
+        lo, hi = 0, len(self.tokens)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.tokens.get(mid) < token:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self.tokens) and self.tokens.get(lo) == token:
+            return np.asarray(self.token_rows[self.token_offsets[lo]:self.token_offsets[lo + 1]])
+        return np.zeros(0, dtype=np.int64)
+
+    def rows_with_keyword(self, keyword: str) -> np.ndarray:
+        """Sorted rows whose full_text contains every token of keyword."""
+        tokens = tokenize(keyword)
+        if not tokens:
+            return np.zeros(0, dtype=np.int64)
+        rows = self.rows_with_token(tokens[0])
+        for token in tokens[1:]:
+            rows = np.intersect1d(rows, self.rows_with_token(token), assume_unique=True)
+        return rows
+
+    def mask(self, exclude_keywords: Sequence[str] = ()) -> np.ndarray:
+        """Useful rows (in the store, not retweets) without any of exclude_keywords."""
+        mask = self.useful
+        if exclude_keywords:
+            mask = mask.copy()
+            for keyword in exclude_keywords:
+                mask[self.rows_with_keyword(keyword)] = False
+        return mask
+
+    def quotes_of(self, tweet_id: int) -> np.ndarray:
+        """Rows of tweets quoting tweet_id."""
+        lo, hi = np.searchsorted(self.quoted_sorted, tweet_id, side='left'), np.searchsorted(self.quoted_sorted, tweet_id, side='right')
+        return np.asarray(self.quoted_rows[lo:hi])
+
+    def rows_of(self, tweet_id: int) -> np.ndarray:
+        """Every row of tweet_id itself."""
+        ids = self.index.id_sorted
+        lo, hi = np.searchsorted(ids, tweet_id, side='left'), np.searchsorted(ids, tweet_id, side='right')
+        return np.asarray(self.index.id_rows[lo:hi])
+
+    def search_seeds(
+        self,
+        tweet_ids: Sequence[int],
+        texts: Optional[Sequence[Optional[str]]] = None,
+        limit: int = 20,
+        k: int = 100,
+        threshold: float = 0.5,
+        exclude_keywords: Sequence[str] = (),
+        nprobe: Optional[int] = None
+    ) -> List[List[int]]:
+        """
+        Semantic seed tweet ids for each root tweet, best first.
+
+        The query is the root's stored vector (its text as the fallback).
+        Retweets, tweets not in the store, tweets with an excluded keyword,
+        quotes of the root and the root itself are masked out before the k
+        nearest rows >= threshold are taken; those are ranked by quoted_count,
+        then similarity, and the first `limit` returned.
+        """
+        texts = list(texts) if texts is not None else [None] * len(tweet_ids)
+        vectors = self.index.query_vectors(texts, tweet_ids)
+        missing = [t for t, v in zip(tweet_ids, vectors) if v is None]
+        if missing:
+            print(f"[WARN] {len(missing)} root tweets are not in the vector index and no embed_fn is set, e.g. {missing[0]}")
+        excludes = [np.union1d(self.rows_of(t), self.quotes_of(t)) for t in tweet_ids]
+        found = self.index.search_rows(
+            vectors, k, threshold, nprobe=nprobe, mask=self.mask(exclude_keywords), exclude_rows=excludes
+        )
+        seeds = []
+        for rows, scores in found:
+            order = np.lexsort((rows, -scores, -np.asarray(self.quoted_count[rows])))
+            ids = dict.fromkeys(int(t) for t in self.index.tweet_ids[rows[order]])
+            seeds.append(list(ids)[:limit])
+        return seeds
+
+
+def build_seed_filters(index: VectorIndex, tweet_dict: Mapping, chunk_size: int = 50_000) -> SeedFilters:
+    """Write <index>/seed_filters from the tweets of the index rows in tweet_dict (e.g. the TweetStore)."""
+    n = len(index)
+    is_retweet = np.zeros(n, dtype=bool)
+    in_store = np.zeros(n, dtype=bool)
+    quoted_count = np.zeros(n, dtype=np.int64)
+    quoted = np.full(n, INT_NULL, dtype=np.int64)
+    vocab: Dict[str, int] = {}
+    token_ids: List[np.ndarray] = []
+    token_row_ids: List[np.ndarray] = []
+    for lo in range(0, n, chunk_size):
+        ids = np.asarray(index.tweet_ids[lo:lo + chunk_size])
+        tweets = get_many(tweet_dict, [int(t) for t in ids])
+        chunk_tokens: List[int] = []
+        chunk_rows: List[int] = []
+        for j, tweet in enumerate(tweets):
+            if tweet is None or ids[j] == INT_NULL:
+                continue
+            row = lo + j
+            text = tweet.get('full_text') or ''
+            in_store[row] = True
+            is_retweet[row] = text.startswith('RT @')
+            quoted_count[row] = tweet.get('quoted_count') or 0
+            if tweet.get('quoted_tweet_id') is not None:
+                quoted[row] = int(tweet['quoted_tweet_id'])
+            tokens = {vocab.setdefault(token, len(vocab)) for token in tokenize(text)}
+            chunk_tokens.extend(tokens)
+            chunk_rows.extend([row] * len(tokens))
+        token_ids.append(np.asarray(chunk_tokens, dtype=np.int64))
+        token_row_ids.append(np.asarray(chunk_rows, dtype=np.int64))
+
+    # Inverted index: vocabulary in sorted order, rows of each token sorted
+    words = sorted(vocab)
+    rank = np.empty(len(words), dtype=np.int64)
+    rank[[vocab[w] for w in words]] = np.arange(len(words))
+    token_rank = rank[np.concatenate(token_ids)] if token_ids else np.zeros(0, dtype=np.int64)
+    rows = np.concatenate(token_row_ids) if token_row_ids else np.zeros(0, dtype=np.int64)
+    order = np.lexsort((rows, token_rank))
+    token_offsets = np.zeros(len(words) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(token_rank, minlength=len(words)), out=token_offsets[1:])
+
+    store = getattr(tweet_dict, 'backing', tweet_dict)  # under a HotCache
+    if not isinstance(store, TweetStore):
+        print(f"[WARN] Seed filters built from a {type(store).__name__}, not a TweetStore: "
+              f"they can't tell when it changes, rebuild them after updating it")
+
+    import pyarrow as pa
+    vocab_strings = encode_strings(pa.array(words, type=pa.large_string()))
+    quoting = np.flatnonzero(quoted != INT_NULL)
+    quoting = quoting[np.argsort(quoted[quoting], kind='stable')]
+    path = index.path / SEED_FILTERS_DIR
+    write_array_dir(path, {
+        'is_retweet': np.packbits(is_retweet),
+        'in_store': np.packbits(in_store),
+        'quoted_count': quoted_count,
+        'quoted_sorted': quoted[quoting],
+        'quoted_row': quoting,
+        'token.offsets': vocab_strings['offsets'],
+        'token.data': vocab_strings['data'],
+        'token_offsets': token_offsets,
+        'token_rows': rows[order],
+    }, {
+        'version': SEED_FILTERS_VERSION,
+        'rows': n,
+        'tweet_store': str(store.path) if isinstance(store, TweetStore) else '',
+        'tweet_store_fingerprint': store_fingerprint(store.path) if isinstance(store, TweetStore) else None,
+    })
+    filters = SeedFilters(index)
+    _seed_filters[index.path] = filters
+    print(filters)
+    return filters
+
+
+_seed_filters: Dict[Path, SeedFilters] = {}
+_stale_warned: Set[str] = set()
+
+
+def get_seed_filters(index: Optional[VectorIndex]) -> Optional[SeedFilters]:
+    """The seed filters of index (opened on first use), None if they were not built or are stale."""
+    if index is None:
+        return None
+    filters = _seed_filters.get(index.path)
+    if filters is None or filters.index is not index:
+        if not (index.path / SEED_FILTERS_DIR).exists():
+            return None
+        filters = _seed_filters[index.path] = SeedFilters(index)
+    problem = filters.stale()
+    if problem:
+        if problem not in _stale_warned:
+            _stale_warned.add(problem)
+            print(f"[WARN] Seed filters in {filters.path} are stale ({problem}); "
+                  f"searching client-side until build_seed_filters() is re-run")
+        return None
+    return filters
+
+# %%
@@ -1,6 +1,16 @@
 # %%
-from typing import TypedDict, Optional, List
-import requests
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, TypedDict, Optional, List, Sequence, Union
+
+from .search_cache import get_search_cache, search_key
+from .search_session import get_search_session
+from .vector_index import EmbedFn, VectorIndex
+
+if TYPE_CHECKING:
+    from .async_http import AsyncHTTP
 
 
 class RawSearchResultMetadata(TypedDict, total=False):
@@ -25,12 +35,42 @@ class SemanticSearchResult(TypedDict):
     metadata: RawSearchResultMetadata
 
 
+# Directory of a VectorIndex to search instead of the API (see use_local_index)
+SEARCH_INDEX = os.environ.get('SEARCH_INDEX')
+
+_local_index: Optional[VectorIndex] = None
+
+
+def use_local_index(
+    index: Union[VectorIndex, str, Path, None],
+    embed_fn: Optional[EmbedFn] = None
+) -> Optional[VectorIndex]:
+    """Serve search_embeddings from a local VectorIndex (or its directory) instead of the API; None switches back."""
+    global _local_index, SEARCH_INDEX
+    if index is not None and not isinstance(index, VectorIndex):
+        index = VectorIndex(index, embed_fn=embed_fn)
+    elif index is not None and embed_fn is not None:
+        index.embed_fn = embed_fn
+    _local_index = index
+    SEARCH_INDEX = None
+    return index
+
+
+def get_local_index() -> Optional[VectorIndex]:
+    """The VectorIndex searches go to, if any (opened from $SEARCH_INDEX on first use)."""
+    if _local_index is None and SEARCH_INDEX:
+        use_local_index(SEARCH_INDEX)
+    return _local_index
+
+
 def search_embeddings(
     search_term: str,
     k: int = 100,
     threshold: float = 0.5,
     exclude_tweet_id: Optional[str] = None,
-    filter: Optional[dict] = None
+    filter: Optional[dict] = None,
+    use_cache: bool = True,
+    tweet_id: Optional[int] = None
 ) -> List[SemanticSearchResult]:
     """Search embeddings for semantically similar tweets.
     
@@ -45,12 +85,98 @@ def search_embeddings(
                     "should": [...],    # OR - at least one condition must match
                     "must_not": [...]   # NOT - none of the conditions must match
                 }
+        use_cache: Serve repeated searches from the persistent search cache
+                (see get_search_cache(); raises SearchCacheMiss on a miss when offline)
+        tweet_id: Tweet whose text search_term is. A local index searches with
+                the tweet's stored embedding (search_term only if it has none)
+                instead of re-embedding the text; the API only takes text
         
     Returns:
         List of search results with key, distance, and metadata
+
+    Raises:
+        SearchAPIError: The API failed (after retrying transient errors on the
+                pooled session, see get_search_session()); failures are not cached
+
+    With a local index set (use_local_index or $SEARCH_INDEX) the search runs
+    on it instead, uncached; distance is then the cosine similarity.
     """
-    url = 'http://embed.tweetstack.app/embeddings/search'
-    
+    index = get_local_index()
+    if index is not None:
+        results = index.search(search_term, k=k, threshold=threshold, filter=filter, tweet_id=tweet_id)
+        return _search_results(results, exclude_tweet_id)
+    cache = get_search_cache() if use_cache else None
+    key = search_key(search_term, k, threshold, filter)
+    raw_results = cache.get(key) if cache is not None else None
+    if raw_results is None:
+        if cache is not None:
+            cache.count_network_call()
+        raw_results = get_search_session().search(_search_payload(search_term, k, threshold, filter))
+        if cache is not None:
+            cache.set(key, raw_results)
+    return _search_results(raw_results, exclude_tweet_id)
+
+
+def search_embeddings_batch(
+    search_terms: Sequence[str],
+    k: int = 100,
+    threshold: float = 0.5,
+    exclude_tweet_ids: Optional[Sequence[Optional[str]]] = None,
+    filter: Optional[dict] = None,
+    use_cache: bool = True,
+    max_workers: int = 4,
+    tweet_ids: Optional[Sequence[Optional[int]]] = None
+) -> List[List[SemanticSearchResult]]:
+    """search_embeddings for many terms, one result list per term (in order).
+
+    With a local index this is one pass over the index for all terms
+    (VectorIndex.search_batch). The API takes one term per request, so
+    otherwise the terms are searched on max_workers threads, through the
+    cache; an error raises instead of being returned per term. tweet_ids
+    are as search_embeddings' tweet_id, one per term.
+    """
+    excludes = list(exclude_tweet_ids) if exclude_tweet_ids is not None else [None] * len(search_terms)
+    index = get_local_index()
+    if index is not None:
+        batch = index.search_batch(list(search_terms), k=k, threshold=threshold, filter=filter, tweet_ids=tweet_ids)
+        return [_search_results(results, exclude) for results, exclude in zip(batch, excludes)]
+    with ThreadPoolExecutor(max_workers=max_workers) as ex:
+        return list(ex.map(
+            lambda term, exclude: search_embeddings(term, k, threshold, exclude, filter, use_cache),
+            search_terms, excludes
+        ))
+
+
+async def search_embeddings_async(
+    http: 'AsyncHTTP',
+    search_term: str,
+    k: int = 100,
+    threshold: float = 0.5,
+    exclude_tweet_id: Optional[str] = None,
+    filter: Optional[dict] = None,
+    use_cache: bool = True,
+    tweet_id: Optional[int] = None
+) -> List[SemanticSearchResult]:
+    """search_embeddings over the shared AsyncHTTP client, with the same cache, retries and results."""
+    index = get_local_index()
+    if index is not None:
+        results = await asyncio.to_thread(
+            index.search, search_term, k=k, threshold=threshold, filter=filter, tweet_id=tweet_id
+        )
+        return _search_results(results, exclude_tweet_id)
+    cache = get_search_cache() if use_cache else None
+    key = search_key(search_term, k, threshold, filter)
+    raw_results = cache.get(key) if cache is not None else None
+    if raw_results is None:
+        if cache is not None:
+            cache.count_network_call()
+        raw_results = await get_search_session().search_async(http, _search_payload(search_term, k, threshold, filter))
+        if cache is not None:
+            cache.set(key, raw_results)
+    return _search_results(raw_results, exclude_tweet_id)
+
+
+def _search_payload(search_term: str, k: int, threshold: float, filter: Optional[dict]) -> dict:
     payload = {
         'searchTerm': search_term,
         'k': k,
@@ -59,23 +185,10 @@ def search_embeddings(
     
     if filter is not None:
         payload['filter'] = filter
-    
-    response = requests.post(
-        url,
-        json=payload,
-        headers={'Content-Type': 'application/json'}
-    )
-    
-    if not response.ok:
-        print(f'Search API error: {response.text}')
-        return []
-    
-    data = response.json()
-    if not data.get('success') or not isinstance(data.get('results'), list):
-        return []
-    
-    raw_results: List[RawSearchResult] = data['results']
-    
+    return payload
+
+
+def _search_results(raw_results: List[RawSearchResult], exclude_tweet_id: Optional[str]) -> List[SemanticSearchResult]:
     # Filter out base tweet if provided
     if exclude_tweet_id:
         raw_results = [
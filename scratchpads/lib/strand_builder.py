@@ -1,16 +1,23 @@
 # %%
+import json
+import os
+import threading
 import time
 from dataclasses import dataclass
-from typing import Dict, List, Literal, Optional, Set, Tuple
+from pathlib import Path
+from typing import Dict, Iterable, List, Literal, Optional, Set, Tuple, Union
 
 from .conversation_explorer import (
-    ConversationTree, EnrichedTweet, 
-    filter_conversation_trees, render_conversation_trees,
+    ConversationTree, EnrichedTweet, RenderFragments,
+    filter_conversation_trees, filter_conversation_trees_batch,
+    iter_conversation_trees, render_conversation_trees,
     strand_header_print_factory, print_conversation_threads
 )
-from .semantic_search import search_embeddings
+from .seed_search import get_seed_filters
+from .semantic_search import SemanticSearchResult, get_local_index, search_embeddings, search_embeddings_batch
+from .bulk_get import get_many
 from .image_describer import MediaDescription, get_image_descriptions_batch
-from .parallel import parallel_map_to_dict
+from .parallel import PipelineMetrics, PipelineStage, batch_keys, parallel_map_to_dict, process_map_ordered, run_pipeline
 
 # %%
 @dataclass
@@ -33,16 +40,63 @@ def _semantic_search_for_strands(
     if not tweet:
         return []
     
-    filter_obj = {"must_not": [{"key": "text", "match": {"text": kw}} for kw in exclude_keywords]} if exclude_keywords else None
-    
     start_time = time.time()
-    results = search_embeddings(tweet['full_text'], k=k, threshold=threshold, exclude_tweet_id=str(tweet_id), filter=filter_obj)
+    pushed_down = _pushdown_semantic_results([tweet_id], tweet_dict, exclude_keywords, limit, k, threshold)
+    if pushed_down is not None:
+        if debug:
+            print(f"[DEBUG] Filtered seed search completed in {time.time() - start_time:.3f}s, found {len(pushed_down[tweet_id])} results")
+        return pushed_down[tweet_id]
+    results = search_embeddings(
+        tweet['full_text'], k=k, threshold=threshold, exclude_tweet_id=str(tweet_id),
+        filter=_keyword_filter(exclude_keywords), tweet_id=tweet_id
+    )
     if debug:
         print(f"[DEBUG] Semantic search completed in {time.time() - start_time:.3f}s, found {len(results)} results")
+    return _filter_semantic_results(tweet_id, results, tweet_dict, limit, debug)
+
+
+def _pushdown_semantic_results(
+    tweet_ids: List[int],
+    tweet_dict: Dict[int, EnrichedTweet],
+    exclude_keywords: List[str],
+    limit: int,
+    k: int,
+    threshold: float
+) -> Optional[Dict[int, List[EnrichedTweet]]]:
+    """
+    _filter_semantic_results of each tweet's search, with the filters applied inside
+    the local index before its top k (see seed_search); None unless the local
+    index has seed filters.
+    """
+    filters = get_seed_filters(get_local_index())
+    if filters is None:
+        return None
+    found = [(tid, t) for tid, t in zip(tweet_ids, get_many(tweet_dict, tweet_ids)) if t]
+    seed_lists = filters.search_seeds(
+        [tid for tid, _ in found], [t['full_text'] for _, t in found],
+        limit=limit, k=k, threshold=threshold, exclude_keywords=exclude_keywords
+    )
+    results: Dict[int, List[EnrichedTweet]] = {tid: [] for tid in tweet_ids}
+    for (tid, _), ids in zip(found, seed_lists):
+        results[tid] = [t for t in get_many(tweet_dict, ids) if t is not None]
+    return results
+
+
+def _keyword_filter(exclude_keywords: List[str]) -> Optional[dict]:
+    return {"must_not": [{"key": "text", "match": {"text": kw}} for kw in exclude_keywords]} if exclude_keywords else None
+
+
+def _filter_semantic_results(
+    tweet_id: int,
+    results: List[SemanticSearchResult],
+    tweet_dict: Dict[int, EnrichedTweet],
+    limit: int,
+    debug: bool = False
+) -> List[EnrichedTweet]:
+    """Search results as tweets, without direct quotes of tweet_id and retweets, top `limit` by quoted_count."""
     start_time = time.time()
     result_ids = [int(r['key']) for r in results]
-    result_dicts = [tweet_dict.get(rid,None) for rid in result_ids]
-    result_dicts = [t for t in result_dicts if t is not None]
+    result_dicts = [t for t in get_many(tweet_dict, result_ids) if t is not None]
     
     # Filter out direct quotes of the seed tweet and retweets
     filtered = [
@@ -54,18 +108,29 @@ def _semantic_search_for_strands(
         print(f"[DEBUG] Filtering completed in {time.time() - start_time:.3f}s, found {len(filtered)} results")
     return sorted(filtered, key=lambda x: x.get('quoted_count', 0) or 0, reverse=True)[:limit]
 
+def _quotes_of(quote_tweets_dict: Dict[int, List[int]], tweet_ids: List[int], quote_depth: int) -> List[Optional[List[int]]]:
+    """Quoting id lists for tweet_ids; quote_depth > 1 follows quote chains (needs a QuoteForest)."""
+    if quote_depth == 1:
+        return get_many(quote_tweets_dict, tweet_ids)
+    if not hasattr(quote_tweets_dict, 'quoters_many'):
+        raise ValueError("quote_depth > 1 needs a QuoteForest as quote_tweets_dict (see get_quote_forest())")
+    return quote_tweets_dict.get_many(tweet_ids, None, depth=quote_depth)
+
+
 def get_strand_seeds(
     tweet_id: int,
     tweet_dict: Dict[int, EnrichedTweet],
     quote_tweets_dict: Dict[int, List[int]],
     exclude_keywords: List[str] = [],
     semantic_limit: int = 20,
-    debug: bool = False
+    debug: bool = False,
+    quote_depth: int = 1
 ) -> List[StrandSeed]:
     """
     Get all seed tweet IDs belonging to a strand.
     
     Combines: root tweet, quotes of root, semantic search results, quotes of semantic results.
+    With quote_depth > 1 and a QuoteForest, quotes of quotes (and so on) count as quotes too.
     """
     import time
     
@@ -80,13 +145,65 @@ def get_strand_seeds(
     if debug:
         print(f"[DEBUG] Semantic search completed in {time.time() - phase_start:.3f}s, found {len(semantic_results)} results")
     
+    deduped_seeds = _seeds_from_results(tweet_id, semantic_results, quote_tweets_dict, quote_depth, debug)
+    if debug:
+        print(f"[DEBUG] Total time: {time.time() - start_time:.3f}s, final seed count: {len(deduped_seeds)}")
+    
+    return deduped_seeds
+
+
+def get_strand_seeds_batch(
+    tweet_ids: List[int],
+    tweet_dict: Dict[int, EnrichedTweet],
+    quote_tweets_dict: Dict[int, List[int]],
+    exclude_keywords: List[str] = [],
+    semantic_limit: int = 20,
+    quote_depth: int = 1,
+    k: int = 100,
+    threshold: float = 0.5
+) -> Dict[int, List[StrandSeed]]:
+    """
+    get_strand_seeds for many tweets, with one search_embeddings_batch call for all of them.
+
+    With a local index that is a single pass over the embeddings instead of
+    one search per tweet, with filtering pushed into it if it has seed filters.
+    Tweets missing from tweet_dict get only their root seed.
+    """
+    tweet_ids = list(dict.fromkeys(tweet_ids))
+    semantic = _pushdown_semantic_results(tweet_ids, tweet_dict, exclude_keywords, semantic_limit, k, threshold)
+    if semantic is None:
+        found = [(tid, t) for tid, t in zip(tweet_ids, get_many(tweet_dict, tweet_ids)) if t]
+        batch = search_embeddings_batch(
+            [t['full_text'] for _, t in found], k=k, threshold=threshold,
+            exclude_tweet_ids=[str(tid) for tid, _ in found], filter=_keyword_filter(exclude_keywords),
+            tweet_ids=[tid for tid, _ in found]
+        )
+        semantic = {
+            tid: _filter_semantic_results(tid, results, tweet_dict, semantic_limit)
+            for (tid, _), results in zip(found, batch)
+        }
+    return {
+        tid: _seeds_from_results(tid, semantic.get(tid, []), quote_tweets_dict, quote_depth)
+        for tid in tweet_ids
+    }
+
+
+def _seeds_from_results(
+    tweet_id: int,
+    semantic_results: List[EnrichedTweet],
+    quote_tweets_dict: Dict[int, List[int]],
+    quote_depth: int = 1,
+    debug: bool = False
+) -> List[StrandSeed]:
+    """Root, semantic results and the quotes of both as deduped seeds (the part of get_strand_seeds after the search)."""
     # Phase 2: Build seeds list
     if debug:
         phase_start = time.time()
     seeds = [StrandSeed(tweet_id=tweet_id, source_type='root')]
     
-    # Quotes of root
-    root_quotes = quote_tweets_dict.get(tweet_id, [])
+    # Quotes of root and of every semantic result, in one batched read
+    quote_lists = _quotes_of(quote_tweets_dict, [tweet_id] + [t['tweet_id'] for t in semantic_results], quote_depth)
+    root_quotes = quote_lists[0] or []
     seeds.extend(
         StrandSeed(tweet_id=qid, source_type='quote_of_root')
         for qid in root_quotes
@@ -97,11 +214,11 @@ def get_strand_seeds(
     # Phase 3: Semantic search results and their quotes
     if debug:
         phase_start = time.time()
-    for t in semantic_results:
+    for t, quotes in zip(semantic_results, quote_lists[1:]):
         seeds.append(StrandSeed(tweet_id=t['tweet_id'], source_type='semantic_search'))
         seeds.extend(
             StrandSeed(tweet_id=qid, source_type='quote_of_semantic_search')
-            for qid in quote_tweets_dict.get(t['tweet_id'], [])
+            for qid in quotes or []
         )
     if debug:
         print(f"[DEBUG] Added semantic results and their quotes in {time.time() - phase_start:.3f}s")
@@ -118,7 +235,6 @@ def get_strand_seeds(
             deduped_seeds.append(seed)
     if debug:
         print(f"[DEBUG] Deduplication completed in {time.time() - phase_start:.3f}s, removed {pre_dedupe_count - len(deduped_seeds)} duplicates")
-        print(f"[DEBUG] Total time: {time.time() - start_time:.3f}s, final seed count: {len(deduped_seeds)}")
     
     return deduped_seeds
 
@@ -145,8 +261,47 @@ def get_strand_conversation_string(
 @dataclass
 class StrandBuildResult:
     tweet_id: int
-    thread_text: str
+    thread_text: Optional[str]  # None when streamed to a strands dir
     seed_ids: List[int]
+    path: Optional[Path] = None  # the strand file, when streamed and non-empty
+
+
+def write_strand_json(
+    path: Union[str, Path],
+    tweet_id: int,
+    lines: Iterable[str],
+    seed_ids: List[int]
+) -> bool:
+    """
+    Stream a strand file without building its text in memory.
+    
+    The file is byte-identical to json.dump({"tweet_id", "thread_text",
+    "seed_ids"}, f, indent=2) with thread_text = "\\n".join(lines). Lines are
+    escaped one at a time as they arrive (e.g. from iter_conversation_trees).
+    Blank strands are not saved, as in the strand scripts.
+    
+    Returns:
+        True if the file was written, False if the text was blank
+    """
+    path = Path(path)
+    head, tail = json.dumps(
+        {"tweet_id": tweet_id, "thread_text": "", "seed_ids": seed_ids}, indent=2
+    ).split('"thread_text": ""', 1)
+    tmp_path = path.with_name(path.name + ".tmp")
+    blank = True
+    with open(tmp_path, "w") as f:
+        f.write(head + '"thread_text": "')
+        for i, line in enumerate(lines):
+            if i:
+                f.write("\\n")
+            f.write(json.dumps(line)[1:-1])
+            blank = blank and not line.strip()
+        f.write('"' + tail)
+    if blank:
+        tmp_path.unlink()
+        return False
+    os.replace(tmp_path, path)
+    return True
 
 
 def extract_tree_tweet_ids(filtered_trees: Dict[int, ConversationTree]) -> Set[int]:
@@ -163,13 +318,91 @@ def extract_tree_tweet_ids(filtered_trees: Dict[int, ConversationTree]) -> Set[i
     return all_ids
 
 
+def _render_strand(
+    tid: int,
+    trees: Dict[int, ConversationTree],
+    seed_info: Dict[int, str],
+    tweet_dict: Dict[int, EnrichedTweet],
+    image_cache: Dict[int, List[MediaDescription]],
+    fragments: RenderFragments,
+    strands_dir: Optional[Union[str, Path]] = None
+) -> StrandBuildResult:
+    """Phase 4 for one strand: its text, or its file under strands_dir."""
+    render_header = strand_header_print_factory(seed_info)
+    seed_ids = list(seed_info)
+    if strands_dir is not None:
+        path = Path(strands_dir) / f"{tid}.json"
+        lines = iter_conversation_trees(trees, tweet_dict, render_header, image_cache, fragments)
+        saved = write_strand_json(path, tid, lines, seed_ids)
+        return StrandBuildResult(tid, None, seed_ids, path if saved else None)
+    text = render_conversation_trees(trees, tweet_dict, render_header, image_cache, fragments)
+    return StrandBuildResult(tid, text, seed_ids)
+
+
+def _render_strands_chunk(
+    tasks: List[Tuple[int, Dict[int, ConversationTree], Dict[int, str], Dict[int, List[MediaDescription]]]],
+    context: Tuple[Dict[int, EnrichedTweet], Optional[Union[str, Path]]]
+) -> List[StrandBuildResult]:
+    """Render worker: a chunk of (tid, trees, seed_info, the trees' image descriptions), one RenderFragments per chunk."""
+    tweet_dict, strands_dir = context
+    images: Dict[int, List[MediaDescription]] = {}
+    for task in tasks:
+        images.update(task[3])
+    fragments = RenderFragments(tweet_dict, images)
+    return [
+        _render_strand(tid, trees, seed_info, tweet_dict, images, fragments, strands_dir)
+        for tid, trees, seed_info, _ in tasks
+    ]
+
+
+def render_strands(
+    to_render: List[Tuple[int, Dict[int, ConversationTree], Dict[int, str]]],
+    tweet_dict: Dict[int, EnrichedTweet],
+    image_cache: Dict[int, List[MediaDescription]],
+    strands_dir: Optional[Union[str, Path]] = None,
+    render_workers: int = 0,
+    render_chunk_size: int = 16
+) -> Dict[int, StrandBuildResult]:
+    """
+    Phase 4: render (tid, filtered trees, seed_info) strands, in input order.
+    
+    With render_workers > 1 the strands are rendered in a process pool,
+    render_chunk_size per task. Workers get tweet_dict once (the tweet store
+    pickles by path, so they map the same files) and each task only the image
+    descriptions of its own trees, never the whole image cache. Each process
+    formats a tweet once per chunk (RenderFragments); output is identical to
+    the serial path.
+    
+    Returns:
+        StrandBuildResult by tweet_id, in the order of to_render
+    """
+    if strands_dir is not None:
+        Path(strands_dir).mkdir(parents=True, exist_ok=True)
+    if render_workers > 1 and len(to_render) > 1:
+        tasks = [
+            (tid, trees, seed_info, {t: image_cache[t] for t in extract_tree_tweet_ids(trees) if t in image_cache})
+            for tid, trees, seed_info in to_render
+        ]
+        rendered = process_map_ordered(
+            batch_keys(tasks, render_chunk_size), _render_strands_chunk, (tweet_dict, strands_dir),
+            max_workers=render_workers, desc="Phase 4: Render"
+        )
+        return {r.tweet_id: r for chunk in rendered for r in chunk}
+    fragments = RenderFragments(tweet_dict, image_cache)
+    return {
+        tid: _render_strand(tid, trees, seed_info, tweet_dict, image_cache, fragments, strands_dir)
+        for tid, trees, seed_info in to_render
+    }
+
+
 def build_strand_single(
     tid: int,
     tweet_dict: Dict[int, EnrichedTweet],
     quote_dict: Dict[int, List[int]],
     conversation_trees: Dict[int, ConversationTree],
     image_cache: Dict[int, List[MediaDescription]],
-    depth: int = 10
+    depth: int = 10,
+    quote_depth: int = 1
 ) -> Tuple[StrandBuildResult, Dict[int, List[MediaDescription]]]:
     """
     Build a single strand. Returns (result, new_image_cache_entries).
@@ -177,7 +410,7 @@ def build_strand_single(
     For batch processing, use build_strands_phased instead.
     """
     # Phase 1: Seeds
-    seeds = get_strand_seeds(tid, tweet_dict, quote_dict, debug=False)
+    seeds = get_strand_seeds(tid, tweet_dict, quote_dict, debug=False, quote_depth=quote_depth)
     seed_ids = [s.tweet_id for s in seeds]
     seed_info = {s.tweet_id: s.source_type for s in seeds}
     
@@ -208,43 +441,71 @@ def build_strands_phased(
     depth: int = 10,
     seeds_workers: int = 4,
     trees_workers: int = 8,
-    images_workers: int = 2
+    images_workers: int = 2,
+    quote_depth: int = 1,
+    trees_batch_size: int = 32,
+    strands_dir: Optional[Union[str, Path]] = None,
+    render_workers: int = 0,
+    render_chunk_size: int = 16
 ) -> Tuple[Dict[int, StrandBuildResult], Dict[int, List[MediaDescription]]]:
     """
     Build multiple strands using phase-level parallelism.
     
     Each phase completes before the next starts:
-    1. Seeds (IO-bound, moderate concurrency)
-    2. Filter trees (CPU-bound, high concurrency)
+    1. Seeds (IO-bound, seeds_workers threads; with a local vector index,
+       one batched search for all tweets instead, see get_strand_seeds_batch,
+       and seeds_workers only applies if that batch fails and its tweets are
+       retried one at a time)
+    2. Filter trees (CPU-bound, high concurrency, trees_batch_size strands per task
+       so strands sharing a conversation share its tree walk)
     3. Image descriptions (IO-bound, low concurrency for rate limits)
-    4. Render (CPU-bound, sequential)
+    4. Render (CPU-bound, see render_strands): in this process, or with
+       render_workers > 1 in a process pool; results keep the order of tweet_ids
+    
+    With strands_dir, Phase 4 streams each non-empty strand to
+    strands_dir/<tweet_id>.json (write_strand_json) instead of returning its
+    text: results then have thread_text None and path set for saved strands.
+    
+    quote_depth > 1 follows quote chains when quote_dict is a QuoteForest.
     
     Returns:
         Tuple of (results_dict keyed by tweet_id, updated_image_cache)
     """
-    # Phase 1: Get seeds for all tweet_ids
+    # Phase 1: Get seeds for all tweet_ids (one batched search with a local index)
     def get_seeds_for_tid(tid: int) -> List[StrandSeed]:
-        return get_strand_seeds(tid, tweet_dict, quote_dict, debug=False)
+        return get_strand_seeds(tid, tweet_dict, quote_dict, debug=False, quote_depth=quote_depth)
     
-    seeds_by_tid, seeds_failed = parallel_map_to_dict(
-        tweet_ids, get_seeds_for_tid,
-        max_workers=seeds_workers, desc="Phase 1: Seeds"
-    )
+    seeds_by_tid: Optional[Dict[int, List[StrandSeed]]] = None
+    seeds_failed: List[int] = []
+    if get_local_index() is not None:
+        try:
+            seeds_by_tid = get_strand_seeds_batch(tweet_ids, tweet_dict, quote_dict, quote_depth=quote_depth)
+        except Exception as e:
+            # Retry one at a time below, so a bad root only fails its own strand
+            print(f"[WARN] Batched seed search failed ({type(e).__name__}: {e}), retrying tweets one at a time")
+    if seeds_by_tid is None:
+        seeds_by_tid, seeds_failed = parallel_map_to_dict(
+            tweet_ids, get_seeds_for_tid,
+            max_workers=seeds_workers, desc="Phase 1: Seeds"
+        )
     
-    # Phase 2: Filter trees for all
-    def filter_trees_for_tid(tid: int) -> Dict[int, ConversationTree]:
-        seeds = seeds_by_tid.get(tid, [])
-        seed_ids = [s.tweet_id for s in seeds]
-        return filter_conversation_trees(
-            seed_ids, conversation_trees, tweet_dict,
+    # Phase 2: Filter trees for all, a batch of strands per task
+    batches = batch_keys([t for t in tweet_ids if t not in seeds_failed], trees_batch_size)
+    
+    def filter_trees_for_batch(i: int) -> Dict[int, Dict[int, ConversationTree]]:
+        return filter_conversation_trees_batch(
+            {tid: [s.tweet_id for s in seeds_by_tid.get(tid, [])] for tid in batches[i]},
+            conversation_trees, tweet_dict,
             depth=depth, depth_up=depth, depth_from_root=depth
         )
     
-    trees_by_tid, trees_failed = parallel_map_to_dict(
-        [t for t in tweet_ids if t not in seeds_failed],
-        filter_trees_for_tid,
+    trees_by_batch, failed_batches = parallel_map_to_dict(
+        list(range(len(batches))),
+        filter_trees_for_batch,
         max_workers=trees_workers, desc="Phase 2: Filter trees"
     )
+    trees_by_tid = {tid: trees for batch in trees_by_batch.values() for tid, trees in batch.items()}
+    trees_failed = [tid for i in failed_batches for tid in batches[i]]
     
     # Phase 3: Batch collect + dedupe + fetch images
     all_tree_tids: Set[int] = set()
@@ -257,21 +518,16 @@ def build_strands_phased(
     )
     merged_cache = {**image_cache, **new_images}
     
-    # Phase 4: Render all (sequential, fast)
-    results: Dict[int, StrandBuildResult] = {}
-    for tid in tweet_ids:
-        if tid in seeds_failed or tid in trees_failed:
-            continue
-        
-        seeds = seeds_by_tid.get(tid, [])
-        trees = trees_by_tid.get(tid, {})
-        seed_info = {s.tweet_id: s.source_type for s in seeds}
-        seed_ids = [s.tweet_id for s in seeds]
-        
-        render_header = strand_header_print_factory(seed_info)
-        text = render_conversation_trees(trees, tweet_dict, render_header, merged_cache)
-        
-        results[tid] = StrandBuildResult(tid, text, seed_ids)
+    # Phase 4: Render all
+    to_render = [
+        (tid, trees_by_tid.get(tid, {}), {s.tweet_id: s.source_type for s in seeds_by_tid.get(tid, [])})
+        for tid in tweet_ids
+        if tid not in seeds_failed and tid not in trees_failed
+    ]
+    results = render_strands(
+        to_render, tweet_dict, merged_cache, strands_dir,
+        render_workers=render_workers, render_chunk_size=render_chunk_size
+    )
     
     failed_count = len(seeds_failed) + len(trees_failed)
     if failed_count:
@@ -280,4 +536,108 @@ def build_strands_phased(
     return results, merged_cache
 
 
+class _SharedImages:
+    """Image descriptions for concurrently running strands, each tweet fetched at most once per run."""
+
+    def __init__(self, image_cache: Dict[int, List[MediaDescription]], max_workers: int):
+        self.cache = dict(image_cache)
+        self.new: Dict[int, List[MediaDescription]] = {}
+        self.max_workers = max_workers
+        self._done: Set[int] = set(self.cache)
+        self._claimed: Set[int] = set(self.cache)
+        self._cond = threading.Condition()
+
+    def fetch(self, tweet_ids: Iterable[int]) -> None:
+        """Fetch what no other strand has claimed, then wait for the rest."""
+        tweet_ids = list(tweet_ids)
+        with self._cond:
+            mine = [t for t in tweet_ids if t not in self._claimed]
+            self._claimed.update(mine)
+        new = {}
+        try:
+            if mine:
+                new = get_image_descriptions_batch(mine, {}, max_workers=self.max_workers)
+        finally:
+            with self._cond:
+                self.cache.update(new)
+                self.new.update(new)
+                self._done.update(mine)
+                self._cond.notify_all()
+        with self._cond:
+            self._cond.wait_for(lambda: all(t in self._done for t in tweet_ids))
+
+
+def build_strands_pipelined(
+    tweet_ids: List[int],
+    tweet_dict: Dict[int, EnrichedTweet],
+    quote_dict: Dict[int, List[int]],
+    conversation_trees: Dict[int, ConversationTree],
+    image_cache: Dict[int, List[MediaDescription]],
+    depth: int = 10,
+    seeds_workers: int = 4,
+    trees_workers: int = 2,
+    images_workers: int = 2,
+    render_workers: int = 1,
+    quote_depth: int = 1,
+    trees_batch_size: int = 32,
+    queue_size: int = 16,
+    strands_dir: Optional[Union[str, Path]] = None
+) -> Tuple[Dict[int, StrandBuildResult], Dict[int, List[MediaDescription]], PipelineMetrics]:
+    """
+    Build multiple strands as a pipeline instead of barrier-synchronised phases.
+    
+    Each strand moves seeds -> filter trees -> images -> render (+ persist to
+    strands_dir) as soon as its previous stage is done, so one slow semantic
+    search no longer holds up every other strand. Stages are threads
+    (*_workers per stage) joined by queues of queue_size: a full queue stalls
+    the stage before it. Filtering takes whatever strands are queued, up to
+    trees_batch_size, in one filter_conversation_trees_batch call. Images are
+    fetched once per tweet even when strands needing it run concurrently, and
+    render threads share one RenderFragments.
+    
+    Output is the same as build_strands_phased's for the same inputs.
+    
+    Returns:
+        Tuple of (results keyed by tweet_id in tweet_ids order, updated image
+        cache, PipelineMetrics with time to first strand and throughput)
+    """
+    images = _SharedImages(image_cache, images_workers)
+    fragments = RenderFragments(tweet_dict, images.cache)
+    if strands_dir is not None:
+        Path(strands_dir).mkdir(parents=True, exist_ok=True)
+
+    def seeds_stage(tid: int, _) -> List[StrandSeed]:
+        return get_strand_seeds(tid, tweet_dict, quote_dict, debug=False, quote_depth=quote_depth)
+
+    def trees_stage(batch: List[Tuple[int, List[StrandSeed]]]) -> Dict[int, tuple]:
+        trees = filter_conversation_trees_batch(
+            {tid: [s.tweet_id for s in seeds] for tid, seeds in batch},
+            conversation_trees, tweet_dict,
+            depth=depth, depth_up=depth, depth_from_root=depth
+        )
+        return {tid: (seeds, trees[tid]) for tid, seeds in batch}
+
+    def images_stage(tid: int, seeds_and_trees: tuple) -> tuple:
+        images.fetch(extract_tree_tweet_ids(seeds_and_trees[1]))
+        return seeds_and_trees
+
+    def render_stage(tid: int, seeds_and_trees: tuple) -> StrandBuildResult:
+        seeds, trees = seeds_and_trees
+        seed_info = {s.tweet_id: s.source_type for s in seeds}
+        return _render_strand(tid, trees, seed_info, tweet_dict, images.cache, fragments, strands_dir)
+
+    results, failed, metrics = run_pipeline(tweet_ids, [
+        PipelineStage("seeds", seeds_stage, seeds_workers, queue_size),
+        PipelineStage("trees", trees_stage, trees_workers, queue_size, batch_size=trees_batch_size),
+        PipelineStage("images", images_stage, images_workers, queue_size),
+        PipelineStage("render", render_stage, render_workers, queue_size),
+    ], desc="Strands")
+    
+    if failed:
+        print(f"[WARN] {len(failed)} strands failed ({metrics.failed})")
+    print(f"First strand after {metrics.first_output or 0:.2f}s, {metrics.throughput:.2f} strands/s")
+    
+    return results, images.cache, metrics
+
+
 # %%
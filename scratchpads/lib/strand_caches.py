@@ -2,16 +2,22 @@
 import os
 import joblib
 from pathlib import Path
-from typing import Dict, List, Optional, Union
+from typing import Dict, List, Mapping, Optional
 
 from diskcache import Cache
 
-from lib.conversation_explorer import (
-    ConversationTree,
-    EnrichedTweet,
-    build_conversation_trees,
-    build_incomplete_conversation_trees,
-)
+from lib.array_store import read_meta
+from lib.bulk_get import BulkCache
+from lib.cache_builder import build_caches
+from lib.cache_delta import apply_delta, recover_ingest
+from lib.cache_manifest import recorded_source, stamp_store, validate_store
+from lib.conversation_explorer import ConversationTree, EnrichedTweet
+from lib.conversation_forest import FOREST_VERSION, ConversationForest
+from lib.hot_cache import HotCache
+from lib.quote_forest import QUOTE_FOREST_VERSION, QuoteForest, write_quote_forest
+from lib.quote_index import QUOTE_INDEX_VERSION, QuoteIndex
+from lib.tweet_record import TweetRecord
+from lib.tweet_store import STORE_VERSION, TweetStore
 
 SCRATCHPADS_DIR = Path(__file__).parent.parent
 
@@ -26,125 +32,278 @@ TWEET_DICT_DISKCACHE = SCRATCHPADS_DIR / 'tweet_dict.diskcache'
 REPLY_TREES_DISKCACHE = SCRATCHPADS_DIR / 'reply_trees.diskcache'
 QUOTE_TWEETS_DISKCACHE = SCRATCHPADS_DIR / 'quote_tweets.diskcache'
 
+# Columnar memory-mapped stores
+TWEET_STORE_DIR = SCRATCHPADS_DIR / 'tweet_store'
+REPLY_FOREST_DIR = SCRATCHPADS_DIR / 'reply_forest'
+QUOTE_INDEX_DIR = SCRATCHPADS_DIR / 'quote_index'
+QUOTE_FOREST_DIR = SCRATCHPADS_DIR / 'quote_forest'
+INGEST_MANIFEST = SCRATCHPADS_DIR / 'ingest_manifest.json'
+
+# Store name -> (directory, layout version), for validation and targeted rebuilds
+CACHE_STORES = {
+    'tweet_store': (TWEET_STORE_DIR, STORE_VERSION),
+    'reply_forest': (REPLY_FOREST_DIR, FOREST_VERSION),
+    'quote_index': (QUOTE_INDEX_DIR, QUOTE_INDEX_VERSION),
+    'quote_forest': (QUOTE_FOREST_DIR, QUOTE_FOREST_VERSION),
+}
+
 DEFAULT_PARQUET_PATH = os.environ.get(
     'ENRICHED_TWEETS_PATH',
     str(Path.home() / 'data' / 'enriched_tweets.parquet')
 )
 
-_tweet_dict: Optional[Cache] = None
-_reply_trees: Optional[Cache] = None
-_quote_tweets_dict: Optional[Cache] = None
+# In-process LRU budgets in front of the stores (0 disables)
+HOT_TWEETS_MB = int(os.environ.get('HOT_TWEETS_MB', 256))
+HOT_TREES_MB = int(os.environ.get('HOT_TREES_MB', 256))
 
+_tweet_dict: Optional[Mapping[int, EnrichedTweet]] = None
+_reply_trees: Optional[Mapping[int, ConversationTree]] = None
+_quote_tweets_dict: Optional[Mapping[int, List[int]]] = None
+_quote_forest: Optional[QuoteForest] = None
 
-def generate_caches(parquet_path: Optional[str] = None) -> None:
-    """Generate tweet_dict and reply_trees caches from enriched_tweets parquet."""
-    import pandas as pd
-    from lib.count_quotes import count_quotes
-    
+
+def _resolve_parquet_path(parquet_path: Optional[str]) -> Path:
     path = Path(parquet_path or DEFAULT_PARQUET_PATH).expanduser()
     if not path.exists():
         raise FileNotFoundError(f"Parquet file not found: {path}")
+    return path
+
+
+def generate_tweet_store(parquet_path: Optional[str] = None) -> None:
+    """Generate only the columnar tweet store (e.g. when diskcache stores already exist)."""
+    build_caches(_resolve_parquet_path(parquet_path), TWEET_STORE_DIR)
+
+
+def generate_caches(parquet_path: Optional[str] = None, batch_size: int = 65_536) -> Dict[str, dict]:
+    """
+    Generate tweet store, reply forest, quote index and quote forest from enriched_tweets parquet.
     
-    print(f"Loading tweets from {path}...")
-    tweets = pd.read_parquet(path, dtype_backend='pyarrow')
-    tweets = tweets.set_index('tweet_id', drop=False)
+    Streams the parquet in record batches straight into the stores (see
+    lib/cache_builder.py), so no joblib files or migrate_to_diskcache() step are needed.
     
-    # Quoted counts
-    if QUOTED_COUNTS_CACHE.exists():
-        print("Loading quoted counts from cache...")
-        quoted_counts = pd.read_parquet(QUOTED_COUNTS_CACHE)
-    else:
-        print("Calculating quoted counts...")
-        quoted_counts = count_quotes(tweets)
-        quoted_counts = quoted_counts.groupby('quoted_tweet_id', as_index=False)['quoted_count'].sum()
-        quoted_counts.to_parquet(QUOTED_COUNTS_CACHE)
-    
-    tweets = tweets.merge(
-        quoted_counts,
-        left_index=True,
-        right_on='quoted_tweet_id',
-        how='left',
-        suffixes=('', '_drop')
+    Returns:
+        Per-stage rows/sec stats
+    """
+    global _tweet_dict, _reply_trees, _quote_tweets_dict, _quote_forest
+    path = _resolve_parquet_path(parquet_path)
+    stats = build_caches(
+        path, TWEET_STORE_DIR, REPLY_FOREST_DIR, QUOTE_INDEX_DIR, INGEST_MANIFEST,
+        batch_size=batch_size, quote_forest_dir=QUOTE_FOREST_DIR,
     )
-    tweets = tweets.drop(columns=['quoted_tweet_id_drop'], errors='ignore')
-    tweets['quoted_count'] = tweets['quoted_count'].fillna(0).astype(int)
-    if tweets.index.name == 'index':
-        tweets = tweets.reset_index(drop=False)
-    tweets = tweets.set_index('tweet_id', drop=False)
-    tweets.index.name = 'index'
-    
-    print("Converting to list of dicts...")
-    tweets_list = tweets.to_dict(orient='records')
-    del tweets
-    
-    print("Building conversation trees...")
-    conversation_tweets = [t for t in tweets_list if t['conversation_id'] is not None]
-    trees = build_conversation_trees(conversation_tweets)
-    
-    non_conv_tweets = [t for t in tweets_list if t['conversation_id'] is None]
-    incomplete_trees = build_incomplete_conversation_trees(non_conv_tweets, [])
-    
-    complete_reply_trees = {**trees, **incomplete_trees}
-    tweet_dict = {t['tweet_id']: t for t in tweets_list}
-    quote_tweets_dict: Dict[int, List[int]] = {}
-    for tweet in tweet_dict.values():
-        quoted_id = tweet.get('quoted_tweet_id')
-        if quoted_id is not None:
-            quote_tweets_dict.setdefault(quoted_id, []).append(tweet['tweet_id'])
-    
-    print("Saving caches...")
-    joblib.dump(tweet_dict, TWEET_DICT_CACHE, compress=0)
-    joblib.dump(complete_reply_trees, REPLY_TREES_CACHE, compress=0)
-    joblib.dump(quote_tweets_dict, QUOTE_TWEETS_DICT_CACHE, compress=0)
-    
+    _tweet_dict = _reply_trees = _quote_tweets_dict = _quote_forest = None
     print(f"Caches saved to {SCRATCHPADS_DIR}")
+    return stats
+
+
+def update_caches(parquet_path: Optional[str] = None) -> int:
+    """
+    Delta mode: ingest only the tweets of a new parquet drop that aren't cached yet.
+    
+    Updates the tweet store (new delta segment + in-place quoted_count), the quote
+    index, the quote forest (if generated) and the affected reply trees, all or
+    nothing (see cache_delta.apply_delta). The legacy tweet_dict/reply_trees
+    diskcaches are not updated. Run generate_caches() to compact deltas into a full rebuild.
+    
+    Returns:
+        Number of new tweets ingested
+    """
+    global _tweet_dict, _reply_trees, _quote_tweets_dict, _quote_forest
+    path = _resolve_parquet_path(parquet_path)
+    if not (TWEET_STORE_DIR.exists() and REPLY_FOREST_DIR.exists() and QUOTE_INDEX_DIR.exists()):
+        raise FileNotFoundError(
+            "Delta mode needs an existing tweet store, reply forest and quote index. "
+            "Run generate_caches() first."
+        )
+    
+    n_new = apply_delta(
+        path, TWEET_STORE_DIR, REPLY_FOREST_DIR, QUOTE_INDEX_DIR, INGEST_MANIFEST,
+        QUOTE_FOREST_DIR if QUOTE_FOREST_DIR.exists() else None,
+    )
+    
+    if n_new:
+        # Cached quoted counts no longer match the corpus
+        QUOTED_COUNTS_CACHE.unlink(missing_ok=True)
+        _tweet_dict = _reply_trees = _quote_tweets_dict = _quote_forest = None
+    return n_new
+
+
+def check_caches(deep: bool = False) -> Dict[str, Optional[str]]:
+    """
+    Validate the columnar stores against their manifests.
 
+    Cheap by default (meta.json, file sizes, source parquet footer); deep=True
+    also verifies every file's checksum.
 
-def load_caches(auto_generate: bool = True) -> tuple[Cache, Cache]:
-    """Load cached tweet_dict and complete_reply_trees as diskcache objects."""
+    Returns:
+        Store name -> None if valid, else why it is stale or corrupt (stores
+        that were never generated are left out)
+    """
+    return {
+        name: validate_store(path, version, deep=deep)
+        for name, (path, version) in CACHE_STORES.items()
+        if path.exists()
+    }
+
+
+def rebuild_stores(names: List[str], parquet_path: Optional[str] = None) -> Dict[str, dict]:
+    """
+    Rebuild only the named stores (see CACHE_STORES) in one streaming pass.
+
+    Defaults to the parquet the first store was last built from, falling back
+    to DEFAULT_PARQUET_PATH. Rebuilding the tweet store also resets the ingest manifest.
+    """
+    global _tweet_dict, _reply_trees, _quote_tweets_dict, _quote_forest
+    # Stores left out of the rebuild must not miss the end of an interrupted ingest
+    recover_ingest(INGEST_MANIFEST)
+    if parquet_path is None:
+        recorded = [recorded_source(CACHE_STORES[name][0]) for name in names]
+        parquet_path = next((p for p in recorded if p is not None and p.exists()), None)
+    path = _resolve_parquet_path(parquet_path)
+    print(f"Rebuilding {', '.join(names)} from {path}")
+    dirs = {name: CACHE_STORES[name][0] if name in names else None for name in CACHE_STORES}
+    stats = build_caches(
+        path, dirs['tweet_store'], dirs['reply_forest'], dirs['quote_index'],
+        INGEST_MANIFEST if 'tweet_store' in names else None,
+        quote_forest_dir=dirs['quote_forest'],
+    )
+    _tweet_dict = _reply_trees = _quote_tweets_dict = _quote_forest = None
+    return stats
+
+
+def _ensure_valid(names: List[str], auto_generate: bool) -> None:
+    """Targeted rebuild of whichever of the named stores fail validation."""
+    problems = {}
+    for name in names:
+        path, version = CACHE_STORES[name]
+        if path.exists():
+            problem = validate_store(path, version)
+            if problem:
+                problems[name] = problem
+    if not problems:
+        return
+    for name, problem in problems.items():
+        print(f"Cache {name} is stale or corrupt: {problem}")
+    if not auto_generate:
+        raise RuntimeError(f"Invalid caches {sorted(problems)}; call rebuild_stores() or generate_caches()")
+    rebuild_stores(list(problems))
+
+
+def load_caches(
+    auto_generate: bool = True,
+    hot_tweets_mb: Optional[int] = None,
+    hot_trees_mb: Optional[int] = None,
+) -> tuple[Mapping[int, EnrichedTweet], Mapping[int, ConversationTree]]:
+    """
+    Load cached tweet_dict and complete_reply_trees.
+
+    tweet_dict is the memory-mapped TweetStore and complete_reply_trees the CSR
+    ConversationForest when they have been generated, otherwise the legacy diskcaches.
+    Both are wrapped in a HotCache LRU of hot_tweets_mb / hot_trees_mb
+    (defaults HOT_TWEETS_MB / HOT_TREES_MB; 0 returns the raw stores), except
+    the forest: filter_conversation_trees reads its Euler tour arrays directly.
+    Stale or corrupt stores are rebuilt on their own (see check_caches()).
+    """
     global _tweet_dict, _reply_trees
     if _tweet_dict is not None and _reply_trees is not None:
         return _tweet_dict, _reply_trees
+    recover_ingest(INGEST_MANIFEST)
+    _ensure_valid(['tweet_store', 'reply_forest'], auto_generate)
 
-    if not TWEET_DICT_DISKCACHE.exists() or not REPLY_TREES_DISKCACHE.exists():
+    have_tweets = TWEET_STORE_DIR.exists() or TWEET_DICT_DISKCACHE.exists()
+    have_trees = REPLY_FOREST_DIR.exists() or REPLY_TREES_DISKCACHE.exists()
+    if not have_tweets or not have_trees:
         if auto_generate and (TWEET_DICT_CACHE.exists() and REPLY_TREES_CACHE.exists()):
             print("Diskcache not found but joblib exists. Run migrate_to_diskcache() first.")
             raise FileNotFoundError("Run migrate_to_diskcache() to convert joblib caches")
         elif auto_generate:
             print("Cache files not found. Generating from parquet...")
             generate_caches()
-            migrate_to_diskcache()
         else:
             raise FileNotFoundError(
                 f"Cache files not found. Set ENRICHED_TWEETS_PATH env var and call generate_caches(), or run:\n"
                 f"  from lib.strand_caches import generate_caches; generate_caches('/path/to/enriched_tweets.parquet')"
             )
     
-    print("Opening diskcache stores...")
-    _tweet_dict = Cache(str(TWEET_DICT_DISKCACHE))
-    _reply_trees = Cache(str(REPLY_TREES_DISKCACHE))
+    if TWEET_STORE_DIR.exists():
+        print("Opening columnar tweet store...")
+        _tweet_dict = TweetStore(TWEET_STORE_DIR)
+    else:
+        print("Opening tweet_dict diskcache...")
+        _tweet_dict = BulkCache(str(TWEET_DICT_DISKCACHE))
+    if REPLY_FOREST_DIR.exists():
+        print("Opening CSR reply forest...")
+        _reply_trees = ConversationForest(REPLY_FOREST_DIR)
+    else:
+        print("Opening reply_trees diskcache...")
+        _reply_trees = BulkCache(str(REPLY_TREES_DISKCACHE))
     print(f"Loaded {len(_tweet_dict)} tweets and {len(_reply_trees)} reply trees")
+    
+    hot_tweets_mb = HOT_TWEETS_MB if hot_tweets_mb is None else hot_tweets_mb
+    hot_trees_mb = HOT_TREES_MB if hot_trees_mb is None else hot_trees_mb
+    if hot_tweets_mb > 0:
+        # Compact records; store rows leave full_text in the mmap until read
+        materialize = TweetRecord.from_row if isinstance(_tweet_dict, TweetStore) else TweetRecord.from_mapping
+        _tweet_dict = HotCache(_tweet_dict, hot_tweets_mb * 1024**2, materialize)
+    if hot_trees_mb > 0 and not isinstance(_reply_trees, ConversationForest):
+        _reply_trees = HotCache(_reply_trees, hot_trees_mb * 1024**2)
     return _tweet_dict, _reply_trees
 
 
-def get_quote_tweets_dict() -> Cache:
-    """Load quote_tweets index as diskcache: quoted_tweet_id -> list of quoting tweet_ids."""
+def get_quote_tweets_dict() -> Mapping[int, List[int]]:
+    """
+    Load quote_tweets index: quoted_tweet_id -> list of quoting tweet_ids.
+    
+    The sorted-array QuoteIndex when generated, otherwise the legacy diskcache.
+    """
     global _quote_tweets_dict
     if _quote_tweets_dict is not None:
         return _quote_tweets_dict
+    _ensure_valid(['quote_index'], auto_generate=True)
+    
+    if QUOTE_INDEX_DIR.exists():
+        print("Opening quote index...")
+        _quote_tweets_dict = QuoteIndex(QUOTE_INDEX_DIR)
+        print(f"Loaded quote index with {len(_quote_tweets_dict)} quoted tweets")
+        return _quote_tweets_dict
     
     if not QUOTE_TWEETS_DISKCACHE.exists():
         if QUOTE_TWEETS_DICT_CACHE.exists():
             print("Diskcache not found but joblib exists. Run migrate_to_diskcache() first.")
             raise FileNotFoundError("Run migrate_to_diskcache() to convert joblib caches")
-        raise FileNotFoundError("Quote tweets cache not found. Run generate_caches() and migrate_to_diskcache().")
+        raise FileNotFoundError("Quote tweets cache not found. Run generate_caches().")
     
     print("Opening quote_tweets diskcache...")
-    _quote_tweets_dict = Cache(str(QUOTE_TWEETS_DISKCACHE))
+    _quote_tweets_dict = BulkCache(str(QUOTE_TWEETS_DISKCACHE))
     print(f"Loaded quote index with {len(_quote_tweets_dict)} quoted tweets")
     return _quote_tweets_dict
 
 
+def get_quote_forest() -> QuoteForest:
+    """
+    Load the quote forest: quote chains for transitive quoters and quote ancestry.
+
+    Built from the quote index (no parquet read) if it hasn't been generated yet.
+    """
+    global _quote_forest
+    if _quote_forest is not None:
+        return _quote_forest
+    _ensure_valid(['quote_forest'], auto_generate=True)
+
+    if not QUOTE_FOREST_DIR.exists():
+        _ensure_valid(['quote_index'], auto_generate=True)
+        if not QUOTE_INDEX_DIR.exists():
+            raise FileNotFoundError("Quote index not found. Run generate_caches().")
+        print("Building quote forest from the quote index...")
+        stats = write_quote_forest(QUOTE_FOREST_DIR, *QuoteIndex(QUOTE_INDEX_DIR).pairs())
+        stamp_store(QUOTE_FOREST_DIR, read_meta(QUOTE_INDEX_DIR)['source'])
+        print(f"Wrote {stats['chains']:,} quote chains (max depth {stats['max_depth']}) to {QUOTE_FOREST_DIR}")
+
+    print("Opening quote forest...")
+    _quote_forest = QuoteForest(QUOTE_FOREST_DIR)
+    print(f"Loaded {_quote_forest!r}")
+    return _quote_forest
+
+
 def migrate_to_diskcache() -> None:
     """Migrate existing joblib caches to diskcache format."""
     import sys
@@ -1,18 +1,22 @@
 # %%
 """Strand rating using LLMs with structured output."""
+import asyncio
 import json
 import os
 from pathlib import Path
-from typing import TypedDict, Literal, Dict, List, Optional
+from typing import TYPE_CHECKING, TypedDict, Literal, Dict, List, Optional
 
 from dotenv import load_dotenv
-from groq import Groq
-from openai import OpenAI
+from groq import AsyncGroq, Groq
+from openai import AsyncOpenAI, OpenAI
 
 from .retry import with_retry, is_rate_limit_error
 from .parallel import parallel_map_to_dict
 from .strand_rating_prompt import STRAND_RATER_PROMPT, StrandRating
 
+if TYPE_CHECKING:
+    from .async_http import AsyncHTTP
+
 load_dotenv(Path(__file__).parent.parent.parent / ".env")
 
 Provider = Literal["groq", "openrouter"]
@@ -57,20 +61,15 @@ class EmptyResponseError(Exception):
     pass
 
 
-def _make_rate_strand_call(
-    client,
-    model_name: str,
-    thread_text: str,
-    temperature: float
-) -> StrandRating:
-    """Make the actual LLM call for rating."""
+def _rating_request(model_name: str, thread_text: str, temperature: float) -> dict:
+    """Chat completion arguments of a rating call."""
     user_content = f"<strand_data>\n{thread_text}\n</strand_data>"
     
     schema = StrandRating.model_json_schema()
     if "anthropic" in model_name.lower() or "claude" in model_name.lower():
         schema = _fix_schema_for_anthropic(schema)
     
-    completion = client.chat.completions.create(
+    return dict(
         model=model_name,
         messages=[
             {"role": "system", "content": STRAND_RATER_PROMPT},
@@ -86,7 +85,9 @@ def _make_rate_strand_call(
             },
         },
     )
-    
+
+
+def _parse_rating(completion) -> StrandRating:
     content = completion.choices[0].message.content
     if not content or not content.strip():
         raise EmptyResponseError(f"LLM returned empty response (finish_reason: {completion.choices[0].finish_reason})")
@@ -94,6 +95,17 @@ def _make_rate_strand_call(
     return StrandRating.model_validate(json.loads(content))
 
 
+def _make_rate_strand_call(
+    client,
+    model_name: str,
+    thread_text: str,
+    temperature: float
+) -> StrandRating:
+    """Make the actual LLM call for rating."""
+    completion = client.chat.completions.create(**_rating_request(model_name, thread_text, temperature))
+    return _parse_rating(completion)
+
+
 def rate_strand(
     thread_text: str,
     tweet_id: int,
@@ -209,3 +221,125 @@ def rate_strands_batch(
     
     return {**existing, **new_results}
 
+
+# --- Async path: one shared AsyncHTTP pool, LLM calls within the provider's host limit ---
+
+_PROVIDER_HOSTS = {"groq": "api.groq.com", "openrouter": "openrouter.ai"}
+
+
+def _get_async_client(provider: Provider, http: 'AsyncHTTP'):
+    if provider == "groq":
+        return AsyncGroq(api_key=os.environ.get("GROQ_API_KEY"), http_client=http.client)
+    return AsyncOpenAI(
+        api_key=os.environ.get("OPENROUTER_API_KEY"),
+        base_url="https://openrouter.ai/api/v1",
+        http_client=http.client
+    )
+
+
+async def rate_strand_async(
+    http: 'AsyncHTTP',
+    client,
+    thread_text: str,
+    tweet_id: int,
+    model_name: str = "openai/gpt-4o-mini",
+    provider: Provider = "openrouter",
+    max_retries: int = 2,
+    base_temperature: float = 0.7
+) -> RatedStrandResult:
+    """rate_strand with an async client from _get_async_client; same retry and temperature policy."""
+    temperature = base_temperature
+    
+    for attempt in range(max_retries):
+        try:
+            async with http.limit(_PROVIDER_HOSTS[provider]):
+                completion = await client.chat.completions.create(**_rating_request(model_name, thread_text, temperature))
+            rating = _parse_rating(completion)
+            return {
+                "seed_tweet_id": tweet_id,
+                "thread_text": thread_text,
+                "rating": rating.model_dump(),
+            }
+        except Exception as e:
+            if attempt == max_retries - 1:
+                raise
+            
+            if is_rate_limit_error(e):
+                delay = 2 ** attempt
+                print(f"Rate limit hit for tweet {tweet_id}, waiting {delay}s...")
+                await asyncio.sleep(delay)
+            elif isinstance(e, EmptyResponseError):
+                delay = 2 ** attempt
+                print(f"Empty response for tweet {tweet_id}, waiting {delay}s and retrying...")
+                await asyncio.sleep(delay)
+            else:
+                temperature = min(1.0, temperature + 0.1)
+                print(f"Retry {attempt + 1} for tweet {tweet_id} with temp={temperature:.1f}: {e}")
+                await asyncio.sleep(1)
+    
+    raise RuntimeError(f"Failed to rate tweet {tweet_id} after {max_retries} attempts")
+
+
+async def rate_strands_batch_async(
+    http: 'AsyncHTTP',
+    strand_texts: Dict[int, str],
+    model_name: str = "openai/gpt-4o-mini",
+    provider: Provider = "openrouter",
+    output_dir: Optional[Path] = None,
+    max_retries: int = 2,
+    base_temperature: float = 0.7,
+) -> Dict[int, RatedStrandResult]:
+    """
+    rate_strands_batch as tasks on one event loop; the provider's host limit in http replaces max_workers.
+    
+    Existing results in output_dir are loaded instead of re-rated. A strand
+    that fails is logged and left out; cancelling the caller cancels every
+    call in flight (TaskGroup).
+    """
+    if output_dir:
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+    
+    existing: Dict[int, RatedStrandResult] = {}
+    pending_ids: List[int] = []
+    for tid in strand_texts.keys():
+        if output_dir:
+            result_file = output_dir / f"{tid}.json"
+            if result_file.exists():
+                with open(result_file) as f:
+                    existing[tid] = json.load(f)
+                continue
+        pending_ids.append(tid)
+    
+    if existing:
+        print(f"Loaded {len(existing)} existing results, processing {len(pending_ids)} remaining")
+    
+    if not pending_ids:
+        return existing
+    
+    client = _get_async_client(provider, http)
+    failed: List[int] = []
+    
+    async def rate_one(tid: int) -> Optional[RatedStrandResult]:
+        try:
+            result = await rate_strand_async(
+                http, client, strand_texts[tid], tid,
+                model_name=model_name, provider=provider,
+                max_retries=max_retries, base_temperature=base_temperature
+            )
+        except Exception as e:
+            print(f"[ERROR] {tid}: {type(e).__name__}: {e}")
+            failed.append(tid)
+            return None
+        if output_dir:
+            with open(output_dir / f"{tid}.json", "w") as f:
+                json.dump(result, f, indent=2)
+        return result
+    
+    async with asyncio.TaskGroup() as tg:
+        tasks = {tid: tg.create_task(rate_one(tid)) for tid in pending_ids}
+    
+    if failed:
+        print(f"[WARN] {len(failed)} strands failed to rate: {failed}")
+    
+    return {**existing, **{tid: t.result() for tid, t in tasks.items() if t.result() is not None}}
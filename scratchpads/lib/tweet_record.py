@@ -0,0 +1,109 @@
+# %%
+"""
+Compact read-only tweet record.
+
+A 16-key EnrichedTweet dict costs ~1 KB of hash table and boxed values per tweet
+before counting the strings. TweetRecord keeps the same fields in __slots__,
+interns the highly repetitive strings (usernames, display names, avatar urls,
+upload ids) and can defer loading full_text until it is read. It is a Mapping,
+so EnrichedTweet consumers (`tweet.get('username')`, `tweet['full_text']`) work unchanged.
+"""
+import sys
+from collections.abc import Mapping
+from typing import Any, Callable, Iterator
+
+# Same keys as conversation_explorer.EnrichedTweet
+TWEET_FIELDS = (
+    'tweet_id', 'account_id', 'username', 'created_at', 'full_text',
+    'retweet_count', 'favorite_count', 'reply_to_tweet_id', 'reply_to_user_id',
+    'reply_to_username', 'conversation_id', 'account_display_name', 'avatar_media_url',
+    'archive_upload_id', 'quoted_tweet_id', 'quoted_count',
+)
+INTERNED_FIELDS = frozenset({
+    'username', 'reply_to_username', 'account_display_name', 'avatar_media_url', 'archive_upload_id',
+})
+_FIELD_SET = frozenset(TWEET_FIELDS)
+
+_ABSENT = object()    # field missing from the source mapping
+_UNLOADED = object()  # full_text not read from the source yet
+
+
+class TweetRecord(Mapping):
+    """Read-only EnrichedTweet mapping backed by __slots__."""
+    __slots__ = TWEET_FIELDS + ('_text_source', '_on_text_load')
+
+    @classmethod
+    def from_mapping(cls, tweet: Mapping, load_text: bool = True) -> 'TweetRecord':
+        """
+        Build a record from any EnrichedTweet-shaped mapping (dict, TweetRow, ...).
+
+        Args:
+            tweet: Source mapping; keys outside TWEET_FIELDS are dropped
+            load_text: If False and tweet is not a plain dict, full_text is read
+                from tweet on first access instead of now
+        """
+        rec = cls.__new__(cls)
+        lazy = not load_text and not isinstance(tweet, dict) and 'full_text' in tweet
+        for field in TWEET_FIELDS:
+            if lazy and field == 'full_text':
+                value = _UNLOADED
+            else:
+                value = tweet.get(field, _ABSENT)
+                if field in INTERNED_FIELDS and type(value) is str:
+                    value = sys.intern(value)
+            object.__setattr__(rec, field, value)
+        object.__setattr__(rec, '_text_source', tweet if lazy else None)
+        object.__setattr__(rec, '_on_text_load', None)
+        return rec
+
+    @classmethod
+    def from_row(cls, row: Mapping) -> 'TweetRecord':
+        """Record for a TweetStore row with full_text left in the store until read."""
+        return cls.from_mapping(row, load_text=False)
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in _FIELD_SET:
+            raise KeyError(key)
+        value = getattr(self, key)
+        if value is _ABSENT:
+            raise KeyError(key)
+        if value is _UNLOADED:
+            value = self._text_source['full_text']
+            object.__setattr__(self, 'full_text', value)
+            object.__setattr__(self, '_text_source', None)
+            on_load = self._on_text_load
+            object.__setattr__(self, '_on_text_load', None)
+            if on_load is not None:
+                on_load()
+        return value
+
+    def track_size(self, callback: Callable[[], None]) -> None:
+        """Call callback() once a deferred full_text is loaded and counts in __sizeof__ (e.g. to re-measure a HotCache entry)."""
+        if self.full_text is _UNLOADED:
+            object.__setattr__(self, '_on_text_load', callback)
+
+    def __iter__(self) -> Iterator[str]:
+        return (f for f in TWEET_FIELDS if getattr(self, f) is not _ABSENT)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("TweetRecord is read-only")
+
+    def __reduce__(self):
+        return (self.__class__.from_mapping, (dict(self),))
+
+    def __sizeof__(self) -> int:
+        # Shallow slots plus owned values; interned strings are shared across records
+        size = object.__sizeof__(self)
+        for field in TWEET_FIELDS:
+            value = getattr(self, field)
+            if value is not _ABSENT and value is not _UNLOADED and field not in INTERNED_FIELDS:
+                size += sys.getsizeof(value)
+        return size
+
+    def __repr__(self) -> str:
+        return f"TweetRecord({dict(self)!r})"
+
+# %%
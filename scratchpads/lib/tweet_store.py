@@ -0,0 +1,492 @@
+# %%
+"""
+Read-only columnar tweet store.
+
+Layout on disk (one directory, every file memory-mapped on open):
+    tweet_id.npy                    sorted int64 tweet ids
+    <col>.npy                       fixed-width columns aligned with tweet_id
+    <col>.offsets.npy / .data.npy   utf-8 text blobs (plus <col>.null.npy if nullable)
+    meta.json                       row count and column kinds
+
+Opening only maps the files, so it takes milliseconds regardless of corpus size,
+and worker processes opening the same directory share the page cache.
+"""
+import copy
+import hashlib
+import json
+import shutil
+from collections.abc import Mapping
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+from .array_store import (
+    INT_NULL, StringColumn, commit_array_dir, delta_dirs, encode_strings, int_column, isin_sorted, key_array,
+    open_array_dir, read_meta, refresh_checksums, staging_dir, write_array_dir,
+)
+
+STORE_VERSION = 1
+
+
+class TweetRow(Mapping):
+    """Lazy view of one tweet in a TweetStore. Fields are decoded on access."""
+    __slots__ = ('_segment', '_i')
+
+    def __init__(self, segment: '_TweetSegment', i: int):
+        self._segment = segment
+        self._i = i
+
+    def __getitem__(self, key: str):
+        return self._segment._value(self._i, key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._segment.columns)
+
+    def __len__(self) -> int:
+        return len(self._segment.columns)
+
+    def __repr__(self) -> str:
+        return f"TweetRow({dict(self)!r})"
+
+
+class _TweetSegment:
+    """One directory of columns (the base store or one delta)."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        arrays, meta = open_array_dir(path)
+        self.meta = meta
+        self.columns: Dict[str, str] = meta['columns']
+        self.ids = arrays['tweet_id']
+        self.fixed: Dict[str, np.ndarray] = {}
+        self.strings: Dict[str, StringColumn] = {}
+        for name, kind in self.columns.items():
+            if name == 'tweet_id':
+                continue
+            if kind == 'string':
+                self.strings[name] = StringColumn(
+                    arrays[f'{name}.offsets'], arrays[f'{name}.data'], arrays.get(f'{name}.null')
+                )
+            else:
+                self.fixed[name] = arrays[name]
+
+    def _index(self, tid: int) -> int:
+        i = int(np.searchsorted(self.ids, tid))
+        if i < len(self.ids) and self.ids[i] == tid:
+            return i
+        return -1
+
+    def _value(self, i: int, key: str):
+        if key == 'tweet_id':
+            return int(self.ids[i])
+        kind = self.columns.get(key)
+        if kind is None:
+            raise KeyError(key)
+        if kind == 'string':
+            return self.strings[key].get(i)
+        v = self.fixed[key][i]
+        if kind == 'float':
+            return None if np.isnan(v) else float(v)
+        if v == INT_NULL:
+            return None
+        if kind == 'timestamp':
+            return datetime.fromtimestamp(int(v) / 1e6, tz=timezone.utc)
+        return int(v)
+
+
+class TweetStore(Mapping):
+    """
+    Mapping tweet_id -> TweetRow over a memory-mapped columnar store.
+
+    The store directory holds the base columns plus optional delta-NNNN/
+    subdirectories appended by incremental updates; tweet ids are disjoint
+    across segments.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self._segments = [_TweetSegment(self.path)] + [
+            _TweetSegment(p) for p in delta_dirs(self.path)
+        ]
+        self.meta = self._segments[0].meta
+        self.columns: Dict[str, str] = self.meta['columns']
+
+    def __reduce__(self):
+        # Reopen from disk in other processes instead of pickling the arrays
+        return (self.__class__, (str(self.path),))
+
+    def _locate(self, tweet_id) -> Tuple[Optional[_TweetSegment], int]:
+        try:
+            tid = int(tweet_id)
+        except (TypeError, ValueError):
+            return None, -1
+        for segment in self._segments:
+            i = segment._index(tid)
+            if i >= 0:
+                return segment, i
+        return None, -1
+
+    def __getitem__(self, tweet_id) -> TweetRow:
+        segment, i = self._locate(tweet_id)
+        if segment is None:
+            raise KeyError(tweet_id)
+        return TweetRow(segment, i)
+
+    def __contains__(self, tweet_id) -> bool:
+        return self._locate(tweet_id)[0] is not None
+
+    def __iter__(self) -> Iterator[int]:
+        for segment in self._segments:
+            yield from (int(t) for t in segment.ids)
+
+    def __len__(self) -> int:
+        return sum(len(s.ids) for s in self._segments)
+
+    def __repr__(self) -> str:
+        return f"TweetStore({str(self.path)!r}, {len(self)} tweets, {len(self._segments) - 1} deltas)"
+
+    def get_many(self, tweet_ids: Iterable, default=None) -> List[Optional[TweetRow]]:
+        """Rows for tweet_ids in order (default where missing), via one binary search per segment."""
+        keys = list(tweet_ids)
+        ids, remaining = key_array(keys)
+        out = [default] * len(keys)
+        for segment in self._segments:
+            hit = remaining & isin_sorted(ids, segment.ids)
+            if not hit.any():
+                continue
+            remaining &= ~hit
+            idx = np.flatnonzero(hit)
+            for i, p in zip(idx.tolist(), np.searchsorted(segment.ids, ids[idx]).tolist()):
+                out[i] = TweetRow(segment, p)
+        return out
+
+    def contains_many(self, tweet_ids: np.ndarray) -> np.ndarray:
+        """Vectorized membership test: bool mask aligned with tweet_ids."""
+        tweet_ids = np.asarray(tweet_ids, dtype=np.int64)
+        found = np.zeros(len(tweet_ids), dtype=bool)
+        for segment in self._segments:
+            found |= isin_sorted(tweet_ids, segment.ids)
+        return found
+
+    def lookup_column(self, tweet_ids: np.ndarray, column: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Vectorized fetch of a fixed-width column.
+
+        Returns:
+            (found mask, raw values) aligned with tweet_ids; values are INT_NULL
+            (or NaN for float columns) where the tweet is unknown or the value missing
+        """
+        tweet_ids = np.asarray(tweet_ids, dtype=np.int64)
+        found = np.zeros(len(tweet_ids), dtype=bool)
+        float_col = self.columns.get(column) == 'float'
+        values = np.full(len(tweet_ids), np.nan if float_col else INT_NULL,
+                         dtype=np.float64 if float_col else np.int64)
+        for segment in self._segments:
+            hit = isin_sorted(tweet_ids, segment.ids) & ~found
+            if not hit.any():
+                continue
+            found |= hit
+            if column == 'tweet_id':
+                values[hit] = tweet_ids[hit]
+            elif column in segment.fixed:
+                values[hit] = segment.fixed[column][np.searchsorted(segment.ids, tweet_ids[hit])]
+        return found, values
+
+    def select_in(self, column: str, values: np.ndarray) -> np.ndarray:
+        """Tweet ids whose int column value is in values (full column scan, vectorized)."""
+        values = np.sort(np.asarray(values, dtype=np.int64))
+        parts = [
+            segment.ids[isin_sorted(segment.fixed[column], values)]
+            for segment in self._segments if column in segment.fixed
+        ]
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64)
+
+    def add_to_column(self, tweet_ids: np.ndarray, amounts: np.ndarray, column: str = 'quoted_count') -> int:
+        """
+        Add amounts to an int column in place (through a writable mmap).
+
+        Readers that already mapped the column see the new values. Unknown
+        tweet ids are ignored. Returns the number of rows updated.
+        """
+        tweet_ids = np.asarray(tweet_ids, dtype=np.int64)
+        amounts = np.asarray(amounts, dtype=np.int64)
+        updated = 0
+        for segment in self._segments:
+            if segment.columns.get(column) != 'int':
+                continue
+            hit = isin_sorted(tweet_ids, segment.ids)
+            if not hit.any():
+                continue
+            col = np.load(segment.path / f'{column}.npy', mmap_mode='r+')
+            pos = np.searchsorted(segment.ids, tweet_ids[hit])
+            rows, inv = np.unique(pos, return_inverse=True)
+            sums = np.bincount(inv, weights=amounts[hit], minlength=len(rows)).astype(np.int64)
+            current = col[rows]
+            col[rows] = np.where(current == INT_NULL, 0, current) + sums
+            col.flush()
+            del col
+            refresh_checksums(segment.path, [f'{column}.npy'])
+            updated += int(hit.sum())
+        return updated
+
+    def set_column(self, tweet_ids: np.ndarray, values: np.ndarray, column: str = 'quoted_count') -> int:
+        """
+        Set an int column to values in place, like add_to_column.
+
+        Setting is idempotent, so an interrupted update can simply be re-run
+        (see cache_delta.apply_delta). Returns the number of rows updated.
+        """
+        tweet_ids = np.asarray(tweet_ids, dtype=np.int64)
+        values = np.asarray(values, dtype=np.int64)
+        updated = 0
+        for segment in self._segments:
+            if segment.columns.get(column) != 'int':
+                continue
+            hit = isin_sorted(tweet_ids, segment.ids)
+            if not hit.any():
+                continue
+            col = np.load(segment.path / f'{column}.npy', mmap_mode='r+')
+            col[np.searchsorted(segment.ids, tweet_ids[hit])] = values[hit]
+            col.flush()
+            del col
+            refresh_checksums(segment.path, [f'{column}.npy'])
+            updated += int(hit.sum())
+        return updated
+
+    def with_segment(self, path: Union[str, Path]) -> 'TweetStore':
+        """This store plus one more segment directory, e.g. a delta staged but not committed yet."""
+        store = copy.copy(self)
+        store._segments = self._segments + [_TweetSegment(Path(path))]
+        return store
+
+
+def store_fingerprint(path: Union[str, Path]) -> str:
+    """
+    Hash of a store's segments and their file checksums (meta.json only).
+
+    Changes with every delta segment and in-place column update, so indexes
+    derived from the store (e.g. seed filters) can tell they are stale.
+    """
+    path = Path(path)
+    h = hashlib.sha256()
+    for segment in [path] + delta_dirs(path):
+        h.update(segment.name.encode('utf-8'))
+        h.update(json.dumps(read_meta(segment).get('files', {}), sort_keys=True).encode('utf-8'))
+    return h.hexdigest()[:16]
+
+
+def encode_column(col) -> Tuple[Optional[str], Dict[str, np.ndarray]]:
+    """
+    Encode one pyarrow column for the store.
+
+    Returns:
+        (kind, arrays by file suffix); kind is None for unsupported types.
+        String columns give 'offsets'/'data'/'null' parts, others one '' part.
+    """
+    import pyarrow as pa
+
+    if isinstance(col, pa.ChunkedArray):
+        col = col.combine_chunks()
+    t = col.type
+    if pa.types.is_dictionary(t):
+        col = col.cast(t.value_type)
+        t = col.type
+    if pa.types.is_string(t) or pa.types.is_large_string(t):
+        return 'string', encode_strings(col)
+    if pa.types.is_timestamp(t) or pa.types.is_date(t):
+        us = col.cast(pa.timestamp('us', tz=getattr(t, 'tz', None))).cast(pa.int64())
+        return 'timestamp', {'': us.fill_null(INT_NULL).to_numpy()}
+    if pa.types.is_integer(t) or pa.types.is_boolean(t):
+        return 'int', {'': col.cast(pa.int64()).fill_null(INT_NULL).to_numpy()}
+    if pa.types.is_floating(t):
+        return 'float', {'': col.cast(pa.float64()).fill_null(np.nan).to_numpy()}
+    return None, {}
+
+
+def build_tweet_store(table, out_dir: Union[str, Path]) -> int:
+    """
+    Write a pyarrow Table of enriched tweets as a TweetStore directory.
+
+    Args:
+        table: pyarrow Table with a 'tweet_id' column plus any EnrichedTweet columns
+        out_dir: Destination directory (replaced atomically)
+
+    Returns:
+        Number of rows written
+    """
+    import pyarrow.compute as pc
+
+    table = table.filter(pc.is_valid(table['tweet_id']))
+    table = table.take(pc.sort_indices(table['tweet_id']))
+
+    arrays: Dict[str, np.ndarray] = {
+        'tweet_id': table['tweet_id'].to_numpy().astype(np.int64)
+    }
+    columns: Dict[str, str] = {'tweet_id': 'int'}
+    for name in table.column_names:
+        if name == 'tweet_id':
+            continue
+        kind, parts = encode_column(table[name])
+        if kind is None:
+            print(f"[WARN] Skipping column {name} with unsupported type {table[name].type}")
+            continue
+        columns[name] = kind
+        for part, arr in parts.items():
+            arrays[f'{name}.{part}' if part else name] = arr
+
+    write_array_dir(out_dir, arrays, {
+        'version': STORE_VERSION,
+        'rows': len(table),
+        'columns': columns,
+    })
+    return len(table)
+
+
+def dedupe_rows(ids: np.ndarray) -> np.ndarray:
+    """Positions of the last copy of each tweet id, in tweet_id order."""
+    order = np.argsort(ids, kind='stable')
+    sorted_ids = ids[order]
+    last = np.append(sorted_ids[1:] != sorted_ids[:-1], True) if len(ids) else np.zeros(0, dtype=bool)
+    return order[last]
+
+
+class TweetStoreWriter:
+    """
+    Streaming TweetStore builder: append record batches, then close().
+
+    Batches are spilled to flat files in file order, so memory stays at one
+    batch plus the tweet_id column. close() sorts by tweet_id (the last copy of
+    a duplicated id wins, as in a dict) and gathers every column into its final
+    .npy in chunks through memory maps.
+    """
+
+    def __init__(self, out_dir: Union[str, Path], chunk_rows: int = 1 << 16):
+        self.out_dir = Path(out_dir)
+        self.chunk_rows = chunk_rows
+        self._spill = self.out_dir.with_name(self.out_dir.name + '.spill')
+        if self._spill.exists():
+            shutil.rmtree(self._spill)
+        self._spill.mkdir(parents=True)
+        self._files: Dict[str, BinaryIO] = {}
+        self._ids: List[np.ndarray] = []
+        self._rows: Optional[np.ndarray] = None
+        self.columns: Dict[str, str] = {'tweet_id': 'int'}
+
+    def _write(self, name: str, arr: np.ndarray) -> None:
+        f = self._files.get(name)
+        if f is None:
+            f = self._files[name] = open(self._spill / name, 'wb')
+        np.ascontiguousarray(arr).tofile(f)
+
+    def append(self, table) -> int:
+        """Spill a pyarrow Table/RecordBatch of tweets. Returns rows appended."""
+        import pyarrow.compute as pc
+
+        table = table.filter(pc.is_valid(table['tweet_id']))
+        self._ids.append(int_column(table, 'tweet_id'))
+        for name in table.column_names:
+            if name == 'tweet_id':
+                continue
+            kind, parts = encode_column(table[name])
+            if kind is None:
+                if name not in self.columns:
+                    print(f"[WARN] Skipping column {name} with unsupported type {table[name].type}")
+                    self.columns[name] = None
+                continue
+            self.columns.setdefault(name, kind)
+            if kind == 'string':
+                self._write(f'{name}.len', np.diff(parts['offsets']))
+                self._write(f'{name}.data', parts['data'])
+                self._write(f'{name}.null', parts.get('null', np.zeros(len(table), dtype=bool)))
+            else:
+                self._write(name, parts[''])
+        return len(table)
+
+    def rows(self) -> np.ndarray:
+        """Appended row positions that will be written, in tweet_id order."""
+        if self._rows is None:
+            ids = np.concatenate(self._ids) if self._ids else np.zeros(0, dtype=np.int64)
+            self._rows = dedupe_rows(ids)
+            self._ids = [ids]
+        return self._rows
+
+    def _spilled(self, name: str, dtype) -> np.ndarray:
+        path = self._spill / name
+        if path.stat().st_size == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode='r')
+
+    def _gather_fixed(self, tmp: Path, name: str, dtype) -> None:
+        rows = self.rows()
+        src = self._spilled(name, dtype)
+        out = np.lib.format.open_memmap(tmp / f'{name}.npy', mode='w+', dtype=dtype, shape=(len(rows),))
+        for i in range(0, len(rows), self.chunk_rows):
+            out[i:i + self.chunk_rows] = src[rows[i:i + self.chunk_rows]]
+        out.flush()
+        del out
+
+    def _gather_strings(self, tmp: Path, name: str) -> None:
+        rows = self.rows()
+        lens = np.fromfile(self._spill / f'{name}.len', dtype=np.int64)
+        starts = np.zeros(len(lens), dtype=np.int64)
+        np.cumsum(lens[:-1], out=starts[1:])
+        lens, starts = lens[rows], starts[rows]
+        offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(lens, out=offsets[1:])
+        np.save(tmp / f'{name}.offsets.npy', offsets)
+
+        src = self._spilled(f'{name}.data', np.uint8)
+        out = np.lib.format.open_memmap(tmp / f'{name}.data.npy', mode='w+', dtype=np.uint8, shape=(int(offsets[-1]),))
+        for i in range(0, len(rows), self.chunk_rows):
+            lo, hi = offsets[i], offsets[min(i + self.chunk_rows, len(rows))]
+            if hi == lo:
+                continue
+            ln = lens[i:i + self.chunk_rows]
+            # Byte positions of each row's text, concatenated
+            pos = np.arange(hi - lo) + np.repeat(starts[i:i + self.chunk_rows] - (offsets[i:i + len(ln)] - lo), ln)
+            out[lo:hi] = src[pos]
+        out.flush()
+        del out
+
+        null = np.fromfile(self._spill / f'{name}.null', dtype=bool)[rows]
+        if null.any():
+            np.save(tmp / f'{name}.null.npy', null)
+
+    def close(self, extra_columns: Optional[Dict[str, Tuple[str, np.ndarray]]] = None) -> int:
+        """
+        Write the store and remove the spill files.
+
+        Args:
+            extra_columns: name -> (kind, values aligned with rows()), e.g. quoted_count
+
+        Returns:
+            Number of rows written
+        """
+        rows = self.rows()
+        for f in self._files.values():
+            f.close()
+
+        tmp = staging_dir(self.out_dir)
+        np.save(tmp / 'tweet_id.npy', self._ids[0][rows])
+        columns = {k: v for k, v in self.columns.items() if v is not None}
+        for name, kind in columns.items():
+            if kind == 'string':
+                self._gather_strings(tmp, name)
+            elif name != 'tweet_id':
+                self._gather_fixed(tmp, name, np.float64 if kind == 'float' else np.int64)
+        for name, (kind, values) in (extra_columns or {}).items():
+            np.save(tmp / f'{name}.npy', np.asarray(values, dtype=np.float64 if kind == 'float' else np.int64))
+            columns[name] = kind
+
+        commit_array_dir(tmp, self.out_dir, {
+            'version': STORE_VERSION,
+            'rows': len(rows),
+            'columns': columns,
+        })
+        shutil.rmtree(self._spill)
+        return len(rows)
+
+
+# %%
@@ -0,0 +1,596 @@
+# %%
+"""
+Local nearest-neighbour index over the embedding-queue parquets.
+
+Layout on disk (one directory, every file memory-mapped on open):
+    vectors.npy                         (n, dim) unit-length rows, float16 or int8
+    scale.npy                           float32 per-row scale of int8 vectors
+    tweet_id.npy                        int64 tweet id of each row (INT_NULL if unknown)
+    key.offsets/.data, metadata.*       parquet key and metadata JSON of each row
+    id_sorted.npy / id_row.npy          sorted tweet ids and their rows (tweet_id -> row)
+    text_hash.npy / text_row.npy        sorted hashes of each row's text and original_text
+    centroids.npy, list_offsets.npy,    optional IVF: k-means centroids and the rows
+    list_rows.npy                       of each list, grouped by list
+    meta.json                           row count, dim, dtype, source files
+
+Similarity is the cosine of the query and row vectors. Search is an exact
+scan, one block of rows per matrix product with all queries of a batch, or
+with an IVF index an approximate scan of the nprobe lists whose centroids
+are nearest each query.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .array_store import INT_NULL, StringColumn, commit_array_dir, open_array_dir, refresh_checksums, staging_dir
+
+VECTOR_INDEX_VERSION = 2
+VECTOR_INDEX_DIR = Path(__file__).parent.parent / 'vector_index'
+EMBEDDING_QUEUE_DIR = Path(__file__).parent.parent.parent / 'CA_embeddings' / 'embedding-queue'
+EMBEDDING_DIM = 1018
+BLOCK_ROWS = 16384
+QUERY_BLOCK = 1024
+
+# Turns a batch of query texts into (len(texts), dim) vectors, for texts not in the index
+EmbedFn = Callable[[List[str]], np.ndarray]
+
+
+def text_hash(text: str) -> int:
+    """64-bit hash of a text, as stored in text_hash.npy."""
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def matches_filter(metadata: dict, filter: Optional[dict]) -> bool:
+    """
+    Whether a row's metadata passes a Qdrant-style filter (must/should/must_not).
+
+    Conditions are {"key": field, "match": {...}} with "text" (case-insensitive
+    substring), "value" (equality), "any" or "except" (membership), or
+    {"key": field, "range": {"gt"/"gte"/"lt"/"lte": x}}; a nested filter may
+    stand in for a condition.
+    """
+    if not filter:
+        return True
+    must = filter.get('must') or []
+    should = filter.get('should') or []
+    must_not = filter.get('must_not') or []
+    return (
+        all(_matches_condition(metadata, c) for c in must)
+        and (not should or any(_matches_condition(metadata, c) for c in should))
+        and not any(_matches_condition(metadata, c) for c in must_not)
+    )
+
+
+def _matches_condition(metadata: dict, cond: dict) -> bool:
+    if 'key' not in cond:
+        return matches_filter(metadata, cond)
+    value = metadata.get(cond['key'])
+    if 'match' in cond:
+        match = cond['match']
+        if 'text' in match:
+            return isinstance(value, str) and match['text'].lower() in value.lower()
+        if 'value' in match:
+            return value == match['value']
+        if 'any' in match:
+            return value in match['any']
+        if 'except' in match:
+            return value is not None and value not in match['except']
+    if 'range' in cond:
+        if value is None:
+            return False
+        bounds = cond['range']
+        return (
+            ('gt' not in bounds or value > bounds['gt']) and ('gte' not in bounds or value >= bounds['gte'])
+            and ('lt' not in bounds or value < bounds['lt']) and ('lte' not in bounds or value <= bounds['lte'])
+        )
+    raise ValueError(f"Unsupported filter condition: {cond}")
+
+
+class _TopK:
+    """Running top k rows per query over blocks of scores (rows >= threshold that accept, in mask, not excluded)."""
+
+    def __init__(
+        self,
+        n_queries: int,
+        k: int,
+        threshold: float,
+        accept: Optional[Callable[[int], bool]] = None,
+        mask: Optional[np.ndarray] = None,
+        excludes: Optional[List[np.ndarray]] = None
+    ):
+        self.k = k
+        self.threshold = threshold
+        self.accept = accept
+        self.mask = mask
+        self.excludes = excludes
+        self.rows = np.full((n_queries, k), -1, dtype=np.int64)
+        self.scores = np.full((n_queries, k), -np.inf, dtype=np.float32)
+
+    def add(self, qs: Optional[np.ndarray], row_ids: np.ndarray, scores: np.ndarray) -> None:
+        """Merge (rows, queries) scores of row_ids for queries qs (None: all)."""
+        scores = np.where(scores >= self.threshold, scores, -np.inf).astype(np.float32, copy=False)
+        if self.mask is not None:
+            scores[~self.mask[row_ids]] = -np.inf
+        if self.excludes is not None:
+            for col, q in enumerate(range(scores.shape[1]) if qs is None else qs.tolist()):
+                if len(self.excludes[q]):
+                    scores[np.isin(row_ids, self.excludes[q]), col] = -np.inf
+        if self.accept is None:
+            if len(row_ids) > self.k:
+                part = np.argpartition(-scores, self.k - 1, axis=0)[:self.k]
+            else:
+                part = np.broadcast_to(np.arange(len(row_ids))[:, None], scores.shape)
+            cand_rows = row_ids[part].T
+            cand_scores = np.take_along_axis(scores, part, axis=0).T
+        else:
+            # Best first until k rows pass, so each block yields its own exact top k
+            cand_rows = np.full((scores.shape[1], self.k), -1, dtype=np.int64)
+            cand_scores = np.full((scores.shape[1], self.k), -np.inf, dtype=np.float32)
+            for j in range(scores.shape[1]):
+                col = scores[:, j]
+                cand = np.flatnonzero(col > -np.inf)
+                n = 0
+                for c in cand[np.lexsort((row_ids[cand], -col[cand]))].tolist():
+                    if self.accept(int(row_ids[c])):
+                        cand_rows[j, n], cand_scores[j, n] = row_ids[c], col[c]
+                        n += 1
+                        if n == self.k:
+                            break
+        sel = slice(None) if qs is None else qs
+        rows = np.concatenate([self.rows[sel], cand_rows], axis=1)
+        merged = np.concatenate([self.scores[sel], cand_scores], axis=1)
+        keep = np.argpartition(-merged, self.k - 1, axis=1)[:, :self.k]
+        self.rows[sel] = np.take_along_axis(rows, keep, axis=1)
+        self.scores[sel] = np.take_along_axis(merged, keep, axis=1)
+
+    def results(self) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """(rows, scores) per query, best first, ties broken by row."""
+        for rows, scores in zip(self.rows, self.scores):
+            found = scores > -np.inf
+            order = np.lexsort((rows[found], -scores[found]))
+            yield rows[found][order], scores[found][order]
+
+
+class VectorIndex:
+    """
+    Memory-mapped embedding matrix with top-k cosine search.
+
+    search() returns results shaped like the search API's (key, distance,
+    metadata), best first; 'distance' is the cosine similarity, and only rows
+    with distance >= threshold are returned.
+    """
+
+    def __init__(self, path: Union[str, Path] = VECTOR_INDEX_DIR, embed_fn: Optional[EmbedFn] = None):
+        self.path = Path(path)
+        self.embed_fn = embed_fn
+        arrays, meta = open_array_dir(self.path)
+        self.meta = meta
+        self.dim: int = meta['dim']
+        self.vectors = arrays['vectors']
+        self.scale = arrays.get('scale')
+        self.tweet_ids = arrays['tweet_id']
+        self.keys = StringColumn(arrays['key.offsets'], arrays['key.data'])
+        self.metadata = StringColumn(arrays['metadata.offsets'], arrays['metadata.data'])
+        self.text_hashes = arrays['text_hash']
+        self.text_rows = arrays['text_row']
+        if 'id_sorted' not in arrays:
+            arrays.update(_write_id_index(self.path, self.tweet_ids))
+        self.id_sorted = arrays['id_sorted']
+        self.id_rows = arrays['id_row']
+        self.centroids = arrays.get('centroids')
+        self.list_offsets = arrays.get('list_offsets')
+        self.list_rows = arrays.get('list_rows')
+
+    def __reduce__(self):
+        # Reopen from disk in other processes instead of pickling the arrays
+        return (self.__class__, (str(self.path), self.embed_fn))
+
+    def __len__(self) -> int:
+        return len(self.tweet_ids)
+
+    def __repr__(self) -> str:
+        ivf = f", {len(self.centroids)} IVF lists" if self.centroids is not None else ""
+        return f"VectorIndex({str(self.path)!r}, {len(self):,} rows, dim {self.dim}, {self.meta['dtype']}{ivf})"
+
+    def row_metadata(self, row: int) -> dict:
+        metadata = json.loads(self.metadata.get(row) or '{}')
+        return metadata if isinstance(metadata, dict) else {}
+
+    def row_vector(self, row: int) -> np.ndarray:
+        v = np.asarray(self.vectors[row], dtype=np.float32)
+        return v * self.scale[row] if self.scale is not None else v
+
+    def rows_for_tweet_ids(self, tweet_ids: Sequence[Optional[int]]) -> np.ndarray:
+        """Row of each tweet id (the first if it has several), -1 if not in the index."""
+        ids = np.asarray([INT_NULL if t is None else int(t) for t in tweet_ids], dtype=np.int64)
+        if len(self.id_sorted) == 0:
+            return np.full(len(ids), -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self.id_sorted, ids), len(self.id_sorted) - 1)
+        found = (self.id_sorted[pos] == ids) & (ids != INT_NULL)
+        return np.where(found, self.id_rows[pos], -1)
+
+    def rows_for_text(self, text: str) -> List[int]:
+        """Rows whose text or original_text is exactly text."""
+        h = np.uint64(text_hash(text))
+        lo, hi = np.searchsorted(self.text_hashes, h, side='left'), np.searchsorted(self.text_hashes, h, side='right')
+        rows = []
+        for r in sorted({int(r) for r in self.text_rows[lo:hi]}):
+            metadata = self.row_metadata(r)
+            # Guard against hash collisions
+            if text in (metadata.get('text'), metadata.get('original_text')):
+                rows.append(r)
+        return rows
+
+    def query_vector(self, query: Union[str, np.ndarray]) -> Optional[np.ndarray]:
+        """Unit float32 vector for a query: given, the stored vector of the same text, or embed_fn's."""
+        return self.query_vectors([query])[0]
+
+    def query_vectors(
+        self,
+        queries: Sequence[Union[str, np.ndarray, None]],
+        tweet_ids: Optional[Sequence[Optional[int]]] = None
+    ) -> List[Optional[np.ndarray]]:
+        """
+        query_vector of each query, with one embed_fn call for all the texts not in the index.
+
+        With tweet_ids, a query whose tweet id is in the index uses that row's
+        stored vector; the query itself is only the fallback on a miss.
+        """
+        rows_by_id = self.rows_for_tweet_ids(tweet_ids) if tweet_ids is not None else None
+        vectors: List[Optional[np.ndarray]] = []
+        to_embed: List[int] = []
+        for i, query in enumerate(queries):
+            if rows_by_id is not None and rows_by_id[i] >= 0:
+                query = self.row_vector(int(rows_by_id[i]))
+            elif isinstance(query, str):
+                rows = self.rows_for_text(query)
+                if rows:
+                    query = self.row_vector(rows[0])
+                else:
+                    to_embed.append(i)
+                    query = None
+            vectors.append(query)
+        if to_embed and self.embed_fn is not None:
+            embedded = np.asarray(self.embed_fn([queries[i] for i in to_embed]), dtype=np.float32)
+            for i, v in zip(to_embed, embedded.reshape(len(to_embed), -1)):
+                vectors[i] = v
+        return [None if v is None else self._unit(v) for v in vectors]
+
+    def _unit(self, v: np.ndarray) -> np.ndarray:
+        q = np.asarray(v, dtype=np.float32).reshape(-1)
+        if len(q) != self.dim:
+            raise ValueError(f"Query has dim {len(q)}, index has dim {self.dim}")
+        norm = np.linalg.norm(q)
+        return q / norm if norm > 0 else q
+
+    def search(
+        self,
+        query: Union[str, np.ndarray, None],
+        k: int = 100,
+        threshold: float = 0.5,
+        filter: Optional[dict] = None,
+        nprobe: Optional[int] = None,
+        tweet_id: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Top k rows by cosine similarity to query (a text or a vector).
+
+        With tweet_id, the stored vector of that tweet is the query and query
+        only the fallback if the tweet is not in the index. With an IVF index
+        and nprobe set, only the nprobe nearest lists are scanned; otherwise
+        the scan is exact. A text that is neither stored nor embeddable (no
+        embed_fn) gives no results and a warning.
+        """
+        return self.search_batch([query], k, threshold, filter, nprobe, None if tweet_id is None else [tweet_id])[0]
+
+    def search_batch(
+        self,
+        queries: Sequence[Union[str, np.ndarray, None]],
+        k: int = 100,
+        threshold: float = 0.5,
+        filter: Optional[dict] = None,
+        nprobe: Optional[int] = None,
+        tweet_ids: Optional[Sequence[Optional[int]]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        search() for many queries in one pass over the matrix, results in query order.
+
+        Every block of rows is read and converted once and scored against
+        up to QUERY_BLOCK queries in one matrix product, followed by a partial
+        sort per query. With nprobe, each probed IVF list is scored against
+        the queries that probe it.
+        """
+        vectors = self.query_vectors(queries, tweet_ids)
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        if missing:
+            print(f"[WARN] {len(missing)} queries are not in the vector index and no embed_fn is set, "
+                  f"e.g. {str(queries[missing[0]])[:60]!r}")
+        accept = (lambda r: matches_filter(self.row_metadata(r), filter)) if filter else None
+        return [
+            [self._result(int(r), float(s)) for r, s in zip(found, scores)]
+            for found, scores in self.search_rows(vectors, k, threshold, accept, nprobe)
+        ]
+
+    def search_rows(
+        self,
+        vectors: Sequence[Optional[np.ndarray]],
+        k: int,
+        threshold: float,
+        accept: Optional[Callable[[int], bool]] = None,
+        nprobe: Optional[int] = None,
+        mask: Optional[np.ndarray] = None,
+        exclude_rows: Optional[Sequence[np.ndarray]] = None
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        (rows, scores) of the top k rows for each unit query vector (None: no rows), best first.
+
+        mask (bool per row) leaves out every row where it is False for all
+        queries, exclude_rows[i] leaves out rows for query i only; both apply
+        before the top k, so filtered rows never take a place in it.
+        """
+        empty = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32))
+        out = [empty] * len(vectors)
+        live = [i for i, v in enumerate(vectors) if v is not None]
+        if k <= 0:
+            return out
+        for lo in range(0, len(live), QUERY_BLOCK):
+            chunk = live[lo:lo + QUERY_BLOCK]
+            q = np.stack([vectors[i] for i in chunk])
+            excludes = [exclude_rows[i] for i in chunk] if exclude_rows is not None else None
+            top = _TopK(len(chunk), k, threshold, accept, mask, excludes)
+            if nprobe and self.centroids is not None:
+                for rows, qs in self._probed_lists(q, nprobe):
+                    for read, row_ids in self._blocks(rows):
+                        top.add(qs, row_ids, self._scores(read, q[qs]))
+            else:
+                for read, row_ids in self._blocks(None):
+                    top.add(None, row_ids, self._scores(read, q))
+            for i, found in zip(chunk, top.results()):
+                out[i] = found
+        return out
+
+    def _scores(self, rows: Union[slice, np.ndarray], q: np.ndarray) -> np.ndarray:
+        """(rows, queries) similarities of a block of rows to unit queries q (queries, dim)."""
+        block = np.asarray(self.vectors[rows], dtype=np.float32)
+        scores = block @ q.T
+        if self.scale is not None:
+            scores *= self.scale[rows][:, None]
+        return scores
+
+    def _blocks(self, rows: Optional[np.ndarray]) -> Iterator[Tuple[Union[slice, np.ndarray], np.ndarray]]:
+        """(rows to read, their row numbers) in blocks of BLOCK_ROWS."""
+        n = len(self) if rows is None else len(rows)
+        for lo in range(0, n, BLOCK_ROWS):
+            hi = min(lo + BLOCK_ROWS, n)
+            if rows is None:
+                yield slice(lo, hi), np.arange(lo, hi)
+            else:
+                yield rows[lo:hi], rows[lo:hi]
+
+    def _probed_lists(self, q: np.ndarray, nprobe: int) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """(sorted rows of an IVF list, the queries among q that probe it) for every probed list."""
+        nearest = np.argsort(-(q @ self.centroids.T), axis=1)[:, :nprobe]
+        for l in np.unique(nearest).tolist():
+            qs = np.flatnonzero((nearest == l).any(axis=1))
+            yield np.sort(self.list_rows[self.list_offsets[l]:self.list_offsets[l + 1]]), qs
+
+    def _result(self, row: int, score: float) -> Dict[str, Any]:
+        metadata = self.row_metadata(row)
+        tid = int(self.tweet_ids[row])
+        if tid != INT_NULL:
+            metadata.setdefault('tweet_id', str(tid))
+        key = str(tid) if tid != INT_NULL else self.keys.get(row)
+        return {'key': key, 'distance': score, 'metadata': metadata}
+
+
+def embedding_queue_files(directory: Union[str, Path] = EMBEDDING_QUEUE_DIR) -> List[Path]:
+    """The *.pending.parquet files of an embedding queue, newest first (by name, which starts with the timestamp)."""
+    return sorted(Path(directory).glob('*.pending.parquet'), reverse=True)
+
+
+def _row_tweet_id(key: Optional[str], metadata: dict) -> int:
+    for value in (metadata.get('tweet_id'), key):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            continue
+    return INT_NULL
+
+
+def _id_index(tweet_ids: np.ndarray) -> Dict[str, np.ndarray]:
+    """id_sorted / id_row arrays of the rows with a known tweet id (first row first on duplicates)."""
+    rows = np.flatnonzero(tweet_ids != INT_NULL)
+    rows = rows[np.argsort(tweet_ids[rows], kind='stable')]
+    return {'id_sorted': np.asarray(tweet_ids[rows]), 'id_row': rows}
+
+
+def _write_id_index(path: Path, tweet_ids: np.ndarray) -> Dict[str, np.ndarray]:
+    """Add the tweet_id -> row index to an index built without it (version 1) and map it."""
+    print(f"Adding the tweet_id index to {path}")
+    for name, arr in _id_index(tweet_ids).items():
+        tmp = path / f'{name}.tmp.npy'
+        np.save(tmp, arr)
+        os.replace(tmp, path / f'{name}.npy')
+    refresh_checksums(path, ['id_sorted.npy', 'id_row.npy'])
+    return {name: np.load(path / f'{name}.npy', mmap_mode='r') for name in ('id_sorted', 'id_row')}
+
+
+class _BlobWriter:
+    """Appends utf-8 strings to a raw file, then writes them as <name>.offsets/.data.npy."""
+
+    def __init__(self, tmp: Path, name: str):
+        self.tmp = tmp
+        self.name = name
+        self.raw_path = tmp / f'{name}.raw'
+        self.raw = open(self.raw_path, 'wb')
+        self.lengths: List[np.ndarray] = []
+
+    def append(self, strings: Sequence[str]) -> None:
+        encoded = [s.encode('utf-8') for s in strings]
+        self.raw.write(b''.join(encoded))
+        self.lengths.append(np.fromiter((len(b) for b in encoded), dtype=np.int64, count=len(encoded)))
+
+    def close(self) -> None:
+        self.raw.close()
+        lengths = np.concatenate(self.lengths) if self.lengths else np.zeros(0, dtype=np.int64)
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        np.save(self.tmp / f'{self.name}.offsets.npy', offsets)
+        data = np.lib.format.open_memmap(self.tmp / f'{self.name}.data.npy', mode='w+', dtype=np.uint8, shape=(int(offsets[-1]),))
+        if len(data):
+            data[:] = np.memmap(self.raw_path, dtype=np.uint8, mode='r')
+        data.flush()
+        del data
+        os.remove(self.raw_path)
+
+
+def _spherical_kmeans(sample: np.ndarray, n_lists: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """n_lists unit centroids of unit rows (k-means on cosine similarity)."""
+    rng = np.random.default_rng(seed)
+    centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assign = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, sample)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        empty = norms[:, 0] == 0
+        centroids = np.where(empty[:, None], centroids, sums / np.where(norms == 0, 1, norms))
+    return centroids.astype(np.float32)
+
+
+def build_vector_index(
+    parquet_files: Optional[Sequence[Union[str, Path]]] = None,
+    path: Union[str, Path] = VECTOR_INDEX_DIR,
+    dtype: str = 'float16',
+    n_lists: int = 0,
+    batch_size: int = 8192,
+    dim: int = EMBEDDING_DIM
+) -> VectorIndex:
+    """
+    Build a VectorIndex from embedding-queue parquets (key, metadata, v0..v{dim-1}).
+
+    Rows are normalised to unit length and stored as float16, or as int8 with
+    a per-row scale (half the size again, slightly lower precision). A key in
+    several files keeps the row of the first file (embedding_queue_files()
+    lists the newest first). n_lists > 0 also builds an IVF index with that
+    many k-means lists, for approximate search with nprobe.
+    """
+    import pyarrow.parquet as pq
+
+    if dtype not in ('float16', 'int8'):
+        raise ValueError(f"dtype must be 'float16' or 'int8', not {dtype!r}")
+    files = [Path(f) for f in (parquet_files if parquet_files is not None else embedding_queue_files())]
+    if not files:
+        raise FileNotFoundError(f"No embedding parquets to index (looked in {EMBEDDING_QUEUE_DIR})")
+
+    # Pass 1: keys only, to drop duplicates and size the matrix
+    seen = set()
+    keep_masks = []
+    for f in files:
+        keys = pq.read_table(f, columns=['key']).column('key').to_pylist()
+        mask = np.zeros(len(keys), dtype=bool)
+        for i, key in enumerate(keys):
+            if key not in seen:
+                seen.add(key)
+                mask[i] = True
+        keep_masks.append(mask)
+    n = len(seen)
+    del seen
+    print(f"Indexing {n:,} embeddings from {len(files)} files")
+
+    # Pass 2: vectors, keys and metadata, streamed into the staging directory
+    tmp = staging_dir(path)
+    vectors = np.lib.format.open_memmap(tmp / 'vectors.npy', mode='w+', dtype=np.dtype(dtype), shape=(n, dim))
+    scale = np.zeros(n, dtype=np.float32)
+    tweet_ids = np.full(n, INT_NULL, dtype=np.int64)
+    keys_out, metadata_out = _BlobWriter(tmp, 'key'), _BlobWriter(tmp, 'metadata')
+    hashes, hash_rows = [], []
+    v_cols = [f'v{i}' for i in range(dim)]
+    row = 0
+    for f, mask in zip(files, keep_masks):
+        start = 0
+        for batch in pq.ParquetFile(f).iter_batches(batch_size=batch_size, columns=['key', 'metadata'] + v_cols):
+            keep = mask[start:start + batch.num_rows]
+            start += batch.num_rows
+            if not keep.any():
+                continue
+            idx = np.flatnonzero(keep)
+            x = np.column_stack([batch.column(c).to_numpy(zero_copy_only=False) for c in v_cols])[idx].astype(np.float32)
+            norms = np.linalg.norm(x, axis=1, keepdims=True)
+            x /= np.where(norms == 0, 1, norms)
+            m = len(idx)
+            if dtype == 'int8':
+                s = np.abs(x).max(axis=1) / 127
+                s[s == 0] = 1
+                vectors[row:row + m] = np.round(x / s[:, None]).astype(np.int8)
+                scale[row:row + m] = s
+            else:
+                vectors[row:row + m] = x.astype(np.float16)
+            keys = batch.column('key').to_pylist()
+            raws = batch.column('metadata').to_pylist()
+            keys = [str(keys[i]) if keys[i] is not None else '' for i in idx.tolist()]
+            raws = [raws[i] or '{}' for i in idx.tolist()]
+            keys_out.append(keys)
+            metadata_out.append(raws)
+            for j, (key, raw) in enumerate(zip(keys, raws)):
+                try:
+                    metadata = json.loads(raw)
+                except ValueError:
+                    metadata = {}
+                if not isinstance(metadata, dict):
+                    metadata = {}
+                tweet_ids[row + j] = _row_tweet_id(key, metadata)
+                for text in {metadata.get('text'), metadata.get('original_text')}:
+                    if isinstance(text, str):
+                        hashes.append(text_hash(text))
+                        hash_rows.append(row + j)
+            row += m
+    vectors.flush()
+    keys_out.close()
+    metadata_out.close()
+
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    hash_rows = np.asarray(hash_rows, dtype=np.int64)
+    order = np.argsort(hashes, kind='stable')
+    np.save(tmp / 'text_hash.npy', hashes[order])
+    np.save(tmp / 'text_row.npy', hash_rows[order])
+    np.save(tmp / 'tweet_id.npy', tweet_ids)
+    for name, arr in _id_index(tweet_ids).items():
+        np.save(tmp / f'{name}.npy', arr)
+    if dtype == 'int8':
+        np.save(tmp / 'scale.npy', scale)
+
+    if n_lists:
+        n_lists = min(n_lists, n)
+        rng = np.random.default_rng(0)
+        sample_rows = np.sort(rng.choice(n, size=min(n, 256 * n_lists), replace=False))
+        sample = np.asarray(vectors[sample_rows], dtype=np.float32)
+        if dtype == 'int8':
+            sample *= scale[sample_rows, None]
+        centroids = _spherical_kmeans(sample, n_lists)
+        assign = np.empty(n, dtype=np.int64)
+        for lo in range(0, n, BLOCK_ROWS):
+            block = np.asarray(vectors[lo:lo + BLOCK_ROWS], dtype=np.float32)
+            assign[lo:lo + len(block)] = np.argmax(block @ centroids.T, axis=1)
+        list_offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assign, minlength=n_lists), out=list_offsets[1:])
+        np.save(tmp / 'centroids.npy', centroids)
+        np.save(tmp / 'list_offsets.npy', list_offsets)
+        np.save(tmp / 'list_rows.npy', np.argsort(assign, kind='stable'))
+    del vectors
+
+    commit_array_dir(tmp, path, {
+        'version': VECTOR_INDEX_VERSION,
+        'rows': n,
+        'dim': dim,
+        'dtype': dtype,
+        'n_lists': n_lists,
+        'sources': [f.name for f in files],
+    })
+    return VectorIndex(path)
+
+# %%